@@ -0,0 +1,139 @@
+"""
+AI Cache Module for JIRA TPM Application
+Persistent cache of LLM results keyed by a fingerprint of the normalized prompt input
+"""
+
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from state_backend import StateBackend
+
+logger = logging.getLogger(__name__)
+
+ENTRY_PREFIX = 'ai_cache:entry:'
+LEASE_PREFIX = 'ai_cache:refresh:'
+
+# Cache outcomes reported with each result
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace so formatting-only differences map to the same fingerprint"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def fingerprint(summary: str, model: str, prompt_version: int) -> str:
+    payload = json.dumps({'summary': normalize(summary), 'model': model, 'prompt_version': prompt_version},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    def __init__(self, backend: StateBackend, ttl: float = 86400, stale_ttl: float = 7 * 86400,
+                 lease_seconds: float = 300):
+        """
+        ttl: seconds a result is served as fresh. For stale_ttl seconds after that it is still served,
+        while one background refresh replaces it. Permanent results (closed sprints only) never expire.
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lease_seconds = lease_seconds
+        self.lease_id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        # Keys being computed by this process, so concurrent misses wait for one call
+        self.inflight: Dict[str, threading.Event] = {}
+        self.counts = {HIT: 0, STALE: 0, MISS: 0, 'refreshes': 0}
+
+    def _count(self, outcome: str):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def _store(self, key: str, result: Dict, permanent: bool) -> Dict:
+        entry = {'result': result, 'cached_at': time.time(), 'permanent': permanent}
+        self.backend.set(ENTRY_PREFIX + key, entry, ttl=None if permanent else self.ttl + self.stale_ttl)
+        return entry
+
+    def _acquire(self, key: str) -> bool:
+        """Take the cross-process lease so a stale entry is refreshed only once"""
+        now = time.time()
+
+        def take(lease):
+            if lease and lease['expires_at'] > now:
+                return None
+            return {'owner': self.lease_id, 'expires_at': now + self.lease_seconds}
+
+        return self.backend.update(LEASE_PREFIX + key, take, ttl=self.lease_seconds) is not None
+
+    def _release(self, key: str):
+        self.backend.delete(LEASE_PREFIX + key)
+
+    def _refresh(self, key: str, compute: Callable[[], Dict], cacheable: Callable[[Dict], bool], permanent: bool):
+        try:
+            result = compute()
+            if cacheable(result):
+                self._store(key, result, permanent)
+                self._count('refreshes')
+        except Exception as e:
+            logger.error(f"Error refreshing cached AI result {key[:12]}: {str(e)}")
+        finally:
+            self._release(key)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict],
+                       cacheable: Callable[[Dict], bool] = lambda result: True,
+                       permanent: bool = False, refresh: bool = False) -> Tuple[Dict, Dict]:
+        """
+        The cached result for key, computing it on a miss (or when refresh is set). Results failing
+        cacheable (errors, fallbacks) are returned but not stored. Returns (result, cache metadata).
+        """
+        entry = None if refresh else self.backend.get(ENTRY_PREFIX + key)
+        if entry is None and not refresh:
+            with self.lock:
+                running = self.inflight.get(key)
+            if running is not None:
+                # Another request is already asking the model the same question
+                running.wait(self.lease_seconds)
+                entry = self.backend.get(ENTRY_PREFIX + key)
+        if entry is not None:
+            age = time.time() - entry['cached_at']
+            outcome = HIT if entry['permanent'] or age < self.ttl else STALE
+            self._count(outcome)
+            if outcome == STALE and self._acquire(key):
+                # Serve the old answer now; the next view gets the refreshed one
+                threading.Thread(target=self._refresh, args=(key, compute, cacheable, permanent),
+                                 name="ai-cache-refresh", daemon=True).start()
+            return entry['result'], self._metadata(key, outcome, entry)
+
+        self._count(MISS)
+        done = threading.Event()
+        with self.lock:
+            self.inflight.setdefault(key, done)
+        try:
+            result = compute()
+            stored = self._store(key, result, permanent) if cacheable(result) else None
+        finally:
+            with self.lock:
+                if self.inflight.get(key) is done:
+                    del self.inflight[key]
+            done.set()
+        return result, self._metadata(key, MISS, stored)
+
+    def _metadata(self, key: str, outcome: str, entry: Optional[Dict]) -> Dict:
+        return {
+            'status': outcome,
+            'fingerprint': key,
+            'cached_at': entry['cached_at'] if entry else None,
+            'permanent': bool(entry and entry['permanent'])
+        }
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'ttl_seconds': self.ttl, 'stale_ttl_seconds': self.stale_ttl, **self.counts}
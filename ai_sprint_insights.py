@@ -24,9 +24,8 @@ class AISprintInsights:
         """Setup OpenAI client with Azure configuration"""
         try:
             # Import settings manager to get OpenAI config
-            from settings_manager import SettingsManager
-            settings = SettingsManager()
-            config = settings.get_openai_config()
+            from settings_manager import settings_manager
+            config = settings_manager.get_openai_config()
             
             if config['use_azure']:
                 # Azure OpenAI configuration
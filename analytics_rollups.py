@@ -0,0 +1,361 @@
+"""
+Analytics Rollups Module for JIRA TPM Application
+Hourly and daily aggregates of tracking data, maintained as tracking batches are written
+"""
+
+import sqlite3
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from hyperloglog import HyperLogLog, merge_all
+
+logger = logging.getLogger(__name__)
+
+# Hourly rollups only back the last-24-hours figures
+HOURLY_RETENTION_HOURS = 48
+
+ROLLUP_TABLES = ('analytics_daily', 'analytics_hourly', 'analytics_page_daily',
+                 'user_activity_daily', 'user_activity_hourly', 'analytics_sketches')
+
+# Sketch granularities: hourly sketches follow HOURLY_RETENTION_HOURS, daily ones the tracking data
+HOUR = 'hour'
+DAY = 'day'
+
+
+def day_of(timestamp: str) -> str:
+    """'YYYY-MM-DD' of a 'YYYY-MM-DD HH:MM:SS' timestamp"""
+    return timestamp[:10]
+
+
+def hour_of(timestamp: str) -> str:
+    """'YYYY-MM-DD HH:00:00' of a 'YYYY-MM-DD HH:MM:SS' timestamp"""
+    return timestamp[:13] + ':00:00'
+
+
+class AnalyticsRollups:
+    def create_tables(self, cursor: sqlite3.Cursor):
+        """Create the rollup tables; counters are keyed by UTC day or hour like the raw timestamps"""
+        for table, key in (('analytics_daily', 'day'), ('analytics_hourly', 'hour')):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {key} TEXT PRIMARY KEY,
+                    page_views INTEGER NOT NULL DEFAULT 0,
+                    sessions INTEGER NOT NULL DEFAULT 0,
+                    new_users INTEGER NOT NULL DEFAULT 0,
+                    sessions_ended INTEGER NOT NULL DEFAULT 0,
+                    session_seconds INTEGER NOT NULL DEFAULT 0
+                ) WITHOUT ROWID
+            ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_page_daily (
+                day TEXT NOT NULL,
+                page_path TEXT NOT NULL,
+                views INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, page_path)
+            ) WITHOUT ROWID
+        ''')
+        # Distinct active users cannot be summed across periods, so activity is kept per user and period
+        for table, key in (('user_activity_daily', 'day'), ('user_activity_hourly', 'hour')):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {key} TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    PRIMARY KEY ({key}, user_id)
+                ) WITHOUT ROWID
+            ''')
+        # HyperLogLog sketches of active user ids per hour and per day, for approximate distinct counts
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_sketches (
+                granularity TEXT NOT NULL,
+                period TEXT NOT NULL,
+                registers BLOB NOT NULL,
+                PRIMARY KEY (granularity, period)
+            ) WITHOUT ROWID
+        ''')
+
+    def is_empty(self, cursor: sqlite3.Cursor) -> bool:
+        return cursor.execute('SELECT 1 FROM analytics_daily LIMIT 1').fetchone() is None
+
+    def _add_counts(self, cursor: sqlite3.Cursor, table: str, key: str, counts: Dict[str, Counter]):
+        rows = [(period, c['page_views'], c['sessions'], c['new_users'], c['sessions_ended'], c['session_seconds'])
+                for period, c in counts.items()]
+        if rows:
+            cursor.executemany(f'''
+                INSERT INTO {table} ({key}, page_views, sessions, new_users, sessions_ended, session_seconds)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT({key}) DO UPDATE SET
+                    page_views = page_views + excluded.page_views,
+                    sessions = sessions + excluded.sessions,
+                    new_users = new_users + excluded.new_users,
+                    sessions_ended = sessions_ended + excluded.sessions_ended,
+                    session_seconds = session_seconds + excluded.session_seconds
+            ''', rows)
+
+    def existing_users(self, cursor: sqlite3.Cursor, user_ids: Iterable[str]) -> Set[str]:
+        """Which of the given users are already in the users table"""
+        user_ids = list(user_ids)
+        found = set()
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            found.update(row[0] for row in cursor.execute(
+                f'SELECT user_id FROM users WHERE user_id IN ({placeholders})', chunk))
+        return found
+
+    def apply(self, cursor: sqlite3.Cursor, users: List[Tuple], sessions: List[Tuple], page_views: List[Tuple],
+              new_user_ids: Set[str], ended_sessions: List[Tuple[str, int]] = ()):
+        """
+        Fold one batch of raw rows into the rollups, in the batch's transaction.
+        users rows are (user_id, ip, user_agent, first_seen, last_seen); sessions rows end with start_time;
+        page_views rows are (session_id, user_id, page_path, ..., weight, timestamp), where weight is the number of
+        page views a sampled row stands for; ended_sessions are (end_time, seconds).
+        """
+        daily: Dict[str, Counter] = {}
+        hourly: Dict[str, Counter] = {}
+        pages: Counter = Counter()
+        activity = set()
+
+        def count(timestamp: str, field: str, amount: float = 1):
+            daily.setdefault(day_of(timestamp), Counter())[field] += amount
+            hourly.setdefault(hour_of(timestamp), Counter())[field] += amount
+
+        counted_new = set()
+        for user_id, _, _, first_seen, last_seen in users:
+            activity.add((user_id, last_seen))
+            if user_id in new_user_ids and user_id not in counted_new:
+                counted_new.add(user_id)
+                count(first_seen, 'new_users')
+        for row in sessions:
+            count(row[-1], 'sessions')
+        for row in page_views:
+            weight, timestamp = row[-2], row[-1]
+            count(timestamp, 'page_views', weight)
+            pages[(day_of(timestamp), row[2])] += weight
+            activity.add((row[1], timestamp))
+        for end_time, seconds in ended_sessions:
+            count(end_time, 'sessions_ended')
+            count(end_time, 'session_seconds', seconds)
+
+        self._add_counts(cursor, 'analytics_daily', 'day', daily)
+        self._add_counts(cursor, 'analytics_hourly', 'hour', hourly)
+        if pages:
+            cursor.executemany('''
+                INSERT INTO analytics_page_daily (day, page_path, views) VALUES (?, ?, ?)
+                ON CONFLICT(day, page_path) DO UPDATE SET views = views + excluded.views
+            ''', [(day, path, views) for (day, path), views in pages.items()])
+        self.record_activity(cursor, activity)
+
+    def record_activity(self, cursor: sqlite3.Cursor, activity: Iterable[Tuple[str, str]]):
+        """Mark users active in the day and hour of each (user_id, timestamp)"""
+        activity = list(activity)
+        if activity:
+            daily = {(day_of(timestamp), user_id) for user_id, timestamp in activity}
+            hourly = {(hour_of(timestamp), user_id) for user_id, timestamp in activity}
+            cursor.executemany('INSERT OR IGNORE INTO user_activity_daily (day, user_id) VALUES (?, ?)', daily)
+            cursor.executemany('INSERT OR IGNORE INTO user_activity_hourly (hour, user_id) VALUES (?, ?)', hourly)
+            self._add_to_sketches(cursor, DAY, daily)
+            self._add_to_sketches(cursor, HOUR, hourly)
+
+    def _add_to_sketches(self, cursor: sqlite3.Cursor, granularity: str, activity: Iterable[Tuple[str, str]]):
+        """Add (period, user_id) pairs to the stored sketches, one read-modify-write per period"""
+        by_period: Dict[str, List[str]] = {}
+        for period, user_id in activity:
+            by_period.setdefault(period, []).append(user_id)
+        for period, user_ids in by_period.items():
+            row = cursor.execute('SELECT registers FROM analytics_sketches WHERE granularity = ? AND period = ?',
+                                 (granularity, period)).fetchone()
+            sketch = HyperLogLog.from_bytes(row[0]) if row else HyperLogLog()
+            for user_id in user_ids:
+                sketch.add(user_id)
+            cursor.execute('INSERT OR REPLACE INTO analytics_sketches (granularity, period, registers) VALUES (?, ?, ?)',
+                           (granularity, period, sketch.to_bytes()))
+
+    def prune(self, cursor: sqlite3.Cursor):
+        """Drop hourly rollups that no query reads any more"""
+        cutoff = f'-{HOURLY_RETENTION_HOURS} hours'
+        cursor.execute("DELETE FROM analytics_hourly WHERE hour < strftime('%Y-%m-%d %H:00:00', 'now', ?)", (cutoff,))
+        cursor.execute("DELETE FROM user_activity_hourly WHERE hour < strftime('%Y-%m-%d %H:00:00', 'now', ?)", (cutoff,))
+        cursor.execute('''
+            DELETE FROM analytics_sketches WHERE granularity = ? AND period < strftime('%Y-%m-%d %H:00:00', 'now', ?)
+        ''', (HOUR, cutoff))
+
+    def forget_before(self, cursor: sqlite3.Cursor, day: str):
+        """Remove what dropped tracking partitions contributed before a day; new user counts come from users and stay"""
+        cursor.execute('''
+            UPDATE analytics_daily SET page_views = 0, sessions = 0, sessions_ended = 0, session_seconds = 0
+            WHERE day < ?
+        ''', (day,))
+        cursor.execute('DELETE FROM analytics_daily WHERE day < ? AND new_users = 0', (day,))
+        cursor.execute('DELETE FROM analytics_page_daily WHERE day < ?', (day,))
+        cursor.execute('DELETE FROM user_activity_daily WHERE day < ?', (day,))
+        cursor.execute('DELETE FROM analytics_sketches WHERE granularity = ? AND period < ?', (DAY, day))
+        self.prune(cursor)
+
+    def rebuild(self, cursor: sqlite3.Cursor):
+        """Recompute every rollup from the raw tables (first start with existing data, and after cleanup)"""
+        for table in ROLLUP_TABLES:
+            cursor.execute(f'DELETE FROM {table}')
+        for table, period in (('analytics_daily', "date({column})"),
+                              ('analytics_hourly', "strftime('%Y-%m-%d %H:00:00', {column})")):
+            key = 'day' if table == 'analytics_daily' else 'hour'
+            sources = (
+                ('page_views', 'page_views', 'timestamp', 'COALESCE(SUM(weight), 0)'),
+                ('sessions', 'sessions', 'start_time', 'COUNT(*)'),
+                ('new_users', 'users', 'first_seen', 'COUNT(*)'),
+                ('sessions_ended', 'sessions', 'end_time', 'COUNT(duration_seconds)'),
+                ('session_seconds', 'sessions', 'end_time', 'COALESCE(SUM(duration_seconds), 0)')
+            )
+            for field, source, column, aggregate in sources:
+                bucket = period.format(column=column)
+                # The WHERE clause also keeps SQLite from parsing ON CONFLICT as a join constraint
+                cursor.execute(f'''
+                    INSERT INTO {table} ({key}, {field})
+                    SELECT {bucket}, {aggregate} FROM {source} WHERE {column} IS NOT NULL GROUP BY {bucket}
+                    ON CONFLICT({key}) DO UPDATE SET {field} = excluded.{field}
+                ''')
+        cursor.execute('''
+            INSERT INTO analytics_page_daily (day, page_path, views)
+            SELECT date(timestamp), page_path, SUM(weight) FROM page_views
+            WHERE timestamp IS NOT NULL GROUP BY date(timestamp), page_path
+        ''')
+        # Raw activity history: page views, session starts and each user's last visit
+        for table, period in (('user_activity_daily', "date({column})"),
+                              ('user_activity_hourly', "strftime('%Y-%m-%d %H:00:00', {column})")):
+            for source, column in (('page_views', 'timestamp'), ('sessions', 'start_time'), ('users', 'last_seen')):
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO {table}
+                    SELECT DISTINCT {period.format(column=column)}, user_id FROM {source} WHERE {column} IS NOT NULL
+                ''')
+        self.prune(cursor)
+        self.build_sketches(cursor)
+        logger.info("Analytics rollups rebuilt from raw tracking data")
+
+    def _merged(self, cursor: sqlite3.Cursor, granularity: str, start: str, end: Optional[str] = None) -> HyperLogLog:
+        query = 'SELECT registers FROM analytics_sketches WHERE granularity = ? AND period >= ?'
+        params = [granularity, start]
+        if end is not None:
+            query += ' AND period < ?'
+            params.append(end)
+        return merge_all(row[0] for row in cursor.execute(query, params))
+
+    def approx_distinct_users(self, cursor: sqlite3.Cursor, start: datetime, end: datetime) -> Dict:
+        """
+        Approximate distinct active users in [start, end) (UTC, rounded out to whole hours). Hours still
+        covered by hourly sketches are merged hour by hour; anything older widens to whole days.
+        Returns the estimate, its relative standard error and the range actually covered.
+        """
+        hour_fmt, day_fmt = '%Y-%m-%d %H:00:00', '%Y-%m-%d'
+        start = start.replace(minute=0, second=0, microsecond=0)
+        if end.replace(minute=0, second=0, microsecond=0) != end:
+            end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        oldest_hour = (datetime.utcnow() - timedelta(hours=HOURLY_RETENTION_HOURS)).replace(
+            minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+        sketches = []
+        hours_from = start
+        if start < min(end, oldest_hour):
+            days_from = start.replace(hour=0)
+            days_to = min(end, oldest_hour)
+            if days_to.replace(hour=0) != days_to:
+                days_to = days_to.replace(hour=0) + timedelta(days=1)
+            sketches.append(self._merged(cursor, DAY, days_from.strftime(day_fmt), days_to.strftime(day_fmt)))
+            start, hours_from, end = days_from, days_to, max(end, days_to)
+        if hours_from < end:
+            sketches.append(self._merged(cursor, HOUR, hours_from.strftime(hour_fmt), end.strftime(hour_fmt)))
+        merged = merge_all(sketch.to_bytes() for sketch in sketches)
+        return {
+            'users': merged.count(),
+            'relative_error': round(merged.relative_error, 4),
+            'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'end': end.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def _approx_stats(self, cursor: sqlite3.Cursor, days: int) -> Dict:
+        """Distinct-user figures of read_stats from the sketches"""
+        since_hour = cursor.execute("SELECT strftime('%Y-%m-%d %H:00:00', 'now', '-24 hours')").fetchone()[0]
+        active_users_24h = self._merged(cursor, HOUR, since_hour)
+        active = {}
+        for period in (7, 30):
+            since_day = cursor.execute("SELECT date('now', ?)", (f'-{period} days',)).fetchone()[0]
+            active[period] = self._merged(cursor, DAY, since_day).count()
+        since_day = cursor.execute("SELECT date('now', ?)", (f'-{days} days',)).fetchone()[0]
+        daily_active_users = [{'date': period, 'users': HyperLogLog.from_bytes(registers).count()}
+                              for period, registers in cursor.execute('''
+                                  SELECT period, registers FROM analytics_sketches
+                                  WHERE granularity = ? AND period >= ? ORDER BY period
+                              ''', (DAY, since_day))]
+        return {
+            'active_users_24h': active_users_24h.count(),
+            'active_users_7d': active[7],
+            'active_users_30d': active[30],
+            'daily_active_users': daily_active_users,
+            'approximate': True,
+            'relative_error': round(active_users_24h.relative_error, 4)
+        }
+
+    def has_sketches(self, cursor: sqlite3.Cursor) -> bool:
+        return cursor.execute('SELECT 1 FROM analytics_sketches LIMIT 1').fetchone() is not None
+
+    def build_sketches(self, cursor: sqlite3.Cursor):
+        """Recompute the sketches from the per-user activity tables"""
+        cursor.execute('DELETE FROM analytics_sketches')
+        self._add_to_sketches(cursor, DAY, cursor.execute('SELECT day, user_id FROM user_activity_daily').fetchall())
+        self._add_to_sketches(cursor, HOUR, cursor.execute('SELECT hour, user_id FROM user_activity_hourly').fetchall())
+
+    def read_stats(self, cursor: sqlite3.Cursor, days: int, approx: bool = False) -> Dict:
+        """
+        The figures of UserTracker.get_user_stats, from the rollups only. With approx, distinct-user
+        counts come from HyperLogLog sketches instead of the per-user activity tables.
+        """
+        window = f'-{days} days'
+        totals = cursor.execute('''
+            SELECT COALESCE(SUM(new_users), 0), COALESCE(SUM(sessions), 0), COALESCE(SUM(page_views), 0),
+                   COALESCE(SUM(sessions_ended), 0), COALESCE(SUM(session_seconds), 0)
+            FROM analytics_daily
+        ''').fetchone()
+        total_users, total_sessions, total_page_views, sessions_ended, session_seconds = totals
+        # Sampled page views carry fractional weights
+        total_page_views = int(round(total_page_views))
+        new_users_today = cursor.execute(
+            "SELECT COALESCE(SUM(new_users), 0) FROM analytics_daily WHERE day = date('now')").fetchone()[0]
+        top_pages = [{'page': row[0], 'views': int(round(row[1]))} for row in cursor.execute('''
+            SELECT page_path, SUM(views) AS views FROM analytics_page_daily
+            WHERE day >= date('now', ?)
+            GROUP BY page_path ORDER BY views DESC LIMIT 10
+        ''', (window,))]
+        stats = {
+            'total_users': total_users,
+            'new_users_today': new_users_today,
+            'total_sessions': total_sessions,
+            'total_page_views': total_page_views,
+            'avg_session_duration': round(session_seconds / sessions_ended, 2) if sessions_ended else 0,
+            'top_pages': top_pages
+        }
+        if approx:
+            stats.update(self._approx_stats(cursor, days))
+            return stats
+
+        active_users_24h = cursor.execute('''
+            SELECT COUNT(DISTINCT user_id) FROM user_activity_hourly
+            WHERE hour >= strftime('%Y-%m-%d %H:00:00', 'now', '-24 hours')
+        ''').fetchone()[0]
+        active_users = {}
+        for period in (7, 30):
+            active_users[period] = cursor.execute('''
+                SELECT COUNT(DISTINCT user_id) FROM user_activity_daily WHERE day >= date('now', ?)
+            ''', (f'-{period} days',)).fetchone()[0]
+        daily_active_users = [{'date': row[0], 'users': row[1]} for row in cursor.execute('''
+            SELECT day, COUNT(*) FROM user_activity_daily
+            WHERE day >= date('now', ?)
+            GROUP BY day ORDER BY day
+        ''', (window,))]
+
+        stats.update({
+            'active_users_24h': active_users_24h,
+            'active_users_7d': active_users[7],
+            'active_users_30d': active_users[30],
+            'daily_active_users': daily_active_users
+        })
+        return stats
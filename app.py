@@ -1,9 +1,21 @@
 from flask import Flask, jsonify, request, render_template, Response, send_from_directory, session, g
 from flask_cors import CORS
 from scripts.jira_sprint_report import generate_jira_sprint_report, analyze_sprint
-from scripts.user_capacity_analysis import analyze_user_capacity
+from scripts.user_capacity_analysis import analyze_user_capacity, summarize_user_capacity
 from settings_manager import settings_manager
-from user_tracking import track_user_request, track_page_view, track_event, tracker
+from jira_client import jira_clients
+from tenants import (tenants, current_tenant, set_tenant, clear_tenant, use_tenant, bind_tenant, TenantLocal,
+                     UnknownTenant, TENANT_HEADER, DEFAULT_TENANT)
+from user_tracking import track_user_request, track_page_view, track_event, track_batch, tracker, MAX_BATCH_ITEMS, parse_utc
+from task_queue import task_queue
+from cancellation import TaskCancelled, check_cancelled, request_timeout, CANCELLED
+from jira_scheduler import jira_scheduler, scheduled, SchedulerBusy, INTERACTIVE, BACKGROUND, PREFETCH
+from state_backend import state_backend, durable_backend, namespaced
+from label_index import LabelIndex
+from label_sync import LabelSync
+from label_stats import LabelStats
+from label_jobs import LabelJobs, RENAME, DELETE
+from ai_cache import AIResponseCache, fingerprint
 import requests
 import os
 import base64
@@ -20,6 +32,7 @@ import csv
 import io
 import json
 import uuid
+import gzip
 
 # Optional AI import - only import if available
 try:
@@ -41,15 +54,17 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 def get_jira_credentials():
-    """Get JIRA credentials from settings manager with environment fallback"""
+    """Get JIRA credentials of the current tenant; the default tenant uses settings with environment fallback"""
     try:
+        tenant = current_tenant()
+        if not tenant.is_default:
+            return tenant.jira_credentials()
+
         # First try settings manager
         if settings_manager.has_valid_credentials():
             credentials = settings_manager.get_jira_credentials()
-            logger.info("Using JIRA credentials from settings")
-            logger.info(f"JIRA_URL: {credentials['url']}")
-            logger.info(f"JIRA_EMAIL: {credentials['email']}")
-            logger.info(f"JIRA_API_TOKEN length: {len(credentials['api_token'])}")
+            logger.debug("Using JIRA credentials from settings")
+            logger.debug(f"JIRA_URL: {credentials['url']}")
             return credentials
         
         # Fallback to environment variables
@@ -58,7 +73,7 @@ def get_jira_credentials():
         jira_token = os.getenv('JIRA_API_TOKEN')
         
         if jira_url and jira_email and jira_token:
-            logger.info("Using JIRA credentials from environment variables")
+            logger.debug("Using JIRA credentials from environment variables")
             return {
                 'url': jira_url,
                 'email': jira_email,
@@ -83,62 +98,166 @@ app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-product
 def before_request():
     """Track user requests before processing"""
     track_user_request()
-
-# Global cache for labels
+    # Jira calls go to the site of the tenant named by the request (the configured site if none)
+    try:
+        tenant = set_tenant(request.headers.get(TENANT_HEADER) or request.args.get('tenant') or DEFAULT_TENANT)
+    except UnknownTenant as e:
+        return jsonify({'error': str(e)}), 404
+    # Jira calls made while serving a request are interactive; share fairly per board, else per user
+    board_id = request.args.get('board_id', '').strip()
+    if board_id:
+        flow = f"board:{board_id}"
+    else:
+        flow = f"user:{getattr(g, 'tracking_user_id', None) or request.remote_addr}"
+    jira_scheduler.set_context(INTERACTIVE, tenant.scoped(flow))
+
+@app.teardown_request
+def teardown_request(exception=None):
+    jira_scheduler.clear_context()
+    clear_tenant()
+
+@app.errorhandler(SchedulerBusy)
+def handle_scheduler_busy(e):
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# Global cache for labels. The snapshot lives in the state backend so every process serves
+# the same labels; each process keeps a local copy and reloads it when the version changes.
 class LabelCache:
-    def __init__(self):
-        self.labels = set()
+    SNAPSHOT_KEY = 'labels:snapshot'
+    VERSION_KEY = 'labels:version'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.index = LabelIndex()
+        self.counts = {}  # label -> number of issues carrying it
         self.last_updated = None
+        self.version = None
         self.cache_duration = timedelta(minutes=30)  # Cache for 30 minutes
 
+    def sync(self):
+        """Load the shared snapshot if another process published a newer one"""
+        version = self.backend.get(self.VERSION_KEY)
+        if version is None or version == self.version:
+            return
+        snapshot = self.backend.get(self.SNAPSHOT_KEY)
+        if not snapshot:
+            return
+        self.index.update(snapshot['labels'])
+        self.counts = snapshot.get('counts', {})
+        self.last_updated = datetime.fromisoformat(snapshot['last_updated'])
+        self.version = snapshot['version']
+
     def needs_refresh(self):
+        self.sync()
         if not self.last_updated:
             return True
         return datetime.now() - self.last_updated > self.cache_duration
 
-    def update(self, new_labels):
-        self.labels = set(new_labels)
-        self.last_updated = datetime.now()
+    @property
+    def labels(self):
+        return self.index
+
+    def update(self, new_labels, updated_at=None, counts=None):
+        """Replace the cached labels (and usage counts, if given); updated_at (default now) is when they were fetched from Jira"""
+        self.index.update(new_labels)
+        if counts is not None:
+            self.counts = dict(counts)
+        self.last_updated = updated_at or datetime.now()
+        self.version = str(uuid.uuid4())
+        self.backend.set(self.SNAPSHOT_KEY, {
+            'labels': self.index.all_labels(),
+            'counts': self.counts,
+            'last_updated': self.last_updated.isoformat(),
+            'version': self.version
+        })
+        # Published last so readers never see a version without its snapshot
+        self.backend.set(self.VERSION_KEY, self.version)
         logger.info(f"Label cache updated with {len(self.labels)} labels")
 
+    def save_snapshot(self, path):
+        """Write the labels, usage counts and their age to a compressed file for the next start"""
+        if not self.last_updated:
+            return
+        snapshot = {
+            'labels': self.index.all_labels(),
+            'counts': self.counts,
+            'last_updated': self.last_updated.isoformat(),
+            'version': self.version,
+            'saved_at': datetime.now().isoformat()
+        }
+        # Written aside and renamed so a crash never leaves a truncated snapshot
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+        logger.debug(f"Saved label snapshot with {len(snapshot['labels'])} labels to {path}")
+
+    def load_snapshot(self, path):
+        """Warm the cache from a snapshot file; returns False if there is no usable one"""
+        if not os.path.exists(path):
+            return False
+        started = time.time()
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            last_updated = datetime.fromisoformat(snapshot['last_updated'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable label snapshot {path}: {str(e)}")
+            return False
+        # The trigram postings build in the background; searches scan until they are ready
+        self.index.load(snapshot['labels'])
+        self.counts = snapshot.get('counts', {})
+        # Keeping the fetch time means the usual freshness rules decide when to refresh
+        self.last_updated = last_updated
+        self.version = snapshot.get('version')
+        logger.info(f"Loaded {len(self.labels)} labels from {path} in {time.time() - started:.3f}s "
+                    f"(fetched {self.age_seconds():.0f}s ago)")
+        return True
+
+    def age_seconds(self):
+        if not self.last_updated:
+            return None
+        return (datetime.now() - self.last_updated).total_seconds()
+
     def get_labels(self):
-        return sorted(list(self.labels))
+        self.sync()
+        return self.index.all_labels()
 
-    def search_labels(self, search_text):
+    def search_labels(self, search_text, offset=0, limit=None):
+        """Ranked, typo-tolerant, paginated search weighted by usage; returns (labels, total matches)"""
         if not search_text:
-            return []
-        search_text = search_text.lower()
-        return sorted([label for label in self.labels if search_text in label.lower()])
+            return [], 0
+        self.sync()
+        return self.index.search(search_text, offset, limit, popularity=self.counts)
 
-# Initialize the cache
-label_cache = LabelCache()
+# Initialize the caches; each tenant gets its own, with keys under its prefix in the shared backend
+label_cache = TenantLocal(lambda tenant: LabelCache(namespaced(state_backend, tenant.prefix)))
 
 # Rate limiting configuration
 RATE_LIMIT_DELAY = 1  # Delay between requests in seconds
 MAX_RETRIES = 3  # Maximum number of retries for rate-limited requests
 RETRY_DELAY = 5  # Delay between retries in seconds
 
-# In-memory storage for background sprint report tasks
-sprint_report_tasks = {}
-
-# In-memory storage for background sprint trends tasks
-sprint_trends_tasks = {}
-
-# In-memory storage for background capacity analysis tasks
-capacity_analysis_tasks = {}
-
 def make_jira_request(url, params=None, method='GET', json_data=None):
     """Make a request to Jira with rate limiting and retry logic"""
     retries = 0
     while retries < MAX_RETRIES:
         try:
+            # Cancellation point for background tasks: stop before spending more of the rate budget
+            check_cancelled()
             # Add delay between requests to respect rate limits
             time.sleep(RATE_LIMIT_DELAY)
             
-            if method == 'GET':
-                response = requests.get(url, headers=get_jira_headers(), params=params)
-            else:
-                response = requests.put(url, headers=get_jira_headers(), json=json_data)
+            # Wait for a Jira slot according to the caller's priority class and flow
+            with jira_scheduler.slot():
+                client = current_tenant().client()
+                if method == 'GET':
+                    response = client.get(url, params=params, timeout=request_timeout(30))
+                else:
+                    response = client.put(url, json=json_data, timeout=request_timeout(30))
             
             # Check for rate limiting
             if response.status_code == 429:
@@ -153,6 +272,10 @@ def make_jira_request(url, params=None, method='GET', json_data=None):
             
             return response
             
+        except SchedulerBusy as e:
+            # Routes let this through to handle_scheduler_busy, which answers 429 with a retry hint
+            logger.warning(f"Jira request refused: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error making Jira request: {str(e)}")
             return None
@@ -172,37 +295,11 @@ def handle_500_error(e):
     }), 500
 
 def get_jira_headers():
+    """Auth headers for the current tenant's credentials, built once per credential version by the client registry"""
     try:
-        credentials = get_jira_credentials()
-        if not credentials:
-            logger.error("No JIRA credentials configured")
-            raise ValueError("No JIRA credentials configured. Please configure them in Settings.")
-
-        # Debug: Print authentication details (without exposing the actual token)
-        logger.debug("Generating Jira headers...")
-        logger.debug(f"Using email: {credentials['email']}")
-        logger.debug(f"API token length: {len(credentials['api_token'])}")
-        
-        # Create base64 encoded string of email:api_token
-        auth_string = f"{credentials['email']}:{credentials['api_token']}"
-        auth_bytes = auth_string.encode('ascii')
-        base64_bytes = base64.b64encode(auth_bytes)
-        base64_string = base64_bytes.decode('ascii')
-        
-        headers = {
-            'Authorization': f'Basic {base64_string}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        
-        # Debug: Print the first few characters of the auth string (for debugging only)
-        logger.debug(f"Auth string prefix: {auth_string[:10]}...")
-        logger.debug(f"Base64 string prefix: {base64_string[:10]}...")
-        
-        return headers
-    except Exception as e:
-        logger.error(f"Error generating headers: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        return dict(current_tenant().client().headers)
+    except ValueError:
+        logger.error("No JIRA credentials configured")
         raise
 
 def test_jira_connection():
@@ -219,16 +316,12 @@ def test_jira_connection():
         logger.debug(f"Testing connection to: {test_url}")
         
         try:
-            headers = get_jira_headers()
-            logger.debug("Headers generated successfully")
+            client = current_tenant().client()
         except ValueError as e:
-            logger.error(f"Failed to generate headers: {str(e)}")
+            logger.error(f"Failed to get Jira client: {str(e)}")
             return None
         
-        response = requests.get(
-            test_url,
-            headers=headers
-        )
+        response = client.get(test_url)
         
         logger.debug(f"Connection test response status: {response.status_code}")
         logger.debug(f"Connection test response headers: {response.headers}")
@@ -268,10 +361,7 @@ def get_project_info():
         logger.debug(f"Using credentials - Email: {credentials['email']}")
         
         # Get all projects
-        response = requests.get(
-            f'{credentials["url"]}/rest/api/2/project',
-            headers=get_jira_headers()
-        )
+        response = current_tenant().client().get(f'{credentials["url"]}/rest/api/2/project')
         
         logger.debug(f"Project API Response Status: {response.status_code}")
         logger.debug(f"Project API Response Headers: {response.headers}")
@@ -334,127 +424,142 @@ def debug_openai():
 def simple_test():
     return render_template('simple_test.html')
 
-def fetch_all_labels():
-    """Fetch all labels from Jira and update the cache"""
+def search_labelled_issues(jql, start_at, max_results):
+    """Fetch one page of issues with their labels, returning the Jira search response or None"""
+    credentials = get_jira_credentials()
+    if not credentials:
+        logger.error("No JIRA credentials configured")
+        return None
     try:
-        logger.debug("Starting fetch_all_labels...")
-        
-        # Get credentials
-        credentials = get_jira_credentials()
-        if not credentials:
-            logger.error("No JIRA credentials configured")
-            return False
-        
-        # Search for issues with labels across all projects
-        jql_query = 'labels is not EMPTY ORDER BY created DESC'
-        search_url = f'{credentials["url"]}/rest/api/2/search'
-        
-        logger.debug(f"Using JQL query: {jql_query}")
-        logger.debug(f"Search URL: {search_url}")
-        
-        all_labels = set()
-        start_at = 0
-        max_results = 1000  # Increased for faster initial load
-        total_issues = None
-        start_time = time.time()
-        
-        # First quick fetch to get initial results
-        logger.debug("Performing initial quick fetch...")
         response = make_jira_request(
-            search_url,
+            f'{credentials["url"]}/rest/api/2/search',
             params={
-                'jql': jql_query,
-                'startAt': 0,
+                'jql': jql,
+                'startAt': start_at,
                 'maxResults': max_results,
-                'fields': 'labels'
+                'fields': 'labels,project,updated'
             }
         )
-        
-        if not response:
-            logger.error("Failed to fetch initial labels")
-            return False
-            
-        try:
-            response_data = response.json()
-            total_issues = response_data.get('total', 0)
-            logger.info(f"Total issues to process: {total_issues}")
-            
-            # Process initial batch
-            issues = response_data.get('issues', [])
-            for issue in issues:
-                fields = issue.get('fields', {})
-                labels = fields.get('labels', [])
-                if labels:
-                    all_labels.update(labels)
-            
-            # Update cache with initial results
-            initial_labels = sorted([str(label) for label in all_labels if label])
-            label_cache.update(initial_labels)
-            logger.info(f"Initial fetch: Found {len(initial_labels)} labels in {time.time() - start_time:.2f} seconds")
-            
-            # If we have more issues to process, continue in background
-            if total_issues > max_results:
-                logger.debug("Starting background fetch for remaining issues...")
-                start_at = max_results
-                
-                while start_at < total_issues:
-                    if time.time() - start_time > 10:  # Stop after 10 seconds
-                        logger.info("Background fetch timeout reached")
-                        break
-                        
-                    response = make_jira_request(
-                        search_url,
-                        params={
-                            'jql': jql_query,
-                            'startAt': start_at,
-                            'maxResults': max_results,
-                            'fields': 'labels'
-                        }
-                    )
-                    
-                    if not response:
-                        logger.error("Failed to fetch remaining labels")
-                        break
-                        
-                    response_data = response.json()
-                    issues = response_data.get('issues', [])
-                    
-                    for issue in issues:
-                        fields = issue.get('fields', {})
-                        labels = fields.get('labels', [])
-                        if labels:
-                            all_labels.update(labels)
-                    
-                    start_at += len(issues)
-                    
-                    # Update cache with new labels
-                    updated_labels = sorted([str(label) for label in all_labels if label])
-                    label_cache.update(updated_labels)
-                    logger.debug(f"Background fetch: Found {len(updated_labels)} labels so far")
-                    
-                    # Small delay to prevent rate limiting
-                    time.sleep(0.5)
-            
-            logger.info(f"Final fetch: Found {len(all_labels)} unique labels in {time.time() - start_time:.2f} seconds")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error processing response: {str(e)}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"Error fetching labels: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        return False
+    except SchedulerBusy:
+        # The sync resumes from its cursor on the next run
+        return None
+    if not response or response.status_code != 200:
+        return None
+    return response.json()
+
+# Incremental label harvesting; its cursor, labels and usage counts persist across restarts
+label_sync_backend = durable_backend(os.getenv('STATE_SQLITE_PATH', 'state.db'))
+label_stats = TenantLocal(lambda tenant: LabelStats(namespaced(label_sync_backend, tenant.prefix)))
+label_sync = TenantLocal(lambda tenant: LabelSync(
+    namespaced(label_sync_backend, tenant.prefix),
+    bind_tenant(search_labelled_issues, tenant),
+    # Labels found mid-run are served from each checkpoint but keep the cache's age; only a complete run refreshes it
+    on_labels=lambda labels, cache=label_cache.for_tenant(tenant): cache.update(labels, updated_at=cache.last_updated),
+    reconcile_interval=int(os.getenv('LABEL_RECONCILE_HOURS', 24)) * 3600,
+    stats=label_stats.for_tenant(tenant)
+))
+
+def submit_task(kind, args, initial_state):
+    """Queue a background task that runs for the current tenant"""
+    return task_queue.submit(kind, args, {**initial_state, 'tenant': current_tenant().id})
+
+label_refresh_lock = threading.Lock()
+
+def refresh_labels_in_background():
+    """Queue a label sync task unless one is already queued or running; returns its task ID"""
+    with label_refresh_lock:
+        key = current_tenant().prefix + 'label_sync:task'
+        task_id = state_backend.get(key)
+        if label_refresh_in_progress(task_id):
+            return task_id
+        task_id = submit_task('label_sync', (), {'status': 'pending', 'progress': None, 'result': None})
+        state_backend.set(key, task_id)
+    logger.info(f"Queued label refresh task {task_id}")
+    return task_id
+
+def label_refresh_in_progress(task_id=None):
+    task_id = task_id or state_backend.get(current_tenant().prefix + 'label_sync:task')
+    timing = task_queue.get_timing(task_id) if task_id else None
+    return bool(timing and timing['queue_status'] != 'finished')
+
+def label_cache_metadata():
+    """Staleness information returned with every label response"""
+    age = label_cache.age_seconds()
+    return {
+        'cache_updated': label_cache.last_updated.isoformat() if label_cache.last_updated else None,
+        'age_seconds': round(age, 1) if age is not None else None,
+        'stale': age is None or age > label_cache.cache_duration.total_seconds(),
+        'refreshing': label_refresh_in_progress()
+    }
+
+def process_label_sync(task_id):
+    """Background task: sync labels from Jira into the cache while requests keep serving the old snapshot"""
+    task_queue.update(task_id, status='processing')
+    previous = label_sync.labels()
+    result = label_sync.run(progress=lambda progress: task_queue.update(task_id, progress=progress))
+    labels = label_sync.labels()
+    if result['complete']:
+        label_cache.update(labels, counts=label_stats.totals)
+    # A busy or unfinished run leaves the cache stale so the refresher retries it
+    if result['complete'] or labels != previous:
+        save_label_snapshot()
+    logger.info(f"Label sync ({result.get('mode', 'busy')}): {result['labels']} labels, complete={result['complete']}")
+    task_queue.update(task_id, status='done' if result['complete'] else 'incomplete', result=result)
+
+def label_refresher_loop():
+    """Refresh each tenant's label cache once it is older than its cache duration, even without traffic"""
+    while True:
+        for tenant in tenants.all():
+            try:
+                with use_tenant(tenant.id):
+                    if get_jira_credentials() and label_cache.needs_refresh():
+                        refresh_labels_in_background()
+            except Exception as e:
+                logger.error(f"Error scheduling label refresh for tenant {tenant.id}: {str(e)}")
+        time.sleep(60)
+
+LABEL_SNAPSHOT_PATH = os.getenv('LABEL_SNAPSHOT_PATH', 'label_snapshot.json.gz')
+
+def label_snapshot_path(tenant):
+    """Snapshot file of a tenant's labels: LABEL_SNAPSHOT_PATH for the default tenant, with the tenant id added otherwise"""
+    if tenant.is_default:
+        return LABEL_SNAPSHOT_PATH
+    base, ext = LABEL_SNAPSHOT_PATH.split('.', 1) if '.' in LABEL_SNAPSHOT_PATH else (LABEL_SNAPSHOT_PATH, '')
+    return f"{base}.{tenant.id}.{ext}" if ext else f"{base}.{tenant.id}"
+
+def save_label_snapshot():
+    try:
+        label_cache.save_snapshot(label_snapshot_path(current_tenant()))
+    except OSError as e:
+        logger.warning(f"Could not save label snapshot: {str(e)}")
+
+def warm_label_cache(tenant):
+    """
+    Serve labels harvested before a restart straight away, aged by when they were last synced.
+    The snapshot file is the fast path; the sync state is the fallback when there is none yet.
+    """
+    cache = label_cache.for_tenant(tenant)
+    if cache.load_snapshot(label_snapshot_path(tenant)):
+        return
+    sync = label_sync.for_tenant(tenant)
+    last_sync = sync.state()['last_sync_at']
+    if last_sync:
+        stats = label_stats.for_tenant(tenant)
+        stats.sync()
+        cache.update(sync.labels(), updated_at=datetime.fromtimestamp(last_sync), counts=stats.totals)
+
+for _tenant in tenants.all():
+    warm_label_cache(_tenant)
 
 @app.route('/api/labels', methods=['GET'])
 def get_labels():
     try:
         logger.debug("Starting get_labels endpoint")
         
-        # Get search parameter
+        # Get search and pagination parameters
         search_text = request.args.get('search', '').strip()
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = request.args.get('limit', None, type=int)
         logger.debug(f"Search text: {search_text}")
         
         # Verify credentials are configured
@@ -463,12 +568,10 @@ def get_labels():
             logger.error("Missing Jira credentials")
             return jsonify({'error': 'Missing Jira credentials. Please configure them in Settings.'}), 500
             
-        # Check if we need to refresh the cache
+        # Serve the current snapshot; a stale cache is refreshed in the background
         if label_cache.needs_refresh():
-            logger.debug("Cache needs refresh, fetching new labels...")
-            if not fetch_all_labels():
-                logger.error("Failed to fetch labels")
-                return jsonify({'error': 'Failed to fetch labels from Jira'}), 500
+            logger.debug("Cache needs refresh, scheduling background refresh...")
+            refresh_labels_in_background()
         
         # Get labels from cache
         all_labels = label_cache.get_labels()
@@ -478,9 +581,12 @@ def get_labels():
         if not search_text:
             logger.debug("No search text, returning all labels")
             return jsonify({
-                'labels': all_labels,
+                'labels': all_labels[offset:offset + limit] if limit is not None else all_labels[offset:],
                 'total_labels': len(all_labels),
-                'cache_updated': label_cache.last_updated.isoformat() if label_cache.last_updated else None
+                'total_matches': len(all_labels),
+                'offset': offset,
+                'limit': limit,
+                **label_cache_metadata()
             })
 
         # If search text is too short, return empty list
@@ -489,19 +595,21 @@ def get_labels():
             return jsonify({
                 'labels': [],
                 'total_labels': len(all_labels),
-                'cache_updated': label_cache.last_updated.isoformat() if label_cache.last_updated else None
+                **label_cache_metadata()
             })
 
-        # Search in the cached labels
-        search_text = search_text.lower()
-        matching_labels = [label for label in all_labels if search_text in label.lower()]
+        # Search the label index
+        matching_labels, total_matches = label_cache.search_labels(search_text, offset, limit)
         
-        logger.info(f"Found {len(matching_labels)} labels matching '{search_text}'")
+        logger.info(f"Found {total_matches} labels matching '{search_text}'")
         
         return jsonify({
             'labels': matching_labels,
             'total_labels': len(all_labels),
-            'cache_updated': label_cache.last_updated.isoformat() if label_cache.last_updated else None
+            'total_matches': total_matches,
+            'offset': offset,
+            'limit': limit,
+            **label_cache_metadata()
         })
         
     except Exception as e:
@@ -512,17 +620,96 @@ def get_labels():
 # Add a new endpoint to force refresh the cache
 @app.route('/api/labels/refresh', methods=['POST'])
 def refresh_labels():
+    """Start a background label refresh; the current snapshot is served until it finishes"""
     try:
-        if fetch_all_labels():
-            return jsonify({
-                'message': 'Label cache refreshed successfully',
-                'total_labels': len(label_cache.labels),
-                'cache_updated': label_cache.last_updated.isoformat()
-            })
-        return jsonify({'error': 'Failed to refresh label cache'}), 500
+        task_id = refresh_labels_in_background()
+        return jsonify({
+            'message': 'Label cache refresh started',
+            'task_id': task_id,
+            'total_labels': len(label_cache.labels),
+            **label_cache_metadata()
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/labels/index/stats', methods=['GET'])
+def get_label_index_stats():
+    """Get label index size, memory use and update time"""
+    try:
+        label_cache.sync()
+        return jsonify(label_cache.index.stats())
+    except Exception as e:
+        logger.error(f"Error getting label index stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/labels/sync/status', methods=['GET'])
+def get_label_sync_status():
+    """Get the label sync cursor and the times of the last full scan, sync and reconcile"""
+    try:
+        return jsonify({**label_sync.status(), 'task_id': state_backend.get(current_tenant().prefix + 'label_sync:task')})
+    except Exception as e:
+        logger.error(f"Error getting label sync status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/labels/top', methods=['GET'])
+def get_top_labels():
+    """Get the most used labels, overall or within one project"""
+    try:
+        k = min(max(1, request.args.get('k', 20, type=int)), 1000)
+        project = request.args.get('project') or None
+        label_stats.sync()
+        return jsonify({
+            'project': project,
+            'labels': [{'label': label, 'issues': count} for label, count in label_stats.top(k, project)],
+            'stats': label_stats.stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting top labels: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/labels/projects', methods=['GET'])
+def get_label_projects():
+    """Get labelled issue and distinct label counts per project"""
+    try:
+        label_stats.sync()
+        return jsonify({'projects': label_stats.project_summary()})
+    except Exception as e:
+        logger.error(f"Error getting label project breakdown: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/labels/unused', methods=['GET'])
+def get_unused_labels():
+    """Get labels not used on any issue updated since a date (since=YYYY-MM-DD, or days=N)"""
+    try:
+        since = request.args.get('since')
+        if since:
+            try:
+                since_time = datetime.fromisoformat(since)
+            except ValueError:
+                return jsonify({'error': 'since must be an ISO date (YYYY-MM-DD)'}), 400
+        else:
+            since_time = datetime.now() - timedelta(days=request.args.get('days', 90, type=int))
+        label_stats.sync()
+        unused = label_stats.unused_since(since_time.timestamp(), labels=label_cache.get_labels() if label_stats.issues else ())
+        return jsonify({
+            'since': since_time.isoformat(),
+            'labels': unused,
+            'total': len(unused)
+        })
+    except Exception as e:
+        logger.error(f"Error getting unused labels: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/labels/<label>/usage', methods=['GET'])
+def get_label_usage(label):
+    """Get the issue count of one label, split by project"""
+    try:
+        label_stats.sync()
+        return jsonify(label_stats.usage(label))
+    except Exception as e:
+        logger.error(f"Error getting label usage: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/labels', methods=['POST'])
 def add_label():
     try:
@@ -595,158 +782,155 @@ def add_label():
             return jsonify({'error': 'Failed to update issue'}), 500
 
         # Update the cache with the new label
-        existing_labels.append(new_label)
-        label_cache.update(existing_labels)
+        label_cache.update(existing_labels + [new_label])
         
         return jsonify({
             'message': 'Label added successfully',
             'exists': False,
             'label': new_label
         })
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error adding label: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
+def update_issue_labels(issue_key, update):
+    """Apply a label update to one issue; returns an error message or None"""
+    credentials = get_jira_credentials()
+    if not credentials:
+        return 'No JIRA credentials configured'
+    response = make_jira_request(
+        f'{credentials["url"]}/rest/api/2/issue/{issue_key}',
+        method='PUT',
+        json_data=update
+    )
+    if response is None:
+        return 'Jira request failed'
+    if response.status_code not in (200, 204):
+        return f'Jira returned {response.status_code}: {response.text[:200]}'
+    return None
+
+# Label rename/delete jobs checkpoint next to the label sync state so they resume after a restart
+LABEL_PROJECT = os.getenv('LABEL_PROJECT', 'SCAL')
+label_jobs = TenantLocal(lambda tenant: LabelJobs(
+    namespaced(label_sync_backend, tenant.prefix),
+    bind_tenant(search_labelled_issues, tenant),
+    # Issue updates run on the job's pool threads, so they carry the tenant with them
+    bind_tenant(update_issue_labels, tenant),
+    concurrency=int(os.getenv('LABEL_JOB_CONCURRENCY', 4))
+))
+
+def process_label_job(task_id, job_id):
+    """Background task: run (or resume) a label rename/delete job"""
+    task_queue.update(task_id, status='processing')
+    try:
+        job = label_jobs.run(job_id, progress=lambda summary: task_queue.update(task_id, progress=summary))
+    except TaskCancelled as e:
+        logger.info(f"Label job {job_id} stopped: {e.reason}")
+        record_partial_result(task_id, e.reason, label_jobs.summary(label_jobs.get(job_id)))
+        return
+
+    task_queue.update(task_id, status=job['status'], result=label_jobs.summary(job))
+    if job['status'] not in ('done', 'done_with_errors'):
+        return
+
+    # Update the cached labels right away; the next sync recounts the touched issues
+    added = [job['new_label']] if job['action'] == RENAME else []
+    removed = []
+    if not job['failed']:
+        label_stats.sync()
+        elsewhere = set(label_stats.usage(job['label'])['projects']) - {job['project']}
+        if not job['project'] or not elsewhere:
+            removed.append(job['label'])
+    label_sync.adjust(added=added, removed=removed)
+    save_label_snapshot()
+    refresh_labels_in_background()
+
+def start_label_job(action, label, new_label=None):
+    """Create a label job and queue it; returns the 202 response"""
+    project = request.args.get('project', LABEL_PROJECT).strip() or None
+    job = label_jobs.create(action, label, new_label=new_label, project=project)
+    task_id = submit_task('label_job', (job['job_id'],), {'status': 'pending', 'progress': None, 'result': None})
+    logger.info(f"Queued label job {job['job_id']} ({action} {label}) as task {task_id}")
+    return jsonify({'job_id': job['job_id'], 'task_id': task_id, 'status': 'started'}), 202
+
 @app.route('/api/labels/<old_label>', methods=['PUT'])
 def rename_label(old_label):
+    """Start a background job renaming a label on every issue that carries it"""
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
-            return jsonify({'error': 'Missing Jira credentials. Please check your .env file.'}), 400
+        if not get_jira_credentials():
+            return jsonify({'error': 'Missing Jira credentials. Please configure them in Settings.'}), 400
 
-        data = request.json
-        new_label = data.get('new_label')
+        data = request.json or {}
+        new_label = (data.get('new_label') or '').strip()
         if not new_label:
             return jsonify({'error': 'New label is required'}), 400
+        if new_label == old_label:
+            return jsonify({'error': 'New label must differ from the old one'}), 400
 
-        # Get the SCAL project key
-        projects_response = requests.get(
-            f'{JIRA_URL}/rest/api/2/project',
-            headers=get_jira_headers()
-        )
-        projects_response.raise_for_status()
-        projects = projects_response.json()
-        
-        scal_project = None
-        for project in projects:
-            if project['name'].upper() == 'SCAL' or project['key'].upper() == 'SCAL':
-                scal_project = project
-                break
-        
-        if not scal_project:
-            return jsonify({'error': 'SCAL project not found'}), 404
-
-        # Search for issues with the old label in SCAL project
-        response = requests.get(
-            f'{JIRA_URL}/rest/api/2/search',
-            headers=get_jira_headers(),
-            params={
-                'jql': f'project = {scal_project["key"]} AND labels = "{old_label}"',
-                'maxResults': 1000,
-                'fields': 'labels'
-            }
-        )
-        response.raise_for_status()
-        
-        issues = response.json().get('issues', [])
-        if not issues:
-            return jsonify({'error': f'No issues found with label: {old_label}'}), 404
-        
-        # Update each issue with the new label
-        for issue in issues:
-            issue_key = issue['key']
-            current_labels = issue.get('fields', {}).get('labels', [])
-            if old_label in current_labels:
-                current_labels.remove(old_label)
-                current_labels.append(new_label)
-                
-                update_response = requests.put(
-                    f'{JIRA_URL}/rest/api/2/issue/{issue_key}',
-                    headers=get_jira_headers(),
-                    json={'fields': {'labels': current_labels}}
-                )
-                update_response.raise_for_status()
-        
-        return jsonify({'message': 'Label renamed successfully'})
-    except requests.exceptions.RequestException as e:
-        if e.response is not None:
-            return jsonify({'error': f'Jira API error: {e.response.text}'}), e.response.status_code
-        return jsonify({'error': 'Failed to connect to Jira'}), 500
+        return start_label_job(RENAME, old_label, new_label)
     except Exception as e:
+        logger.error(f"Error starting label rename: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/labels/<label>', methods=['DELETE'])
 def delete_label(label):
+    """Start a background job removing a label from every issue that carries it"""
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
-            return jsonify({'error': 'Missing Jira credentials. Please check your .env file.'}), 400
+        if not get_jira_credentials():
+            return jsonify({'error': 'Missing Jira credentials. Please configure them in Settings.'}), 400
 
-        # Get the SCAL project key
-        projects_response = requests.get(
-            f'{JIRA_URL}/rest/api/2/project',
-            headers=get_jira_headers()
-        )
-        projects_response.raise_for_status()
-        projects = projects_response.json()
-        
-        scal_project = None
-        for project in projects:
-            if project['name'].upper() == 'SCAL' or project['key'].upper() == 'SCAL':
-                scal_project = project
-                break
-        
-        if not scal_project:
-            return jsonify({'error': 'SCAL project not found'}), 404
+        return start_label_job(DELETE, label)
+    except Exception as e:
+        logger.error(f"Error starting label delete: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        # Search for issues with the label in SCAL project
-        response = requests.get(
-            f'{JIRA_URL}/rest/api/2/search',
-            headers=get_jira_headers(),
-            params={
-                'jql': f'project = {scal_project["key"]} AND labels = "{label}"',
-                'maxResults': 1000,
-                'fields': 'labels'
-            }
-        )
-        response.raise_for_status()
-        
-        issues = response.json().get('issues', [])
-        if not issues:
-            return jsonify({'error': f'No issues found with label: {label}'}), 404
-        
-        # Remove the label from each issue
-        for issue in issues:
-            issue_key = issue['key']
-            current_labels = issue.get('fields', {}).get('labels', [])
-            if label in current_labels:
-                current_labels.remove(label)
-                
-                update_response = requests.put(
-                    f'{JIRA_URL}/rest/api/2/issue/{issue_key}',
-                    headers=get_jira_headers(),
-                    json={'fields': {'labels': current_labels}}
-                )
-                update_response.raise_for_status()
-        
-        return jsonify({'message': 'Label deleted successfully'})
-    except requests.exceptions.RequestException as e:
-        if e.response is not None:
-            return jsonify({'error': f'Jira API error: {e.response.text}'}), e.response.status_code
-        return jsonify({'error': 'Failed to connect to Jira'}), 500
+@app.route('/api/labels/jobs/<job_id>', methods=['GET'])
+def get_label_job(job_id):
+    """Get the progress and throughput of a label rename/delete job"""
+    try:
+        job = label_jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(label_jobs.summary(job))
+    except Exception as e:
+        logger.error(f"Error getting label job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/labels/jobs/<job_id>/resume', methods=['POST'])
+def resume_label_job(job_id):
+    """Queue a paused or failed label job again; it continues from its checkpoint"""
+    try:
+        job = label_jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] in ('done', 'done_with_errors'):
+            return jsonify({'error': 'Job already finished', 'status': job['status']}), 409
+        if job['status'] in ('pending', 'running'):
+            return jsonify({'error': 'Job is already queued or running', 'status': job['status']}), 409
+        task_id = submit_task('label_job', (job_id,), {'status': 'pending', 'progress': None, 'result': None})
+        return jsonify({'job_id': job_id, 'task_id': task_id, 'status': 'resumed'}), 202
     except Exception as e:
+        logger.error(f"Error resuming label job: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/jira/tracks', methods=['GET'])
 def get_jira_tracks():
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
+        credentials = get_jira_credentials()
+        if not credentials:
             return jsonify({'error': 'Missing Jira credentials'}), 500
-        response = make_jira_request(f'{JIRA_URL}/rest/api/2/project')
+        jira_url = credentials['url']
+        response = make_jira_request(f'{jira_url}/rest/api/2/project')
         if not response or response.status_code != 200:
             return jsonify({'error': 'Failed to fetch tracks from Jira'}), 500
         projects = response.json()
         tracks = [{'id': p['id'], 'key': p['key'], 'name': p['name']} for p in projects]
         return jsonify({'tracks': tracks})
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error fetching tracks: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -755,10 +939,12 @@ def get_jira_tracks():
 @app.route('/api/jira/tracks_customfield', methods=['GET'])
 def get_jira_tracks_customfield():
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
+        credentials = get_jira_credentials()
+        if not credentials:
             return jsonify({'error': 'Missing Jira credentials'}), 500
+        jira_url = credentials['url']
         # Try Jira Cloud v3 API for custom field context
-        context_url = f"{JIRA_URL}/rest/api/3/field/customfield_15428/context"
+        context_url = f"{jira_url}/rest/api/3/field/customfield_15428/context"
         context_response = make_jira_request(context_url)
         logger.debug(f"Custom field context response status: {context_response.status_code if context_response else 'No response'}")
         logger.debug(f"Custom field context response text: {context_response.text if context_response else 'No response'}")
@@ -770,7 +956,7 @@ def get_jira_tracks_customfield():
             return jsonify({'error': 'No context found for custom field'}), 404
         context_id = contexts[0]['id']
         # Now get options for this context
-        options_url = f"{JIRA_URL}/rest/api/3/field/customfield_15428/context/{context_id}/option"
+        options_url = f"{jira_url}/rest/api/3/field/customfield_15428/context/{context_id}/option"
         options_response = make_jira_request(options_url)
         logger.debug(f"Custom field options response status: {options_response.status_code if options_response else 'No response'}")
         logger.debug(f"Custom field options response text: {options_response.text if options_response else 'No response'}")
@@ -780,39 +966,51 @@ def get_jira_tracks_customfield():
         options = options_data.get('values', [])
         tracks = [{'id': opt['id'], 'value': opt['value']} for opt in options]
         return jsonify({'tracks': tracks})
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error fetching custom field options (v3): {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
+# Seconds board and sprint lists are reused from the tenant's cache
+JIRA_LIST_CACHE_SECONDS = int(os.getenv('JIRA_LIST_CACHE_SECONDS', 300))
+
 @app.route('/api/jira/boards_for_track', methods=['GET'])
 def get_boards_for_track():
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
+        credentials = get_jira_credentials()
+        if not credentials:
             return jsonify({'error': 'Missing Jira credentials'}), 500
+        jira_url = credentials['url']
         track = request.args.get('track', '').strip()
         logger.debug(f"Received track value for board search: '{track}'")
         if not track:
             return jsonify({'error': 'Missing track parameter'}), 400
-        boards = []
-        start_at = 0
-        max_results = 50
-        while True:
-            boards_url = f"{JIRA_URL}/rest/agile/1.0/board?type=scrum&startAt={start_at}&maxResults={max_results}"
-            response = make_jira_request(boards_url)
-            if not response or response.status_code != 200:
-                return jsonify({'error': 'Failed to fetch boards from Jira'}), 500
-            data = response.json()
-            for board in data.get('values', []):
-                logger.debug(f"Found board: '{board['name']}' (id: {board['id']})")
-                # Case-insensitive, trimmed prefix match
-                if board['name'].strip().lower().startswith(track.lower()):
-                    boards.append({'id': board['id'], 'name': board['name']})
-            if data.get('isLast', True) or len(data.get('values', [])) == 0:
-                break
-            start_at += max_results
+        # The scrum board list is cached per tenant, so searches for other tracks skip the paging
+        tenant_cache = current_tenant().cache
+        all_boards = tenant_cache.get('boards:scrum')
+        if all_boards is None:
+            all_boards = []
+            start_at = 0
+            max_results = 50
+            while True:
+                boards_url = f"{jira_url}/rest/agile/1.0/board?type=scrum&startAt={start_at}&maxResults={max_results}"
+                response = make_jira_request(boards_url)
+                if not response or response.status_code != 200:
+                    return jsonify({'error': 'Failed to fetch boards from Jira'}), 500
+                data = response.json()
+                all_boards.extend({'id': board['id'], 'name': board['name']} for board in data.get('values', []))
+                if data.get('isLast', True) or len(data.get('values', [])) == 0:
+                    break
+                start_at += max_results
+            tenant_cache.set('boards:scrum', all_boards, ttl=JIRA_LIST_CACHE_SECONDS)
+        # Case-insensitive, trimmed prefix match
+        boards = [board for board in all_boards if board['name'].strip().lower().startswith(track.lower())]
         logger.debug(f"Boards matching track '{track}': {boards}")
         return jsonify({'boards': boards})
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error fetching boards for track: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -821,29 +1019,35 @@ def get_boards_for_track():
 @app.route('/api/jira/sprints_for_board', methods=['GET'])
 def get_sprints_for_board():
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
+        credentials = get_jira_credentials()
+        if not credentials:
             return jsonify({'error': 'Missing Jira credentials'}), 500
+        jira_url = credentials['url']
         board_id = request.args.get('board_id', '').strip()
         if not board_id:
             return jsonify({'error': 'Missing board_id parameter'}), 400
 
-        # Step 1: Get ALL sprints from the board
-        all_sprints = []
-        start_at = 0
-        max_results = 50
-        
-        while True:
-            sprints_url = f"{JIRA_URL}/rest/agile/1.0/board/{board_id}/sprint?startAt={start_at}&maxResults={max_results}"
-            response = make_jira_request(sprints_url)
-            if not response or response.status_code != 200:
-                return jsonify({'error': 'Failed to fetch sprints from Jira'}), 500
-            data = response.json()
+        # Step 1: Get ALL sprints from the board (cached per tenant for a few minutes)
+        tenant_cache = current_tenant().cache
+        all_sprints = tenant_cache.get(f'sprints:{board_id}')
+        if all_sprints is None:
+            all_sprints = []
+            start_at = 0
+            max_results = 50
             
-            all_sprints.extend(data.get('values', []))
-                        
-            if data.get('isLast', True) or len(data.get('values', [])) == 0:
-                break
-            start_at += max_results
+            while True:
+                sprints_url = f"{jira_url}/rest/agile/1.0/board/{board_id}/sprint?startAt={start_at}&maxResults={max_results}"
+                response = make_jira_request(sprints_url)
+                if not response or response.status_code != 200:
+                    return jsonify({'error': 'Failed to fetch sprints from Jira'}), 500
+                data = response.json()
+                
+                all_sprints.extend(data.get('values', []))
+                            
+                if data.get('isLast', True) or len(data.get('values', [])) == 0:
+                    break
+                start_at += max_results
+            tenant_cache.set(f'sprints:{board_id}', all_sprints, ttl=JIRA_LIST_CACHE_SECONDS)
 
         print(f"Total sprints fetched: {len(all_sprints)}")
         
@@ -878,6 +1082,8 @@ def get_sprints_for_board():
         
         return jsonify({'sprints': result_sprints})
         
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error fetching sprints for board: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -890,11 +1096,9 @@ def start_sprint_report_task():
         board_id = request.args.get('board_id', '').strip()
         if not sprint_id or not board_id:
             return jsonify({'error': 'Missing sprint_id or board_id parameter'}), 400
-        # Generate a unique task ID
-        task_id = str(uuid.uuid4())
-        # Start background thread
-        thread = threading.Thread(target=process_sprint_report, args=(task_id, sprint_id, board_id))
-        thread.start()
+        # Queue the report on the background worker pool
+        task_id = submit_task('sprint_report', (sprint_id, board_id),
+                                    {'progress': 0, 'status': 'pending', 'result': None})
         # Return the task ID immediately
         return jsonify({'task_id': task_id})
     except Exception as e:
@@ -905,18 +1109,49 @@ def start_sprint_report_task():
 @app.route('/api/jira/sprint_report_progress', methods=['GET'])
 def get_sprint_report_progress():
     task_id = request.args.get('task_id', '').strip()
-    if not task_id or task_id not in sprint_report_tasks:
+    task = task_queue.get(task_id, 'sprint_report') if task_id else None
+    if not task:
         return jsonify({'error': 'Invalid or missing task_id'}), 400
-    task = sprint_report_tasks[task_id]
     return jsonify({
         'progress': task.get('progress', 0),
         'status': task.get('status', 'pending'),
-        'result': task.get('result') if task.get('status') == 'done' else None
+        # Tasks stopped by cancellation or their deadline keep the result gathered before the stop
+        'result': task.get('result') if task.get('status') in ('done', 'partial', CANCELLED) else None
     })
 
+def sprint_report_summary(sprint, sprint_analysis):
+    """The sprint report result: sprint details plus the counts from an analyze_sprint row"""
+    return {
+        'sprint': {
+            'id': sprint.get('id'),
+            'name': sprint.get('name'),
+            'state': sprint.get('state'),
+            'startDate': sprint.get('startDate'),
+            'endDate': sprint.get('endDate'),
+            'goal': sprint.get('goal'),
+        } if sprint else None,
+        'counts': {
+            'completed': sprint_analysis.get('Completed', 0),
+            'not_completed': sprint_analysis.get('Not Completed', 0),
+            'added_in_middle': sprint_analysis.get('Added During Sprint', 0),
+            'removed_in_middle': sprint_analysis.get('Removed During Sprint', 0),
+            'initial_planned': sprint_analysis.get('Initial Planned', 0)
+        } if sprint_analysis else None,
+        'added_in_middle_keys': (sprint_analysis or {}).get('added_during_sprint_keys', []),
+        'removed_in_middle_keys': (sprint_analysis or {}).get('removed_during_sprint_keys', [])
+    }
+
+def record_partial_result(task_id, reason, result):
+    """Record the partial result of a task stopped by cancellation or by its deadline"""
+    result = dict(result or {})
+    result['partial'] = True
+    result['partial_reason'] = reason
+    task_queue.update(task_id, status=CANCELLED if reason == CANCELLED else 'partial', result=result)
+
 def process_sprint_report(task_id, sprint_id, board_id):
+    sprint = None
     try:
-        sprint_report_tasks[task_id] = {'progress': 0, 'status': 'processing', 'result': None}
+        task_queue.update(task_id, progress=0, status='processing', result=None)
         print(f"DEBUG: Starting sprint report processing for sprint {sprint_id}, board {board_id}")
         
         # Import the analyze_sprint function from our jira_sprint_report module
@@ -925,16 +1160,14 @@ def process_sprint_report(task_id, sprint_id, board_id):
             print(f"DEBUG: Successfully imported analyze_sprint function")
         except Exception as import_error:
             print(f"DEBUG: Failed to import analyze_sprint: {import_error}")
-            sprint_report_tasks[task_id]['status'] = 'error'
-            sprint_report_tasks[task_id]['result'] = {'error': f'Import error: {import_error}'}
+            task_queue.update(task_id, status='error', result={'error': f'Import error: {import_error}'})
             return
         
         # Get JIRA credentials
         credentials = get_jira_credentials()
         if not credentials:
             print(f"DEBUG: No JIRA credentials available")
-            sprint_report_tasks[task_id]['status'] = 'error'
-            sprint_report_tasks[task_id]['result'] = {'error': 'No JIRA credentials configured'}
+            task_queue.update(task_id, status='error', result={'error': 'No JIRA credentials configured'})
             return
         
         # Fetch sprint details first
@@ -943,68 +1176,52 @@ def process_sprint_report(task_id, sprint_id, board_id):
         sprint_resp = make_jira_request(sprint_url)
         if not sprint_resp or sprint_resp.status_code != 200:
             print(f"DEBUG: Failed to fetch sprint details. Status: {sprint_resp.status_code if sprint_resp else 'None'}")
-            sprint_report_tasks[task_id]['status'] = 'error'
-            sprint_report_tasks[task_id]['result'] = {'error': 'Failed to fetch sprint details'}
+            task_queue.update(task_id, status='error', result={'error': 'Failed to fetch sprint details'})
             return
         
         sprint = sprint_resp.json()
         print(f"DEBUG: Successfully fetched sprint: {sprint.get('name', 'Unknown')}")
-        sprint_report_tasks[task_id]['progress'] = 25
+        task_queue.update(task_id, progress=25)
         
         # Use our analyze_sprint function which has the correct logic and debugging
         print(f"DEBUG: Calling analyze_sprint function")
         sprint_analysis = analyze_sprint(sprint, board_id)
         print(f"DEBUG: analyze_sprint returned: {sprint_analysis}")
-        sprint_report_tasks[task_id]['progress'] = 75
+        task_queue.update(task_id, progress=75)
         
         if sprint_analysis:
             # Convert our analysis format to the expected format
-            summary = {
-                'sprint': {
-                    'id': sprint.get('id'),
-                    'name': sprint.get('name'),
-                    'state': sprint.get('state'),
-                    'startDate': sprint.get('startDate'),
-                    'endDate': sprint.get('endDate'),
-                    'goal': sprint.get('goal'),
-                },
-                'counts': {
-                    'completed': sprint_analysis.get('completed', 0),
-                    'not_completed': sprint_analysis.get('not_completed', 0),
-                    'added_in_middle': sprint_analysis.get('added_during_sprint', 0),
-                    'removed_in_middle': sprint_analysis.get('removed_during_sprint', 0),
-                    'initial_planned': sprint_analysis.get('initial_planned', 0)
-                },
-                'added_in_middle_keys': sprint_analysis.get('added_during_sprint_keys', []),
-                'removed_in_middle_keys': sprint_analysis.get('removed_during_sprint_keys', [])
-            }
+            summary = sprint_report_summary(sprint, sprint_analysis)
             print(f"DEBUG: Sprint analysis completed successfully")
-            sprint_report_tasks[task_id]['status'] = 'done'
-            sprint_report_tasks[task_id]['result'] = summary
+            task_queue.update(task_id, status='done', result=summary)
         else:
             print(f"DEBUG: analyze_sprint returned None")
-            sprint_report_tasks[task_id]['status'] = 'error'
-            sprint_report_tasks[task_id]['result'] = {'error': 'Failed to analyze sprint'}
+            task_queue.update(task_id, status='error', result={'error': 'Failed to analyze sprint'})
             
+    except TaskCancelled as e:
+        print(f"DEBUG: Sprint report {task_id} stopped: {e.reason}")
+        # e.partial_data holds the counts analyze_sprint gathered before it stopped
+        record_partial_result(task_id, e.reason, sprint_report_summary(sprint, e.partial_data))
     except Exception as e:
         print(f"DEBUG: Exception in process_sprint_report: {str(e)}")
         import traceback
         print(f"DEBUG: Traceback: {traceback.format_exc()}")
-        sprint_report_tasks[task_id]['status'] = 'error'
-        sprint_report_tasks[task_id]['result'] = {'error': str(e)}
+        task_queue.update(task_id, status='error', result={'error': str(e)})
 
 @app.route('/api/jira/all_boards', methods=['GET'])
 def get_all_boards():
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
+        credentials = get_jira_credentials()
+        if not credentials:
             return jsonify({'error': 'Missing Jira credentials'}), 500
+        jira_url = credentials['url']
         
         # List of specific board IDs you want to fetch
         board_ids = ['1707']  # Add your specific board IDs here
         boards = []
         
         for board_id in board_ids:
-            board_url = f"{JIRA_URL}/rest/agile/1.0/board/{board_id}"
+            board_url = f"{jira_url}/rest/agile/1.0/board/{board_id}"
             response = make_jira_request(board_url)
             if response and response.status_code == 200:
                 board_data = response.json()
@@ -1019,6 +1236,8 @@ def get_all_boards():
         print("Failed board IDs:", [bid for bid in board_ids if bid not in [b['id'] for b in boards]])
         
         return jsonify({'boards': boards})
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error fetching all boards: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -1027,8 +1246,10 @@ def get_all_boards():
 @app.route('/api/jira/sprint_trends', methods=['GET'])
 def get_sprint_trends():
     try:
-        if not all([JIRA_URL, JIRA_EMAIL, JIRA_API_TOKEN]):
+        credentials = get_jira_credentials()
+        if not credentials:
             return jsonify({'error': 'Missing Jira credentials'}), 500
+        jira_url = credentials['url']
 
         board_id = request.args.get('board_id', '').strip()
         if not board_id:
@@ -1039,7 +1260,7 @@ def get_sprint_trends():
         start_at = 0
         max_results = 20
         while True:
-            sprints_url = f"{JIRA_URL}/rest/agile/1.0/board/{board_id}/sprint?startAt={start_at}&maxResults={max_results}&state=active,closed"
+            sprints_url = f"{jira_url}/rest/agile/1.0/board/{board_id}/sprint?startAt={start_at}&maxResults={max_results}&state=active,closed"
             response = make_jira_request(sprints_url)
             if not response or response.status_code != 200:
                 return jsonify({'error': 'Failed to fetch sprints from Jira'}), 500
@@ -1061,7 +1282,7 @@ def get_sprint_trends():
         sprint_details = []
         for sprint in sprints:
             sprint_id = sprint['id']
-            sprint_url = f"{JIRA_URL}/rest/agile/1.0/sprint/{sprint_id}"
+            sprint_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}"
             sprint_resp = make_jira_request(sprint_url)
             if not sprint_resp or sprint_resp.status_code != 200:
                 logger.debug(f"Skipping sprint {sprint_id}: failed to fetch details")
@@ -1075,7 +1296,7 @@ def get_sprint_trends():
             sprint_end_dt = parser.parse(sprint_end)
 
             # Get all issues in the sprint
-            issues_url = f"{JIRA_URL}/rest/agile/1.0/sprint/{sprint_id}/issue?maxResults=100"
+            issues_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}/issue?maxResults=100"
             issues_resp = make_jira_request(issues_url)
             if not issues_resp or issues_resp.status_code != 200:
                 logger.debug(f"Skipping sprint {sprint_id}: failed to fetch issues")
@@ -1090,7 +1311,7 @@ def get_sprint_trends():
             for issue in issues:
                 issue_key = issue['key']
                 # Fetch changelog for the issue
-                issue_url = f"{JIRA_URL}/rest/api/2/issue/{issue_key}?expand=changelog"
+                issue_url = f"{jira_url}/rest/api/2/issue/{issue_key}?expand=changelog"
                 issue_resp = make_jira_request(issue_url)
                 if not issue_resp or issue_resp.status_code != 200:
                     logger.debug(f"Skipping issue {issue_key}: failed to fetch changelog")
@@ -1136,6 +1357,8 @@ def get_sprint_trends():
             logger.debug(f"Sprint {sprint_id} processed: completed={completed_count}, not_completed={not_completed_count}")
 
         return jsonify({'sprints': sprint_details})
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error fetching sprint trends: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -1147,9 +1370,8 @@ def start_sprint_trends_task():
         board_id = request.args.get('board_id', '').strip()
         if not board_id:
             return jsonify({'error': 'Missing board_id parameter'}), 400
-        task_id = str(uuid.uuid4())
-        thread = threading.Thread(target=process_sprint_trends, args=(task_id, board_id))
-        thread.start()
+        task_id = submit_task('sprint_trends', (board_id,),
+                                    {'progress': 0, 'status': 'pending', 'result': {'sprints': []}})
         return jsonify({'task_id': task_id})
     except Exception as e:
         logger.error(f"Error starting sprint trends task: {str(e)}")
@@ -1159,9 +1381,9 @@ def start_sprint_trends_task():
 @app.route('/api/jira/sprint_trends_progress', methods=['GET'])
 def get_sprint_trends_progress():
     task_id = request.args.get('task_id', '').strip()
-    if not task_id or task_id not in sprint_trends_tasks:
+    task = task_queue.get(task_id, 'sprint_trends') if task_id else None
+    if not task:
         return jsonify({'error': 'Invalid or missing task_id'}), 400
-    task = sprint_trends_tasks[task_id]
     # Always return current partial results, even if not done
     return jsonify({
         'progress': task.get('progress', 0),
@@ -1170,18 +1392,23 @@ def get_sprint_trends_progress():
     })
 
 def process_sprint_trends(task_id, board_id):
+    sprint_details = []
     try:
-        sprint_trends_tasks[task_id] = {'progress': 0, 'status': 'processing', 'result': {'sprints': []}}
+        task_queue.update(task_id, progress=0, status='processing', result={'sprints': []})
+        credentials = get_jira_credentials()
+        if not credentials:
+            task_queue.update(task_id, status='error', result={'error': 'Missing Jira credentials. Please configure them in Settings.'})
+            return
+        jira_url = credentials['url']
         # Get all sprints for the board (limit to 20 for speed)
         sprints = []
         start_at = 0
         max_results = 20
         while True:
-            sprints_url = f"{JIRA_URL}/rest/agile/1.0/board/{board_id}/sprint?startAt={start_at}&maxResults={max_results}&state=active,closed"
+            sprints_url = f"{jira_url}/rest/agile/1.0/board/{board_id}/sprint?startAt={start_at}&maxResults={max_results}&state=active,closed"
             response = make_jira_request(sprints_url)
             if not response or response.status_code != 200:
-                sprint_trends_tasks[task_id]['status'] = 'error'
-                sprint_trends_tasks[task_id]['result'] = {'error': 'Failed to fetch sprints from Jira'}
+                task_queue.update(task_id, status='error', result={'error': 'Failed to fetch sprints from Jira'})
                 return
             data = response.json()
             sprints.extend(data.get('values', []))
@@ -1192,12 +1419,12 @@ def process_sprint_trends(task_id, board_id):
         sprints.sort(key=lambda x: x.get('endDate', ''), reverse=True)
         sprints_to_add = sprints[:5]
         logger.debug(f"Processing {len(sprints_to_add)} sprints for board {board_id}")
-        sprint_details = []
         total_issues = 0
         for sprint in sprints_to_add:
+            check_cancelled()
             sprint_id = sprint['id']
             sprint_name = sprint['name']
-            sprint_url = f"{JIRA_URL}/rest/agile/1.0/sprint/{sprint_id}"
+            sprint_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}"
             sprint_resp = make_jira_request(sprint_url)
             if not sprint_resp or sprint_resp.status_code != 200:
                 logger.debug(f"Skipping sprint {sprint_id}: failed to fetch details")
@@ -1209,7 +1436,7 @@ def process_sprint_trends(task_id, board_id):
                 continue
             from dateutil import parser
             sprint_end_dt = parser.parse(sprint_end)
-            issues_url = f"{JIRA_URL}/rest/agile/1.0/sprint/{sprint_id}/issue?maxResults=100"
+            issues_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}/issue?maxResults=100"
             issues_resp = make_jira_request(issues_url)
             if not issues_resp or issues_resp.status_code != 200:
                 logger.debug(f"Skipping sprint {sprint_id}: failed to fetch issues")
@@ -1220,8 +1447,9 @@ def process_sprint_trends(task_id, board_id):
             completed_count = 0
             not_completed_count = 0
             for issue in issues:
+                check_cancelled()
                 issue_key = issue['key']
-                issue_url = f"{JIRA_URL}/rest/api/2/issue/{issue_key}?expand=changelog"
+                issue_url = f"{jira_url}/rest/api/2/issue/{issue_key}?expand=changelog"
                 issue_resp = make_jira_request(issue_url)
                 if not issue_resp or issue_resp.status_code != 200:
                     logger.debug(f"Skipping issue {issue_key}: failed to fetch changelog")
@@ -1303,12 +1531,15 @@ def process_sprint_trends(task_id, board_id):
                     'not_completed': not_completed_count
                 }
             })
-            sprint_trends_tasks[task_id]['result'] = {'sprints': list(sprint_details)}
+            task_queue.update(task_id, result={'sprints': list(sprint_details)})
             logger.debug(f"Sprint {sprint_id} processed: completed={completed_count}, not_completed={not_completed_count}")
-        sprint_trends_tasks[task_id]['status'] = 'done'
+        task_queue.update(task_id, status='done')
+    except TaskCancelled as e:
+        # Only fully processed sprints are reported; the one in flight is dropped
+        logger.info(f"Sprint trends {task_id} stopped after {len(sprint_details)} sprints: {e.reason}")
+        record_partial_result(task_id, e.reason, {'sprints': list(sprint_details)})
     except Exception as e:
-        sprint_trends_tasks[task_id]['status'] = 'error'
-        sprint_trends_tasks[task_id]['result'] = {'error': str(e)}
+        task_queue.update(task_id, status='error', result={'error': str(e)})
 
 @app.route('/api/jira_sprint_report', methods=['GET'])
 def api_jira_sprint_report():
@@ -1406,6 +1637,8 @@ def api_jira_sprint_report():
             )
         else:
             return jsonify({'report': filtered_report})
+    except SchedulerBusy:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1558,11 +1791,8 @@ def start_capacity_analysis():
         if '@' not in user_email:
             return jsonify({'error': 'Invalid email format'}), 400
         
-        # Generate unique task ID
-        task_id = str(uuid.uuid4())
-        
-        # Initialize task status
-        capacity_analysis_tasks[task_id] = {
+        # Queue the analysis on the background worker pool
+        task_id = submit_task('capacity_analysis', (user_email, weeks_back), {
             'status': 'in_progress',
             'progress': 0,
             'result': None,
@@ -1570,14 +1800,7 @@ def start_capacity_analysis():
             'user_email': user_email,
             'weeks_back': weeks_back,
             'started_at': datetime.now().isoformat()
-        }
-        
-        # Start background task
-        thread = threading.Thread(
-            target=process_capacity_analysis,
-            args=(task_id, user_email, weeks_back)
-        )
-        thread.start()
+        })
         
         return jsonify({
             'task_id': task_id,
@@ -1592,10 +1815,10 @@ def start_capacity_analysis():
 @app.route('/api/capacity/progress/<task_id>', methods=['GET'])
 def get_capacity_analysis_progress(task_id):
     """Get the progress of a capacity analysis task"""
-    if task_id not in capacity_analysis_tasks:
+    task = task_queue.get(task_id, 'capacity_analysis')
+    if not task:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = capacity_analysis_tasks[task_id]
     return jsonify({
         'task_id': task_id,
         'status': task['status'],
@@ -1613,31 +1836,161 @@ def process_capacity_analysis(task_id, user_email, weeks_back):
         logger.info(f"Starting capacity analysis for {user_email} (last {weeks_back} weeks)")
         
         # Update progress
-        capacity_analysis_tasks[task_id]['progress'] = 10
-        capacity_analysis_tasks[task_id]['status'] = 'fetching_data'
+        task_queue.update(task_id, progress=10, status='fetching_data')
         
         # Perform the analysis
         result = analyze_user_capacity(user_email, weeks_back)
         
         # Update progress
-        capacity_analysis_tasks[task_id]['progress'] = 90
+        task_queue.update(task_id, progress=90)
         
         if 'error' in result:
-            capacity_analysis_tasks[task_id]['status'] = 'error'
-            capacity_analysis_tasks[task_id]['error'] = result['error']
+            task_queue.update(task_id, status='error', error=result['error'])
+        elif result.get('partial'):
+            task_queue.update(task_id, status='partial', result=result, progress=100)
         else:
-            capacity_analysis_tasks[task_id]['status'] = 'completed'
-            capacity_analysis_tasks[task_id]['result'] = result
-            capacity_analysis_tasks[task_id]['progress'] = 100
+            task_queue.update(task_id, status='completed', result=result, progress=100)
         
         logger.info(f"Capacity analysis completed for {user_email}")
         
+    except TaskCancelled as e:
+        logger.info(f"Capacity analysis for {user_email} stopped: {e.reason}")
+        if e.partial_data:
+            # Analyze the issue pages get_user_issues fetched before the stop
+            record_partial_result(task_id, e.reason,
+                                  summarize_user_capacity(user_email, weeks_back, e.partial_data, e.reason))
+        else:
+            task_queue.update(task_id, status=CANCELLED if e.reason == CANCELLED else 'partial', result=None)
     except Exception as e:
         logger.error(f"Error in capacity analysis for {user_email}: {str(e)}")
-        capacity_analysis_tasks[task_id]['status'] = 'error'
-        capacity_analysis_tasks[task_id]['error'] = str(e)
+        task_queue.update(task_id, status='error', error=str(e))
+
+def for_task_tenant(handler):
+    """Wrap a task handler so it runs for the tenant that submitted the task"""
+    def run(task_id, *args):
+        with use_tenant((task_queue.get(task_id) or {}).get('tenant')):
+            return handler(task_id, *args)
+    run.__name__ = getattr(handler, '__name__', 'for_task_tenant')
+    return run
+
+# Register background task handlers and start the worker pool. Flows are per tenant, so one
+# tenant's backlog cannot take another's fair share of the Jira slots.
+TASK_DEADLINE_SECONDS = int(os.getenv('TASK_DEADLINE_SECONDS', 600))
+task_queue.register('sprint_report', for_task_tenant(scheduled(
+    process_sprint_report, BACKGROUND,
+    flow=lambda task_id, sprint_id, board_id: current_tenant().scoped(f"board:{board_id}")
+)), deadline=TASK_DEADLINE_SECONDS)
+task_queue.register('sprint_trends', for_task_tenant(scheduled(
+    process_sprint_trends, BACKGROUND, flow=lambda task_id, board_id: current_tenant().scoped(f"board:{board_id}")
+)), deadline=TASK_DEADLINE_SECONDS)
+task_queue.register('capacity_analysis', for_task_tenant(scheduled(
+    process_capacity_analysis, BACKGROUND,
+    flow=lambda task_id, user_email, weeks_back: current_tenant().scoped(f"user:{user_email}")
+)), deadline=TASK_DEADLINE_SECONDS)
+task_queue.register('label_sync', for_task_tenant(scheduled(
+    process_label_sync, PREFETCH, flow=lambda task_id: current_tenant().scoped('labels')
+)))
+# Label jobs checkpoint as they go, so they run without a deadline
+task_queue.register('label_job', for_task_tenant(scheduled(
+    process_label_job, BACKGROUND, flow=lambda task_id, job_id: current_tenant().scoped('labels')
+)))
+task_queue.start()
+threading.Thread(target=label_refresher_loop, name="label-refresher", daemon=True).start()
+
+@app.route('/api/tasks/stats', methods=['GET'])
+def get_task_queue_stats():
+    """Get background task queue depth and timing statistics"""
+    try:
+        return jsonify(task_queue.stats())
+    except Exception as e:
+        logger.error(f"Error getting task queue stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tenants', methods=['GET'])
+def get_tenants():
+    """Get the configured Jira tenants with their rate budget and cache usage"""
+    try:
+        return jsonify({'tenants': tenants.stats(), 'clients': jira_clients.stats()})
+    except Exception as e:
+        logger.error(f"Error getting tenants: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jira/scheduler/stats', methods=['GET'])
+def get_jira_scheduler_stats():
+    """Get per-class queue depth, admission and wait-time metrics for Jira calls"""
+    try:
+        return jsonify(jira_scheduler.stats())
+    except Exception as e:
+        logger.error(f"Error getting Jira scheduler stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tasks/<task_id>', methods=['GET'])
+def get_task_timing(task_id):
+    """Get queue timing information for a background task"""
+    timing = task_queue.get_timing(task_id)
+    if not timing:
+        return jsonify({'error': 'Task not found'}), 404
+    return jsonify({'task_id': task_id, **timing})
+
+@app.route('/api/tasks/<task_id>/cancel', methods=['POST'])
+def cancel_task(task_id):
+    """Cancel a queued or running background task; running tasks stop at their next cancellation point"""
+    try:
+        if not task_queue.cancel(task_id):
+            return jsonify({'error': 'Task not found or already finished'}), 404
+        return jsonify({'task_id': task_id, 'cancel_requested': True})
+    except Exception as e:
+        logger.error(f"Error cancelling task {task_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tasks/<task_id>/events', methods=['GET'])
+def stream_task_events(task_id):
+    """
+    Push progress, partial results and completion for a background task over SSE.
+    Clients resume after a reconnect with the Last-Event-ID header (or last_event_id query parameter).
+    """
+    if not task_queue.get_timing(task_id):
+        return jsonify({'error': 'Task not found'}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
 
+    def task_finished():
+        timing = task_queue.get_timing(task_id)
+        return not timing or timing['queue_status'] == 'finished'
+
+    # A resumed stream for a task whose final event was already delivered; 204 stops EventSource reconnecting
+    if task_finished() and not task_queue.get_events(task_id, last_event_id):
+        return Response(status=204)
+
+    def generate_task_events(after_id):
+        yield "retry: 3000\n\n"
+        while True:
+            events = task_queue.wait_for_events(task_id, after_id, timeout=15.0)
+            if not events:
+                if task_finished():
+                    return
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            for event_id, event_type, data in events:
+                after_id = event_id
+                yield f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps({'task_id': task_id, **data})}\n\n"
+                if event_type == 'complete':
+                    return
+
+    return Response(
+        generate_task_events(last_event_id),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
 def analyze_sprint_report_data(sprint_data):
     """Analyze sprint report data comprehensively"""
@@ -2134,13 +2487,21 @@ def analyze_sprint_report_data(sprint_data):
         'fallback': True
     }
 
-def get_openai_insights(sprint_data, openai_config):
+# Bump whenever the prompt, system message or sampling parameters below change, so cached answers are not reused
+AI_PROMPT_VERSION = 1
+OPENAI_MODEL = "gpt-4o-mini-2024-07-18"
+
+def openai_model(openai_config):
+    """Model (or Azure deployment) the insights are requested from"""
+    return openai_config['azure_deployment_name'] if openai_config['use_azure'] else OPENAI_MODEL
+
+def get_openai_insights(sprint_data, openai_config, summary=None):
     """Get AI-powered insights using OpenAI/Azure OpenAI"""
     try:
         from openai import AzureOpenAI, OpenAI
         
         # Prepare data summary for AI
-        summary = prepare_sprint_summary_for_ai(sprint_data)
+        summary = summary or prepare_sprint_summary_for_ai(sprint_data)
         
         prompt = f"""
         Analyze the following sprint performance data and provide insights:
@@ -2176,10 +2537,9 @@ def get_openai_insights(sprint_data, openai_config):
                 api_version=openai_config['azure_api_version'],
                 azure_endpoint=openai_config['azure_endpoint']
             )
-            model = openai_config['azure_deployment_name']
         else:
             client = OpenAI(api_key=openai_config['api_key'])
-            model = "gpt-4o-mini-2024-07-18"
+        model = openai_model(openai_config)
         
         response = client.chat.completions.create(
             model=model,
@@ -2295,6 +2655,18 @@ def prepare_sprint_summary_for_ai(sprint_data):
     
     return summary
 
+# Answers for identical sprint summaries are reused; sprints that are all closed cannot change, so theirs never expire
+ai_cache = AIResponseCache(
+    durable_backend(os.getenv('STATE_SQLITE_PATH', 'state.db')),
+    ttl=float(os.getenv('AI_CACHE_TTL_HOURS', 24)) * 3600,
+    stale_ttl=float(os.getenv('AI_CACHE_STALE_HOURS', 168)) * 3600
+)
+
+def sprints_closed(sprint_data):
+    """Whether every sprint in the data is closed, so the summary sent to the model is final"""
+    return all(isinstance(sprint, dict) and str(sprint.get('state', sprint.get('Status', ''))).lower() == 'closed'
+               for sprint in sprint_data)
+
 @app.route('/api/sprint/ai-insights', methods=['POST'])
 def api_sprint_ai_insights():
     """Generate AI-powered insights for sprint data"""
@@ -2314,13 +2686,20 @@ def api_sprint_ai_insights():
         insights = analyze_sprint_report_data(sprint_data)
         
         # Try to get OpenAI insights if configured
+        cache_info = None
         try:
-            from settings_manager import SettingsManager
-            settings = SettingsManager()
-            openai_config = settings.get_openai_config()
+            openai_config = settings_manager.get_openai_config()
             
             if openai_config['api_key'] and len(openai_config['api_key']) > 10:
-                ai_insights = get_openai_insights(sprint_data, openai_config)
+                summary = prepare_sprint_summary_for_ai(sprint_data)
+                ai_insights, cache_info = ai_cache.get_or_compute(
+                    fingerprint(summary, openai_model(openai_config), AI_PROMPT_VERSION),
+                    lambda: get_openai_insights(sprint_data, openai_config, summary),
+                    # Errors and unparseable answers are asked for again next time
+                    cacheable=lambda result: bool(result) and not result.get('fallback'),
+                    permanent=sprints_closed(sprint_data),
+                    refresh=bool(data.get('refresh'))
+                )
                 if ai_insights:
                     # Merge AI insights with basic analysis
                     insights.update(ai_insights)
@@ -2335,21 +2714,32 @@ def api_sprint_ai_insights():
         
         return jsonify({
             'status': 'success',
-            'insights': insights
+            'insights': insights,
+            'cache': cache_info
         })
     
     except Exception as e:
         logger.error(f"Error generating AI insights: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sprint/ai-insights/cache', methods=['GET'])
+def get_ai_cache_stats():
+    """Get hit, stale and miss counts of the AI insights cache"""
+    try:
+        return jsonify(ai_cache.stats())
+    except Exception as e:
+        logger.error(f"Error getting AI cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/capacity/export/<task_id>', methods=['GET'])
 def export_capacity_analysis(task_id):
     """Export capacity analysis results as CSV with user preferences"""
-    if task_id not in capacity_analysis_tasks:
+    task = task_queue.get(task_id, 'capacity_analysis')
+    if not task:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = capacity_analysis_tasks[task_id]
-    if task['status'] != 'completed' or not task['result']:
+    # Partial results (deadline reached or cancelled) can be exported too
+    if task['status'] not in ('completed', 'partial', CANCELLED) or not (task['result'] or {}).get('metrics'):
         return jsonify({'error': 'Analysis not completed or no results available'}), 400
     
     try:
@@ -2374,6 +2764,8 @@ def export_capacity_analysis(task_id):
         output.write(f"JIRA Link{delimiter}{result.get('jira_link', 'N/A')}\n")
         output.write(f"JQL Query{delimiter}{result.get('jql_query', 'N/A')}\n")
         output.write(f"Generated{delimiter}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        if result.get('partial'):
+            output.write(f"Partial Result{delimiter}{result.get('partial_reason', '')}\n")
         output.write("\n")
         
         # Write issue breakdown
@@ -2647,8 +3039,10 @@ def test_openai_connection():
             logger.error(f"OpenAI test error: {error_msg}")
             return jsonify({'error': f'API test failed: {error_msg}'}), 500
 
-# Share link storage (in production, use a database)
-shared_reports = {}
+# Share links live in the state backend so any process can serve them
+SHARE_PREFIX = 'share:'
+# Expired links are kept a little longer so visitors see "expired" rather than "not found"
+SHARE_EXPIRED_GRACE = timedelta(days=1)
 
 @app.route('/api/capacity/share-link', methods=['POST'])
 def create_share_link():
@@ -2673,12 +3067,12 @@ def create_share_link():
         expiration_date = datetime.now() + timedelta(days=expires_in_days)
         
         # Store the shared report
-        shared_reports[share_id] = {
+        state_backend.set(SHARE_PREFIX + share_id, {
             'report_data': report_data,
             'created_at': datetime.now().isoformat(),
             'expires_at': expiration_date.isoformat(),
             'access_count': 0
-        }
+        }, ttl=(timedelta(days=expires_in_days) + SHARE_EXPIRED_GRACE).total_seconds())
         
         # Generate share URL
         share_url = f"{request.host_url}share/{share_id}"
@@ -2697,24 +3091,25 @@ def create_share_link():
 def view_shared_report(share_id):
     """View a shared capacity analysis report"""
     try:
-        if share_id not in shared_reports:
+        shared_report = state_backend.get(SHARE_PREFIX + share_id)
+        if not shared_report:
             return render_template('error.html', 
                                  error_title="Report Not Found",
                                  error_message="The shared report link is invalid or has expired."), 404
         
-        shared_report = shared_reports[share_id]
-        
         # Check if expired
         expiration_date = datetime.fromisoformat(shared_report['expires_at'])
         if datetime.now() > expiration_date:
-            # Clean up expired report
-            del shared_reports[share_id]
             return render_template('error.html',
                                  error_title="Report Expired",
                                  error_message="This shared report link has expired."), 410
         
         # Increment access count
-        shared_report['access_count'] += 1
+        def count_access(report):
+            if report:
+                report['access_count'] += 1
+            return report
+        shared_report = state_backend.update(SHARE_PREFIX + share_id, count_access) or shared_report
         
         # Render the shared report
         return render_template('shared_report.html', 
@@ -2880,6 +3275,8 @@ def api_issues_multi_sprint():
             'jira_link': jira_link,
             'issues': multi_sprint_issues
         })
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error in multi-sprint issues API: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -2978,6 +3375,8 @@ def api_issues_multi_sprint_by_team():
             'jira_link': jira_link,
             'issues': multi_sprint_issues
         })
+    except SchedulerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error in multi-sprint issues by team API: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -2988,7 +3387,19 @@ def get_analytics_stats():
     """Get user analytics statistics"""
     try:
         days = request.args.get('days', 30, type=int)
-        stats = tracker.get_user_stats(days)
+        approx = request.args.get('approx', 'false').lower() == 'true'
+        stats = tracker.get_user_stats(days, approx=approx)
+        
+        # With approx, distinct users over any UTC range (ISO start/end, end defaulting to now)
+        if approx and request.args.get('start'):
+            try:
+                start = parse_utc(request.args['start'])
+                end = parse_utc(request.args['end']) if request.args.get('end') else datetime.utcnow()
+            except (ValueError, OverflowError, OSError):
+                return jsonify({'error': 'start and end must be ISO 8601 times'}), 400
+            if start >= end:
+                return jsonify({'error': 'start must be before end'}), 400
+            stats['active_users_in_range'] = tracker.approx_active_users(start, end)
         
         # Track this analytics view
         track_event('analytics_viewed', {'days': days})
@@ -3052,17 +3463,55 @@ def track_page_view_endpoint():
         logger.error(f"Error tracking page view: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analytics/batch', methods=['POST'])
+def track_analytics_batch():
+    """
+    Ingest a batch of frontend page views and events: a JSON array, or an object with an 'events' array,
+    of {'type': 'pageview' | 'event', ...} items. The body is parsed whatever its content type, so
+    navigator.sendBeacon can post it. Valid items are buffered and written in one transaction.
+    """
+    try:
+        if request.content_length and request.content_length > MAX_BATCH_ITEMS * 10 * 1024:
+            return jsonify({'error': 'Batch too large'}), 413
+        try:
+            data = json.loads(request.get_data(as_text=True) or 'null')
+        except ValueError:
+            return jsonify({'error': 'Body must be JSON'}), 400
+        items = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'A non-empty array of events is required'}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'At most {MAX_BATCH_ITEMS} events per batch'}), 413
+        
+        accepted, errors = track_batch(items)
+        if errors and not accepted:
+            return jsonify({'accepted': 0, 'rejected': errors}), 400
+        return jsonify({'accepted': accepted, 'rejected': errors}), 202
+    except Exception as e:
+        logger.error(f"Error ingesting analytics batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/queue', methods=['GET'])
+def get_analytics_queue_stats():
+    """Get the depth and batch statistics of the tracking write queue"""
+    try:
+        return jsonify(tracker.get_queue_stats())
+    except Exception as e:
+        logger.error(f"Error getting tracking queue stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/analytics/cleanup', methods=['POST'])
 def cleanup_analytics_data():
     """Clean up old analytics data"""
     try:
         days_to_keep = request.json.get('days_to_keep', 90) if request.json else 90
-        tracker.cleanup_old_data(days_to_keep)
+        dropped = tracker.cleanup_old_data(days_to_keep)
         
         # Track this cleanup action
         track_event('analytics_cleanup', {'days_to_keep': days_to_keep})
         
-        return jsonify({'success': True, 'message': f'Cleaned up data older than {days_to_keep} days'})
+        return jsonify({'success': True, 'message': f'Cleaned up data older than {days_to_keep} days',
+                        'dropped_partitions': dropped})
     except Exception as e:
         logger.error(f"Error cleaning up analytics data: {str(e)}")
         return jsonify({'error': str(e)}), 500
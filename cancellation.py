@@ -0,0 +1,97 @@
+"""
+Cancellation Module for JIRA TPM Application
+Cooperative cancellation tokens and deadlines for long-running analysis tasks
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+CANCELLED = 'cancelled'
+DEADLINE = 'deadline'
+
+
+class TaskCancelled(BaseException):
+    """
+    Raised inside a task once it has been cancelled or has run past its deadline.
+    Derives from BaseException so the broad `except Exception` blocks in the
+    analysis code do not swallow it.
+    """
+
+    def __init__(self, reason: str = CANCELLED, partial_data=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial_data = partial_data
+
+
+class CancelToken:
+    def __init__(self, deadline: Optional[float] = None, poll: Callable[[], bool] = None, poll_interval: float = 2.0):
+        """Create a token with an optional absolute deadline (epoch seconds) and an optional external cancel check"""
+        self.deadline = deadline
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.last_poll = 0.0
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if there is no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def reason(self) -> Optional[str]:
+        """Why the task should stop, or None if it may continue"""
+        if not self.cancelled.is_set() and self.poll and time.time() - self.last_poll >= self.poll_interval:
+            self.last_poll = time.time()
+            if self.poll():
+                self.cancelled.set()
+        if self.cancelled.is_set():
+            return CANCELLED
+        if self.deadline is not None and time.time() >= self.deadline:
+            return DEADLINE
+        return None
+
+    def check(self):
+        """Raise TaskCancelled if the task has been cancelled or is past its deadline"""
+        reason = self.reason()
+        if reason:
+            raise TaskCancelled(reason)
+
+
+_local = threading.local()
+
+
+def current_token() -> Optional[CancelToken]:
+    """The token of the task running on this thread, if any"""
+    return getattr(_local, 'token', None)
+
+
+@contextmanager
+def task_context(token: Optional[CancelToken]):
+    """Make a token current for the duration of a task"""
+    previous = current_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def check_cancelled():
+    """Cancellation point: raise TaskCancelled if the current task should stop"""
+    token = current_token()
+    if token:
+        token.check()
+
+
+def request_timeout(default: float) -> float:
+    """HTTP timeout for the current task, capped so a request never outlives the deadline"""
+    token = current_token()
+    remaining = token.remaining() if token else None
+    if remaining is None:
+        return default
+    return max(1.0, min(default, remaining))
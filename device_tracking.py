@@ -0,0 +1,164 @@
+"""
+Device Tracking Module for JIRA TPM Application
+Device access counts kept in memory, persisted as an append-only JSON-lines log folded into a snapshot
+"""
+
+import os
+import json
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceTracker:
+    def __init__(self, snapshot_path: str = 'data/device_access.json', log_path: Optional[str] = None,
+                 flush_interval: float = 1.0, compact_interval: float = 300.0):
+        """
+        snapshot_path holds the compacted aggregate ({'devices', 'total_accesses', 'last_updated'}, as
+        before, plus the sequence number of the last access it includes). log_path gets one line per access
+        since then. Buffered appends reach the file every flush_interval seconds; every compact_interval
+        seconds the log is folded into the snapshot.
+        """
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path or os.path.splitext(snapshot_path)[0] + '.log.jsonl'
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.lock = threading.Lock()
+        self.compact_lock = threading.Lock()
+        self.devices: Dict[str, Dict] = {}
+        self.total_accesses = 0
+        self.last_updated = None
+        self.sequence = 0
+        self.compacted_sequence = 0
+        self._load()
+        os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+        if os.path.exists(self._rotated_path()):
+            # A compaction was interrupted; its accesses are replayed, so persist them before reusing the name
+            self._write_snapshot(self._snapshot())
+            os.remove(self._rotated_path())
+        self.log = open(self.log_path, 'a', encoding='utf-8', buffering=64 * 1024)
+        self.stopped = threading.Event()
+        self.worker = threading.Thread(target=self._background_loop, name="device-log", daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+
+    def _apply(self, device_id: str, timestamp: str):
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices[device_id] = {'first_access': timestamp, 'last_access': timestamp,
+                                                'access_count': 0}
+        device['last_access'] = timestamp
+        device['access_count'] += 1
+        self.total_accesses += 1
+        self.last_updated = timestamp
+
+    def _load(self):
+        """Replay the snapshot, then every logged access newer than it (including a rotated log left by a crash)"""
+        try:
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                self.devices = snapshot.get('devices', {})
+                self.total_accesses = snapshot.get('total_accesses', 0)
+                self.last_updated = snapshot.get('last_updated')
+                self.sequence = self.compacted_sequence = snapshot.get('sequence', 0)
+        except Exception as e:
+            logger.error(f"Error loading device snapshot: {str(e)}")
+        replayed = 0
+        for path in (self._rotated_path(), self.log_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    if record['s'] > self.sequence:
+                        self._apply(record['d'], record['t'])
+                        self.sequence = record['s']
+                        replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} device accesses from the log")
+
+    def _rotated_path(self) -> str:
+        return self.log_path + '.compacting'
+
+    def record(self, device_id: str) -> int:
+        """Count one access by a device; returns the number of unique devices"""
+        timestamp = datetime.now().isoformat()
+        with self.lock:
+            self.sequence += 1
+            self._apply(device_id, timestamp)
+            self.log.write(json.dumps({'s': self.sequence, 'd': device_id, 't': timestamp}) + '\n')
+            return len(self.devices)
+
+    def summary(self) -> Dict:
+        with self.lock:
+            return {'device_count': len(self.devices), 'total_accesses': self.total_accesses,
+                    'last_updated': self.last_updated}
+
+    def flush(self):
+        with self.lock:
+            if not self.log.closed:
+                self.log.flush()
+
+    def compact(self) -> bool:
+        """Fold the log into a new snapshot; returns False if there was nothing to fold"""
+        with self.compact_lock:
+            with self.lock:
+                if self.sequence == self.compacted_sequence:
+                    return False
+                # Later accesses go to a fresh log while the snapshot is written from a copy
+                self.log.close()
+                os.replace(self.log_path, self._rotated_path())
+                self.log = open(self.log_path, 'a', encoding='utf-8', buffering=64 * 1024)
+                snapshot = self._snapshot()
+            self._write_snapshot(snapshot)
+            os.remove(self._rotated_path())
+            self.compacted_sequence = snapshot['sequence']
+            logger.debug(f"Compacted device log into snapshot at access {snapshot['sequence']}")
+            return True
+
+    def _snapshot(self) -> Dict:
+        return {
+            'devices': {device_id: dict(device) for device_id, device in self.devices.items()},
+            'total_accesses': self.total_accesses,
+            'last_updated': self.last_updated,
+            'sequence': self.sequence
+        }
+
+    def _write_snapshot(self, snapshot: Dict):
+        os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self.snapshot_path)
+
+    def _background_loop(self):
+        since_compaction = 0.0
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                since_compaction += self.flush_interval
+                if since_compaction >= self.compact_interval:
+                    since_compaction = 0.0
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Error persisting device log: {str(e)}")
+
+    def close(self):
+        """Stop the background thread and write everything out"""
+        self.stopped.set()
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Error compacting device log: {str(e)}")
+        with self.lock:
+            if not self.log.closed:
+                self.log.close()
@@ -75,8 +75,9 @@ const CapacityAnalysis = () => {
   const [progress, setProgress] = useState(0);
   const [progressText, setProgressText] = useState('Initializing analysis...');
   const [results, setResults] = useState(null);
+  const [partialReason, setPartialReason] = useState('');
   const [currentTaskId, setCurrentTaskId] = useState(null);
-  const [progressInterval, setProgressInterval] = useState(null);
+  const [progressSource, setProgressSource] = useState(null);
   
   // Share and export functionality
   const [shareDialogOpen, setShareDialogOpen] = useState(false);
@@ -110,6 +111,7 @@ const CapacityAnalysis = () => {
     // Reset UI
     setError('');
     setResults(null);
+    setPartialReason('');
     setProgress(0);
     setProgressText('Initializing analysis...');
     setLoading(true);
@@ -142,53 +144,66 @@ const CapacityAnalysis = () => {
     }
   };
 
-  // Progress polling
+  // Progress updates pushed over SSE
   const startProgressPolling = (taskId) => {
-    const interval = setInterval(async () => {
-      try {
-        const response = await fetch(`/api/capacity/progress/${taskId}`);
-        const data = await response.json();
-        
-        if (!response.ok) {
-          throw new Error(data.error || 'Failed to get progress');
-        }
-        
-        setProgress(data.progress);
-        
-        if (data.status === 'fetching_data') {
-          setProgressText('Fetching user data from JIRA...');
-        } else if (data.status === 'in_progress') {
-          setProgressText('Analyzing performance patterns...');
-        } else if (data.status === 'completed') {
-          setProgressText('Analysis completed!');
-          clearInterval(interval);
-          setLoading(false);
+    const source = new EventSource(`/api/tasks/${taskId}/events`);
+    
+    const handleUpdate = (event) => {
+      const data = JSON.parse(event.data);
+      
+      setProgress(data.progress);
+      
+      if (data.status === 'fetching_data') {
+        setProgressText('Fetching user data from JIRA...');
+      } else if (data.status === 'in_progress') {
+        setProgressText('Analyzing performance patterns...');
+      } else if (data.status === 'completed') {
+        setProgressText('Analysis completed!');
+        source.close();
+        setLoading(false);
+        setResults(data.result);
+      } else if (data.status === 'partial' || data.status === 'cancelled') {
+        // Stopped by its deadline or by cancellation: show what was analyzed before it stopped
+        setProgressText(data.status === 'cancelled' ? 'Analysis cancelled' : 'Analysis stopped early');
+        source.close();
+        setLoading(false);
+        if (data.result && data.result.metrics) {
           setResults(data.result);
-        } else if (data.status === 'error') {
-          clearInterval(interval);
-          setLoading(false);
-          setError(data.error || 'Analysis failed');
+          setPartialReason(data.result.partial_reason || data.status);
+        } else {
+          setError(data.status === 'cancelled'
+            ? 'Analysis was cancelled before any issues were analyzed'
+            : 'Analysis stopped before any issues were analyzed');
         }
-        
-      } catch (error) {
-        console.error('Error polling progress:', error);
-        clearInterval(interval);
+      } else if (data.status === 'error') {
+        source.close();
+        setLoading(false);
+        setError(data.error || 'Analysis failed');
+      }
+    };
+    
+    ['queued', 'progress', 'partial', 'complete'].forEach(type => source.addEventListener(type, handleUpdate));
+    
+    source.onerror = () => {
+      // EventSource reconnects on its own (resuming via Last-Event-ID); give up only once it is closed
+      if (source.readyState === EventSource.CLOSED) {
+        console.error('Progress stream closed unexpectedly');
         setLoading(false);
         setError('Failed to get analysis progress');
       }
-    }, 2000);
+    };
     
-    setProgressInterval(interval);
+    setProgressSource(source);
   };
 
-  // Cleanup interval on unmount
+  // Close the progress stream on unmount
   useEffect(() => {
     return () => {
-      if (progressInterval) {
-        clearInterval(progressInterval);
+      if (progressSource) {
+        progressSource.close();
       }
     };
-  }, [progressInterval]);
+  }, [progressSource]);
 
   // Export report
   const handleExportReport = async () => {
@@ -596,6 +611,15 @@ const CapacityAnalysis = () => {
         </Alert>
       )}
 
+      {/* Partial Result Notice */}
+      {results && partialReason && (
+        <Alert severity="warning" sx={{ mb: 3 }}>
+          {partialReason === 'cancelled'
+            ? 'The analysis was cancelled. The results below cover only the issues fetched before it stopped.'
+            : `The analysis stopped early (${partialReason}). The results below cover only the issues fetched before it stopped.`}
+        </Alert>
+      )}
+
       {/* Results Section */}
       {results && (
         <Box ref={resultsSectionRef}>
@@ -5,12 +5,21 @@
 
 import axios from 'axios';
 
+const BATCH_ENDPOINT = '/api/analytics/batch';
+// Send when this many items are queued, or after FLUSH_INTERVAL_MS, whichever comes first
+const MAX_BATCH_SIZE = 20;
+const FLUSH_INTERVAL_MS = 5000;
+// Items kept while the backend is unreachable; the oldest are dropped beyond this
+const MAX_QUEUED_ITEMS = 500;
+
 class Analytics {
   constructor() {
     this.sessionId = this.getOrCreateSessionId();
     this.startTime = Date.now();
     this.pageLoadTime = 0;
     this.isTrackingEnabled = true;
+    this.queue = [];
+    this.flushTimer = null;
     
     // Track initial page load
     this.trackPageLoad();
@@ -52,23 +61,20 @@ class Analytics {
   trackPageView(pagePath, pageTitle = '', referrer = '', loadTimeMs = 0) {
     if (!this.isTrackingEnabled) return;
     
-    const data = {
+    this.enqueue({
+      type: 'pageview',
       page_path: pagePath,
       page_title: pageTitle,
       referrer: referrer,
       load_time_ms: loadTimeMs
-    };
-
-    this.sendToBackend('/api/analytics/pageview', data)
-      .catch(error => {
-        console.warn('Failed to track page view:', error);
-      });
+    });
   }
 
   trackEvent(eventType, eventData = {}) {
     if (!this.isTrackingEnabled) return;
     
-    const data = {
+    this.enqueue({
+      type: 'event',
       event_type: eventType,
       event_data: {
         ...eventData,
@@ -80,12 +86,46 @@ class Analytics {
         language: navigator.language,
         timezone: Intl.DateTimeFormat().resolvedOptions().timeZone
       }
-    };
+    });
+  }
 
-    this.sendToBackend('/api/analytics/track', data)
-      .catch(error => {
-        console.warn('Failed to track event:', error);
-      });
+  // Queue an item for the next batch; items carry their own time since they are sent later
+  enqueue(item) {
+    this.queue.push({ ...item, timestamp: Date.now() });
+    if (this.queue.length > MAX_QUEUED_ITEMS) {
+      this.queue.splice(0, this.queue.length - MAX_QUEUED_ITEMS);
+    }
+    if (this.queue.length >= MAX_BATCH_SIZE) {
+      this.flush();
+    } else if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => this.flush(), FLUSH_INTERVAL_MS);
+    }
+  }
+
+  // Send up to 100 queued items as one batch. useBeacon is for page hide/unload, where a normal
+  // request may be cancelled; the beacon is queued by the browser and outlives the page.
+  flush(useBeacon = false) {
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+    if (!this.queue.length) return;
+    const batch = this.queue.splice(0, MAX_BATCH_SIZE * 5);
+    const beaconSent = useBeacon && navigator.sendBeacon &&
+      navigator.sendBeacon(BATCH_ENDPOINT, new Blob([JSON.stringify({ events: batch })], { type: 'application/json' }));
+
+    if (!beaconSent) {
+      this.sendToBackend(BATCH_ENDPOINT, { events: batch })
+        .catch(error => {
+          // Keep the items for the next attempt unless the backend rejected them as invalid
+          if (!error.response || error.response.status >= 500) {
+            this.queue.unshift(...batch);
+          }
+        });
+    }
+    if (this.queue.length && !this.flushTimer) {
+      this.flushTimer = setTimeout(() => this.flush(useBeacon), useBeacon ? 0 : FLUSH_INTERVAL_MS);
+    }
   }
 
   trackUserInteraction(action, target, details = {}) {
@@ -131,6 +171,8 @@ class Analytics {
           action: 'hidden',
           time_spent_ms: timeSpent
         });
+        // The page may never become visible again, so send what is queued now
+        this.flush(true);
       } else {
         // Page became visible, reset timer
         visibilityStartTime = Date.now();
@@ -150,6 +192,10 @@ class Analytics {
         page_load_time_ms: this.pageLoadTime
       });
     });
+    // pagehide fires after beforeunload and also where beforeunload does not (mobile, bfcache)
+    window.addEventListener('pagehide', () => {
+      this.flush(true);
+    });
   }
 
   async sendToBackend(endpoint, data) {
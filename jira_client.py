@@ -0,0 +1,139 @@
+"""
+Jira Client Module for JIRA TPM Application
+Ready-made Jira clients (auth, headers and a pooled session) built once per credential set
+"""
+
+import os
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from settings_manager import settings_manager
+
+logger = logging.getLogger(__name__)
+
+
+def credential_key(credentials: Dict[str, str]) -> Tuple[str, str, str]:
+    """Registry key of a credential set; the token is kept only as a digest"""
+    return (credentials['url'].rstrip('/'), credentials['email'],
+            hashlib.sha256(credentials['api_token'].encode('utf-8')).hexdigest())
+
+
+def has_credentials(credentials: Optional[Dict[str, str]]) -> bool:
+    return bool(credentials) and all([credentials.get('url'), credentials.get('email'), credentials.get('api_token')])
+
+
+class JiraClient:
+    def __init__(self, url: str, email: str, api_token: str, pool_size: int = 10):
+        self.url = url.rstrip('/')
+        self.email = email
+        self.auth = HTTPBasicAuth(email, api_token)
+        token = base64.b64encode(f"{email}:{api_token}".encode('utf-8')).decode('ascii')
+        self.headers = {
+            'Authorization': f'Basic {token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+        # Keep-alive connections to this Jira site, shared by every thread using the client
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request; a url starting with '/' is relative to the Jira site"""
+        if url.startswith('/'):
+            url = self.url + url
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class JiraClientRegistry:
+    def __init__(self, max_clients: int = 8, pool_size: int = 10):
+        self.max_clients = max_clients
+        self.pool_size = pool_size
+        self.lock = threading.Lock()
+        # Credential key -> client, least recently used first
+        self.clients: 'OrderedDict[Tuple[str, str, str], JiraClient]' = OrderedDict()
+        self.created = 0
+        # (settings version, client) for the credentials configured in the settings
+        self._current = None
+        self._settings = None
+
+    def client(self, credentials: Dict[str, str]) -> JiraClient:
+        """The client for a credential set, built the first time the set is seen"""
+        if not has_credentials(credentials):
+            raise ValueError("JIRA credentials not configured. Please configure them in Settings.")
+        key = credential_key(credentials)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is not None:
+                self.clients.move_to_end(key)
+                return client
+            client = JiraClient(credentials['url'], credentials['email'], credentials['api_token'],
+                                self.pool_size)
+            self.clients[key] = client
+            self.created += 1
+            evicted = []
+            while len(self.clients) > self.max_clients:
+                evicted.append(self.clients.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        logger.debug(f"Created Jira client for {client.url} ({client.email})")
+        return client
+
+    def _remove(self, old: JiraClient):
+        with self.lock:
+            for key, client in list(self.clients.items()):
+                if client is old:
+                    del self.clients[key]
+        old.close()
+
+    def bind(self, settings):
+        """Serve current() from a SettingsManager"""
+        self._settings = settings
+
+    def current(self) -> JiraClient:
+        """
+        The client for the credentials in the bound settings (environment variables take priority),
+        looked up again only when the settings version changes.
+        """
+        version = self._settings.version
+        current = self._current
+        if current is not None and current[0] == version:
+            return current[1]
+        client = self.client(self._settings.get_jira_credentials())
+        if current is not None and current[1] is not client:
+            # The credentials were replaced, so the old client's connections are no longer needed
+            self._remove(current[1])
+        self._current = (version, client)
+        return client
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'clients': len(self.clients), 'max_clients': self.max_clients,
+                    'created': self.created, 'pool_size': self.pool_size}
+
+
+# Global registry, bound to the application settings
+jira_clients = JiraClientRegistry(
+    max_clients=int(os.getenv('JIRA_MAX_CLIENTS', 8)),
+    pool_size=int(os.getenv('JIRA_POOL_SIZE', 10))
+)
+jira_clients.bind(settings_manager)
@@ -0,0 +1,295 @@
+"""
+Jira Scheduler Module for JIRA TPM Application
+Priority classes, per-board/per-user fair queuing and admission control in front of every Jira call
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import requests
+
+from cancellation import check_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first. A waiting request of a higher class is always dispatched
+# before any request of a lower class; within a class, flows (boards/users) share fairly.
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+PREFETCH = 'prefetch'
+PRIORITY_CLASSES = (INTERACTIVE, BACKGROUND, PREFETCH)
+
+DEFAULT_FLOW = 'default'
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request is refused by admission control"""
+
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"Jira request queue for {priority} work is full, retry in {retry_after}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, priority: str, flow: str):
+        self.priority = priority
+        self.flow = flow
+        self.enqueued_at = time.time()
+        self.granted = threading.Event()
+        self.abandoned = False
+
+
+class JiraScheduler:
+    def __init__(self, max_concurrent: int = 4, queue_limits: Dict[str, int] = None,
+                 max_wait: Dict[str, float] = None):
+        """
+        Initialize the scheduler with a fixed number of concurrent Jira calls.
+        queue_limits and max_wait are per priority class; 0 means unlimited.
+        """
+        self.max_concurrent = max_concurrent
+        self.queue_limits = queue_limits or {}
+        self.max_wait = max_wait or {}
+        self.weights: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.sequence = itertools.count()
+        # Start-time fair queuing state per class: heap of (start tag, seq, waiter),
+        # class virtual time and the last finish tag of every flow
+        self.queues: Dict[str, list] = {c: [] for c in PRIORITY_CLASSES}
+        self.waiting: Dict[str, int] = {c: 0 for c in PRIORITY_CLASSES}
+        self.virtual_time: Dict[str, float] = {c: 0.0 for c in PRIORITY_CLASSES}
+        self.flow_finish: Dict[str, Dict[str, float]] = {c: {} for c in PRIORITY_CLASSES}
+        self.metrics = {c: {
+            'admitted': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'waits': deque(maxlen=1000),
+            'service_times': deque(maxlen=200)
+        } for c in PRIORITY_CLASSES}
+        self.context = threading.local()
+        # Returns the rate budget (anything with acquire()) of the caller, if any
+        self.budget_source: Optional[Callable[[], object]] = None
+
+    def bind_budget(self, source: Callable[[], object]):
+        """Take a token from source()'s rate budget before every slot, e.g. the current tenant's"""
+        self.budget_source = source
+
+    def set_weight(self, flow: str, weight: float):
+        """Give a flow a larger (or smaller) share of its class"""
+        with self.lock:
+            self.weights[flow] = max(0.01, float(weight))
+
+    def current_context(self):
+        """Priority class and fairness flow of the work running on this thread"""
+        return getattr(self.context, 'priority', INTERACTIVE), getattr(self.context, 'flow', DEFAULT_FLOW)
+
+    def set_context(self, priority: str, flow: Optional[str] = None):
+        self.context.priority = priority
+        self.context.flow = flow or DEFAULT_FLOW
+
+    def clear_context(self):
+        self.context.__dict__.clear()
+
+    @contextmanager
+    def scheduling(self, priority: str, flow: Optional[str] = None):
+        """Run a block of work under the given priority class and flow"""
+        previous = self.context.__dict__.copy()
+        self.set_context(priority, flow)
+        try:
+            yield
+        finally:
+            self.context.__dict__.clear()
+            self.context.__dict__.update(previous)
+
+    def _retry_after(self, priority: str) -> int:
+        """Estimate how long until a slot frees up for a new request of this class"""
+        service_times = self.metrics[priority]['service_times']
+        avg_service = sum(service_times) / len(service_times) if service_times else 1.0
+        ahead = sum(self.waiting[c] for c in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+        return max(1, math.ceil(avg_service * (ahead + 1) / self.max_concurrent))
+
+    def _enqueue(self, waiter: _Waiter):
+        priority, flow = waiter.priority, waiter.flow
+        start = max(self.virtual_time[priority], self.flow_finish[priority].get(flow, 0.0))
+        self.flow_finish[priority][flow] = start + 1.0 / self.weights.get(flow, 1.0)
+        heapq.heappush(self.queues[priority], (start, next(self.sequence), waiter))
+        self.waiting[priority] += 1
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Pop the waiter with the smallest start tag from the highest non-empty class"""
+        for priority in PRIORITY_CLASSES:
+            queue = self.queues[priority]
+            while queue:
+                start, _, waiter = heapq.heappop(queue)
+                if waiter.abandoned:
+                    continue
+                self.virtual_time[priority] = start
+                self.waiting[priority] -= 1
+                return waiter
+            # Class drained: forget flow history so idle flows do not bank credit
+            self.virtual_time[priority] = 0.0
+            self.flow_finish[priority].clear()
+        return None
+
+    def _dispatch(self):
+        """Hand free slots to the next waiters; caller holds the lock"""
+        while self.in_flight < self.max_concurrent:
+            waiter = self._next_waiter()
+            if not waiter:
+                return
+            self._grant(waiter)
+
+    def _grant(self, waiter: _Waiter):
+        self.in_flight += 1
+        metrics = self.metrics[waiter.priority]
+        metrics['admitted'] += 1
+        metrics['in_flight'] += 1
+        metrics['waits'].append(time.time() - waiter.enqueued_at)
+        waiter.granted.set()
+
+    def acquire(self, priority: Optional[str] = None, flow: Optional[str] = None) -> _Waiter:
+        """
+        Wait for a Jira slot. Raises SchedulerBusy if the class queue is full or the
+        class maximum wait is exceeded.
+        """
+        context_priority, context_flow = self.current_context()
+        priority = priority or context_priority
+        flow = flow or context_flow
+        waiter = _Waiter(priority, flow)
+
+        with self.lock:
+            if self.in_flight < self.max_concurrent and not any(self.waiting.values()):
+                self._grant(waiter)
+                return waiter
+            limit = self.queue_limits.get(priority, 0)
+            if limit and self.waiting[priority] >= limit:
+                self.metrics[priority]['rejected'] += 1
+                raise SchedulerBusy(priority, self._retry_after(priority))
+            self._enqueue(waiter)
+            self._dispatch()
+
+        max_wait = self.max_wait.get(priority, 0)
+        try:
+            while not waiter.granted.wait(1.0):
+                # Background tasks can be cancelled while they wait for a slot
+                check_cancelled()
+                if max_wait and time.time() - waiter.enqueued_at >= max_wait:
+                    with self.lock:
+                        if not waiter.granted.is_set():
+                            waiter.abandoned = True
+                            self.waiting[priority] -= 1
+                            self.metrics[priority]['rejected'] += 1
+                            raise SchedulerBusy(priority, self._retry_after(priority))
+        except BaseException:
+            with self.lock:
+                if waiter.granted.is_set():
+                    self._release(waiter, 0.0)
+                elif not waiter.abandoned:
+                    waiter.abandoned = True
+                    self.waiting[priority] -= 1
+            raise
+        return waiter
+
+    def _release(self, waiter: _Waiter, service_time: float):
+        self.in_flight -= 1
+        metrics = self.metrics[waiter.priority]
+        metrics['in_flight'] -= 1
+        if service_time:
+            metrics['service_times'].append(service_time)
+        self._dispatch()
+
+    def release(self, waiter: _Waiter, service_time: float = 0.0):
+        with self.lock:
+            self._release(waiter, service_time)
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None, flow: Optional[str] = None, budget=None):
+        """
+        Hold one of the concurrent Jira slots for the duration of the block. The rate budget (the
+        bound source's by default) is waited for first, so a throttled caller never holds a slot.
+        """
+        if budget is None and self.budget_source is not None:
+            budget = self.budget_source()
+        if budget is not None:
+            budget.acquire()
+        waiter = self.acquire(priority, flow)
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.release(waiter, time.time() - started)
+
+    def request(self, method: str, url: str, session: Optional[requests.Session] = None, budget=None,
+                **kwargs) -> requests.Response:
+        """Issue an HTTP request to Jira once a slot is available, on the session's pooled connections if given"""
+        with self.slot(budget=budget):
+            return (session or requests).request(method, url, **kwargs)
+
+    def stats(self) -> Dict:
+        """Get per-class queue depth, admission and wait-time metrics"""
+        with self.lock:
+            classes = {}
+            for priority in PRIORITY_CLASSES:
+                metrics = self.metrics[priority]
+                waits = sorted(metrics['waits'])
+                oldest = min((w.enqueued_at for _, _, w in self.queues[priority] if not w.abandoned), default=None)
+                classes[priority] = {
+                    'waiting': self.waiting[priority],
+                    'in_flight': metrics['in_flight'],
+                    'admitted': metrics['admitted'],
+                    'rejected': metrics['rejected'],
+                    'queue_limit': self.queue_limits.get(priority, 0),
+                    'avg_wait_seconds': round(sum(waits) / len(waits), 3) if waits else 0,
+                    'p95_wait_seconds': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0,
+                    'max_wait_seconds': round(waits[-1], 3) if waits else 0,
+                    'oldest_waiting_seconds': round(time.time() - oldest, 3) if oldest else 0,
+                    'active_flows': len(self.flow_finish[priority])
+                }
+            return {
+                'max_concurrent': self.max_concurrent,
+                'in_flight': self.in_flight,
+                'classes': classes
+            }
+
+
+def scheduled(handler: Callable, priority: str, flow: Optional[Callable[..., str]] = None) -> Callable:
+    """Wrap a task handler so its Jira calls run under a priority class; flow maps the handler args to a flow key"""
+    def run(*args):
+        with jira_scheduler.scheduling(priority, flow(*args) if flow else None):
+            return handler(*args)
+    run.__name__ = getattr(handler, '__name__', 'scheduled')
+    return run
+
+
+def jira_get(url: str, **kwargs) -> requests.Response:
+    """GET a Jira URL through the scheduler"""
+    return jira_scheduler.request('GET', url, **kwargs)
+
+
+def jira_put(url: str, **kwargs) -> requests.Response:
+    """PUT to a Jira URL through the scheduler"""
+    return jira_scheduler.request('PUT', url, **kwargs)
+
+
+# Global scheduler instance
+jira_scheduler = JiraScheduler(
+    max_concurrent=int(os.getenv('JIRA_MAX_CONCURRENCY', 4)),
+    queue_limits={
+        INTERACTIVE: int(os.getenv('JIRA_QUEUE_LIMIT_INTERACTIVE', 32)),
+        BACKGROUND: int(os.getenv('JIRA_QUEUE_LIMIT_BACKGROUND', 0)),
+        PREFETCH: int(os.getenv('JIRA_QUEUE_LIMIT_PREFETCH', 16))
+    },
+    max_wait={
+        INTERACTIVE: float(os.getenv('JIRA_MAX_WAIT_INTERACTIVE', 20)),
+        PREFETCH: float(os.getenv('JIRA_MAX_WAIT_PREFETCH', 60))
+    }
+)
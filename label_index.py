@@ -0,0 +1,314 @@
+"""
+Label Index Module for JIRA TPM Application
+Label search structures over pre-lowercased labels: trigram postings, a sorted prefix array and a typo index
+"""
+
+import sys
+import time
+import heapq
+import bisect
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from label_search import TypoIndex, build_typo_index
+
+logger = logging.getLogger(__name__)
+
+# Match classes used for ranking, best first
+EXACT = 0
+PREFIX = 1
+WORD_BOUNDARY = 2
+SUBSTRING = 3
+FUZZY = 4
+
+# update() rebuilds the structures instead of changing them one label at a time above this many changes
+BULK_THRESHOLD = 1000
+
+
+def trigrams(text: str) -> Set[str]:
+    """All 3-character substrings of an already lowercased string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def boundaries(lowered: str) -> List[int]:
+    """Positions a word-boundary match can start at: the start and every position after a non-alphanumeric"""
+    return [0] + [i for i in range(1, len(lowered)) if not lowered[i - 1].isalnum()]
+
+
+def match_class(lowered: str, query: str) -> Optional[int]:
+    """How a lowercased label matches a lowercased query, or None if it does not contain it"""
+    position = lowered.find(query)
+    if position < 0:
+        return None
+    if position == 0:
+        return EXACT if len(lowered) == len(query) else PREFIX
+    # A later occurrence may still start a word even if the first one does not
+    while position >= 0:
+        if not lowered[position - 1].isalnum():
+            return WORD_BOUNDARY
+        position = lowered.find(query, position + 1)
+    return SUBSTRING
+
+
+def _build_postings(entries: List[Optional[Tuple[str, str]]]) -> Dict[str, Set[int]]:
+    postings: Dict[str, Set[int]] = {}
+    for label_id, entry in enumerate(entries):
+        if entry:
+            for gram in trigrams(entry[1]):
+                postings.setdefault(gram, set()).add(label_id)
+    return postings
+
+
+def _build_prefixes(entries: List[Optional[Tuple[str, str]]]) -> List[Tuple[str, int]]:
+    prefixes = []
+    for label_id, entry in enumerate(entries):
+        if entry:
+            lowered = entry[1]
+            prefixes.extend((lowered[start:], label_id) for start in boundaries(lowered))
+    prefixes.sort()
+    return prefixes
+
+
+class LabelIndex:
+    def __init__(self, labels: Iterable[str] = ()):
+        """Initialize the index, optionally with an initial set of labels"""
+        # Labels are addressed by integer ids so posting lists stay small; freed ids are reused
+        self.ids: Dict[str, int] = {}
+        self.entries: List[Optional[Tuple[str, str]]] = []
+        self.free_ids: List[int] = []
+        # Search structures; None while load() rebuilds them in the background and searches scan meanwhile.
+        # prefixes holds (suffix starting at a word boundary, label id) sorted, so prefix and
+        # word-boundary matches are a bisect range.
+        self.postings: Optional[Dict[str, Set[int]]] = {}
+        self.prefixes: Optional[List[Tuple[str, int]]] = []
+        self.typos: Optional[TypoIndex] = TypoIndex()
+        self.sorted_labels: Optional[List[str]] = None
+        self.build_seconds = 0.0
+        self.generation = 0
+        self.lock = threading.RLock()
+        if labels:
+            self.update(labels)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.ids
+
+    def _require_structures(self):
+        """Build the search structures inline if a background build has not finished yet"""
+        if self.postings is None:
+            self.postings = _build_postings(self.entries)
+            self.prefixes = _build_prefixes(self.entries)
+            self.typos = build_typo_index(self.entries)
+
+    def load(self, labels: Iterable[str]):
+        """
+        Replace the contents in one step, for warm starts. The search structures are built on a background
+        thread; until then searches scan every label, which is still fast enough to serve.
+        """
+        started = time.time()
+        with self.lock:
+            ordered = sorted({str(label) for label in labels if label})
+            self.entries = [(label, label.lower()) for label in ordered]
+            self.ids = {label: label_id for label_id, label in enumerate(ordered)}
+            self.free_ids = []
+            self.postings = self.prefixes = self.typos = None
+            self.sorted_labels = ordered
+            self.generation += 1
+            generation = self.generation
+            entries = list(self.entries)
+        logger.debug(f"Label index loaded {len(entries)} labels in {time.time() - started:.3f}s")
+
+        def build():
+            build_started = time.time()
+            postings = _build_postings(entries)
+            prefixes = _build_prefixes(entries)
+            typos = build_typo_index(entries)
+            with self.lock:
+                # A later load, or a change that built the structures inline, supersedes this build
+                if self.postings is None and self.generation == generation:
+                    self.postings, self.prefixes, self.typos = postings, prefixes, typos
+                    self.build_seconds = time.time() - build_started
+        threading.Thread(target=build, name="label-index-build", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        """Whether the search structures are available"""
+        return self.postings is not None
+
+    def add(self, label: str) -> bool:
+        """Add a label; returns False if it was already indexed"""
+        with self.lock:
+            if not label or label in self.ids:
+                return False
+            self._require_structures()
+            label_id, lowered = self._add_entry(label)
+            for gram in trigrams(lowered):
+                self.postings.setdefault(gram, set()).add(label_id)
+            for start in boundaries(lowered):
+                bisect.insort(self.prefixes, (lowered[start:], label_id))
+            self.typos.add(lowered, label_id)
+            return True
+
+    def _add_entry(self, label: str) -> Tuple[int, str]:
+        lowered = label.lower()
+        if self.free_ids:
+            label_id = self.free_ids.pop()
+            self.entries[label_id] = (label, lowered)
+        else:
+            label_id = len(self.entries)
+            self.entries.append((label, lowered))
+        self.ids[label] = label_id
+        self.sorted_labels = None
+        return label_id, lowered
+
+    def remove(self, label: str) -> bool:
+        """Remove a label; returns False if it was not indexed"""
+        with self.lock:
+            if label not in self.ids:
+                return False
+            self._require_structures()
+            label_id = self.ids.pop(label)
+            _, lowered = self.entries[label_id]
+            for gram in trigrams(lowered):
+                posting = self.postings.get(gram)
+                if posting is not None:
+                    posting.discard(label_id)
+                    if not posting:
+                        del self.postings[gram]
+            for start in boundaries(lowered):
+                entry = (lowered[start:], label_id)
+                position = bisect.bisect_left(self.prefixes, entry)
+                if position < len(self.prefixes) and self.prefixes[position] == entry:
+                    del self.prefixes[position]
+            self.typos.remove(lowered, label_id)
+            self._remove_entry(label_id)
+            return True
+
+    def _remove_entry(self, label_id: int):
+        self.entries[label_id] = None
+        self.free_ids.append(label_id)
+        self.sorted_labels = None
+
+    def update(self, labels: Iterable[str]) -> Tuple[int, int]:
+        """Make the index hold exactly the given labels, touching only the difference. Returns (added, removed)"""
+        started = time.time()
+        with self.lock:
+            new_labels = {str(label) for label in labels if label}
+            removed = [label for label in self.ids if label not in new_labels]
+            new = [label for label in new_labels if label not in self.ids]
+            changes = len(removed) + len(new)
+            if changes > BULK_THRESHOLD and changes > len(self.ids) // 10:
+                # Sorted inserts and deletes one by one are quadratic; rebuilding everything is cheaper
+                for label in removed:
+                    self._remove_entry(self.ids.pop(label))
+                for label in new:
+                    self._add_entry(label)
+                self.postings = None
+                self._require_structures()
+            else:
+                for label in removed:
+                    self.remove(label)
+                for label in new:
+                    self.add(label)
+            added = len(new)
+            self.build_seconds = time.time() - started
+        if added or removed:
+            logger.debug(f"Label index updated: +{added} -{len(removed)} in {self.build_seconds:.3f}s")
+        return added, len(removed)
+
+    def all_labels(self) -> List[str]:
+        """All labels in alphabetical order (cached until the next change)"""
+        with self.lock:
+            if self.sorted_labels is None:
+                self.sorted_labels = sorted(self.ids)
+            return self.sorted_labels
+
+    def _prefix_matches(self, query: str) -> Set[int]:
+        """Ids of labels with a word boundary (or the start) where the query begins"""
+        matches = set()
+        position = bisect.bisect_left(self.prefixes, (query,))
+        while position < len(self.prefixes) and self.prefixes[position][0].startswith(query):
+            matches.add(self.prefixes[position][1])
+            position += 1
+        return matches
+
+    def _candidates(self, query: str) -> Iterable[int]:
+        """Ids of labels that may contain the query, from the intersection of its trigram postings"""
+        if self.postings is None:
+            return self.ids.values()
+        if len(query) < 3:
+            # Too short for trigrams: only prefix and word-boundary matches are returned
+            return self._prefix_matches(query)
+        postings = []
+        for gram in trigrams(query):
+            posting = self.postings.get(gram)
+            if not posting:
+                return ()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query: str, offset: int = 0, limit: Optional[int] = None,
+               popularity: Optional[Dict[str, int]] = None) -> Tuple[List[str], int]:
+        """
+        Labels matching the query (case-insensitive), ranked exact > prefix > word boundary > substring >
+        one typo away, then by popularity (issue count), then shorter and alphabetical.
+        Returns (page of labels, total number of matches).
+        """
+        query = query.lower()
+        if not query:
+            return [], 0
+        popularity = popularity or {}
+        with self.lock:
+            ranked = []
+            matched = set()
+            for label_id in self._candidates(query):
+                label, lowered = self.entries[label_id]
+                rank = match_class(lowered, query)
+                if rank is not None:
+                    matched.add(label_id)
+                    ranked.append((rank, -popularity.get(label, 0), len(lowered), lowered, label))
+            if self.typos is not None:
+                for label_id in self.typos.lookup(query) - matched:
+                    label, lowered = self.entries[label_id]
+                    ranked.append((FUZZY, -popularity.get(label, 0), len(lowered), lowered, label))
+        end = offset + limit if limit is not None else None
+        if end is not None and end < len(ranked):
+            # Only the requested page needs ordering
+            page = heapq.nsmallest(end, ranked)[offset:]
+        else:
+            ranked.sort()
+            page = ranked[offset:end]
+        return [entry[4] for entry in page], len(ranked)
+
+    def stats(self) -> Dict:
+        """Index size, approximate memory use and the duration of the last update"""
+        with self.lock:
+            postings = self.postings or {}
+            prefixes = self.prefixes or []
+            memory = sys.getsizeof(self.ids) + sys.getsizeof(self.entries) + sys.getsizeof(postings)
+            memory += sys.getsizeof(prefixes) + sum(sys.getsizeof(entry) for entry in prefixes)
+            for label, label_id in self.ids.items():
+                memory += sys.getsizeof(label) + sys.getsizeof(self.entries[label_id]) + sys.getsizeof(self.entries[label_id][1])
+            for gram, posting in postings.items():
+                memory += sys.getsizeof(gram) + sys.getsizeof(posting)
+            typos = self.typos.stats() if self.typos is not None else {'words': 0, 'variants': 0}
+            return {
+                'labels': len(self.ids),
+                'ready': self.postings is not None,
+                'trigrams': len(postings),
+                'postings': sum(len(posting) for posting in postings.values()),
+                'prefix_entries': len(prefixes),
+                'typo_words': typos['words'],
+                'typo_variants': typos['variants'],
+                'last_update_seconds': round(self.build_seconds, 4),
+                'memory_bytes': memory
+            }
@@ -0,0 +1,268 @@
+"""
+Label Jobs Module for JIRA TPM Application
+Resumable background rename/delete of a label across every issue that carries it
+"""
+
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from cancellation import TaskCancelled, check_cancelled, current_token, task_context
+from jira_scheduler import jira_scheduler
+from state_backend import StateBackend
+
+logger = logging.getLogger(__name__)
+
+# Job actions
+RENAME = 'rename'
+DELETE = 'delete'
+
+# Job phases: collect the matching issue keys, then update them
+COLLECT = 'collect'
+APPLY = 'apply'
+DONE = 'done'
+
+# Issues created with the label while a job runs are caught by another pass
+MAX_PASSES = 3
+
+
+def quote_jql(value: str) -> str:
+    """Quote a value for use in JQL"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class LabelJobs:
+    KEY_PREFIX = 'label_job:'
+    # Collected issue keys, one value per search page, so checkpoints never rewrite them
+    PAGE_PREFIX = 'label_job_keys:'
+
+    def __init__(self, backend: StateBackend, search: Callable[[str, int, int], Optional[Dict]],
+                 update_issue: Callable[[str, Dict], Optional[str]], concurrency: int = 4,
+                 page_size: int = 100, chunk_size: int = 50, job_ttl: int = 7 * 86400):
+        """
+        search(jql, start_at, max_results) returns a Jira search response or None.
+        update_issue(issue_key, update) applies an issue 'update' payload and returns an error message or None.
+        """
+        self.backend = backend
+        self.search = search
+        self.update_issue = update_issue
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.job_ttl = job_ttl
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.KEY_PREFIX}{job_id}"
+
+    def create(self, action: str, label: str, new_label: Optional[str] = None, project: Optional[str] = None) -> Dict:
+        """Record a new job; run() does the work"""
+        job = {
+            'job_id': str(uuid.uuid4()),
+            'action': action,
+            'label': label,
+            'new_label': new_label if action == RENAME else None,
+            'project': project,
+            'status': 'pending',
+            'phase': COLLECT,
+            'pass': 1,
+            'collect_start_at': 0,
+            'total': None,
+            'pages': 0,
+            'collected': 0,
+            'cursor': 0,
+            'updated': 0,
+            'failed': 0,
+            'failures': {},
+            'elapsed_seconds': 0.0,
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None
+        }
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.backend.get(self._key(job_id))
+
+    def _save(self, job: Dict):
+        self.backend.set(self._key(job['job_id']), job, ttl=self.job_ttl)
+
+    def _page_key(self, job: Dict, page: int) -> str:
+        return f"{self.PAGE_PREFIX}{job['job_id']}:{job['pass']}:{page}"
+
+    def _keys(self, job: Dict) -> List[str]:
+        """The issue keys collected in the current pass, in search order"""
+        keys = []
+        for page in range(job['pages']):
+            keys.extend(self.backend.get(self._page_key(job, page)) or [])
+        return keys
+
+    def _drop_pages(self, job: Dict):
+        self.backend.delete(*(self._page_key(job, page) for page in range(job['pages'])))
+
+    def jql(self, job: Dict) -> str:
+        clauses = [f"labels = {quote_jql(job['label'])}"]
+        if job['project']:
+            clauses.insert(0, f"project = {quote_jql(job['project'])}")
+        return ' AND '.join(clauses) + ' ORDER BY key ASC'
+
+    def payload(self, job: Dict) -> Dict:
+        """Issue update that needs no read-modify-write of the current labels"""
+        operations = [{'remove': job['label']}]
+        if job['action'] == RENAME:
+            operations.insert(0, {'add': job['new_label']})
+        return {'update': {'labels': operations}}
+
+    def summary(self, job: Dict) -> Dict:
+        """Job state for API responses"""
+        summary = dict(job)
+        elapsed = job['elapsed_seconds']
+        summary['issues_per_second'] = round(job['updated'] / elapsed, 2) if elapsed else None
+        return summary
+
+    def run(self, job_id: str, progress: Callable[[Dict], None] = None) -> Dict:
+        """
+        Run or resume a job from its checkpoint. Stops with TaskCancelled when the task is cancelled
+        or out of time; running it again continues where it left off.
+        """
+        job = self.get(job_id)
+        if not job:
+            raise ValueError(f"Label job {job_id} not found")
+        if job['phase'] == DONE:
+            return job
+        legacy_keys = job.pop('keys', None)
+        if legacy_keys is not None:
+            # Jobs checkpointed before keys were stored per page
+            job.update({'pages': 1, 'collected': len(legacy_keys)})
+            self.backend.set(self._page_key(job, 0), legacy_keys, ttl=self.job_ttl)
+
+        job['status'] = 'running'
+        started = time.time()
+
+        def checkpoint():
+            nonlocal started
+            now = time.time()
+            job['elapsed_seconds'] = round(job['elapsed_seconds'] + now - started, 3)
+            started = now
+            self._save(job)
+            if progress:
+                progress(self.summary(job))
+
+        try:
+            while job['phase'] != DONE:
+                if job['phase'] == COLLECT:
+                    if not self._collect(job, checkpoint):
+                        job['status'] = 'failed'
+                        job['error'] = 'Jira search failed; resume the job to retry'
+                        return job
+                elif not self._apply(job, checkpoint):
+                    job['status'] = 'failed'
+                    job['error'] = 'Jira search for issues still carrying the label failed; resume the job to retry'
+                    return job
+            self._drop_pages(job)
+            job['status'] = 'done' if not job['failed'] else 'done_with_errors'
+            job['finished_at'] = datetime.now().isoformat()
+            logger.info(f"Label job {job_id} ({job['action']} {job['label']}): {job['updated']} issues updated, "
+                        f"{job['failed']} failed in {job['elapsed_seconds']:.1f}s")
+            return job
+        except TaskCancelled as e:
+            job['status'] = 'paused'
+            job['error'] = f"Stopped ({e.reason}); resume the job to continue"
+            raise
+        finally:
+            checkpoint()
+
+    def _collect(self, job: Dict, checkpoint: Callable[[], None]) -> bool:
+        """Page through the matching issues; keys are gathered before any update so paging stays stable"""
+        jql = self.jql(job)
+        while True:
+            check_cancelled()
+            data = self.search(jql, job['collect_start_at'], self.page_size)
+            if data is None:
+                return False
+            issues = data.get('issues', [])
+            if issues:
+                # Written under the page number, so a page repeated after a crash overwrites itself
+                self.backend.set(self._page_key(job, job['pages']), [issue['key'] for issue in issues],
+                                 ttl=self.job_ttl)
+                job['pages'] += 1
+                job['collected'] += len(issues)
+            job['collect_start_at'] += len(issues)
+            job['total'] = data.get('total', job['total'])
+            checkpoint()
+            if not issues or job['collect_start_at'] >= (job['total'] or 0):
+                break
+        job['phase'] = APPLY
+        job['cursor'] = 0
+        return True
+
+    def _apply(self, job: Dict, checkpoint: Callable[[], None]) -> bool:
+        """
+        Update the collected issues chunk by chunk with bounded concurrency. Checkpoints persist only
+        the cursor, counters and failures. Returns False if Jira could not say whether issues remain.
+        """
+        payload = self.payload(job)
+        keys = self._keys(job)
+        # Pool threads inherit the task's cancellation token and scheduler class
+        token = current_token()
+        priority, flow = jira_scheduler.current_context()
+
+        def update(issue_key: str) -> Optional[str]:
+            with task_context(token), jira_scheduler.scheduling(priority, flow):
+                check_cancelled()
+                return self.update_issue(issue_key, payload)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='label-job') as pool:
+            while job['cursor'] < len(keys):
+                check_cancelled()
+                chunk = keys[job['cursor']:job['cursor'] + self.chunk_size]
+                errors = self._run_chunk(pool, update, chunk)
+                # Only whole chunks advance the cursor; repeating an add/remove is harmless
+                job['cursor'] += len(chunk)
+                for issue_key in chunk:
+                    if issue_key in errors:
+                        job['failures'][issue_key] = errors[issue_key]
+                    else:
+                        job['updated'] += 1
+                        # A later pass may succeed where an earlier one failed
+                        job['failures'].pop(issue_key, None)
+                job['failed'] = len(job['failures'])
+                checkpoint()
+
+        if job['pass'] < MAX_PASSES:
+            remaining = self._remaining(job)
+            if remaining is None:
+                return False
+            if remaining > len(job['failures']):
+                self._drop_pages(job)
+                job['pass'] += 1
+                job.update({'phase': COLLECT, 'collect_start_at': 0, 'pages': 0, 'collected': 0, 'cursor': 0})
+                return True
+        job['phase'] = DONE
+        return True
+
+    def _run_chunk(self, pool: ThreadPoolExecutor, update: Callable[[str], Optional[str]],
+                   chunk: List[str]) -> Dict[str, str]:
+        futures = {pool.submit(update, issue_key): issue_key for issue_key in chunk}
+        errors = {}
+        stopped = None
+        for future in as_completed(futures):
+            try:
+                error = future.result()
+            except TaskCancelled as e:
+                stopped = e
+                continue
+            except Exception as e:
+                error = str(e)
+            if error:
+                errors[futures[future]] = error
+        if stopped:
+            raise stopped
+        return errors
+
+    def _remaining(self, job: Dict) -> Optional[int]:
+        """How many issues still carry the label after a pass, or None if the search failed"""
+        data = self.search(self.jql(job), 0, 1)
+        return data.get('total', 0) if data is not None else None
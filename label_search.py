@@ -0,0 +1,105 @@
+"""
+Label Search Module for JIRA TPM Application
+Typo-tolerant matching for label search: a deletion-neighbourhood index over label words
+"""
+
+import re
+import logging
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+# Shorter words and queries produce too many accidental one-edit matches
+MIN_FUZZY_LENGTH = 3
+
+
+def words(lowered: str) -> List[str]:
+    """Alphanumeric runs of an already lowercased label"""
+    return WORD_PATTERN.findall(lowered)
+
+
+def deletions(word: str) -> Set[str]:
+    """The word itself and every string made by deleting one character from it"""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Whether a and b differ by at most one insertion, deletion, substitution or adjacent transposition"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    # Skip the common prefix, then the rest must line up after a single edit
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    return a[i:] == b[i + 1:]
+
+
+class TypoIndex:
+    def __init__(self):
+        """Initialize an empty index"""
+        # deletion variant -> words producing it; word -> ids of labels containing it
+        self.variants: Dict[str, Set[str]] = {}
+        self.word_labels: Dict[str, Set[int]] = {}
+
+    def add(self, lowered: str, label_id: int):
+        for word in set(words(lowered)):
+            if len(word) < MIN_FUZZY_LENGTH:
+                continue
+            label_ids = self.word_labels.get(word)
+            if label_ids is None:
+                label_ids = self.word_labels[word] = set()
+                for variant in deletions(word):
+                    self.variants.setdefault(variant, set()).add(word)
+            label_ids.add(label_id)
+
+    def remove(self, lowered: str, label_id: int):
+        for word in set(words(lowered)):
+            label_ids = self.word_labels.get(word)
+            if label_ids is None:
+                continue
+            label_ids.discard(label_id)
+            if label_ids:
+                continue
+            del self.word_labels[word]
+            for variant in deletions(word):
+                owners = self.variants.get(variant)
+                if owners is not None:
+                    owners.discard(word)
+                    if not owners:
+                        del self.variants[variant]
+
+    def lookup(self, query: str) -> Set[int]:
+        """Ids of labels with a word within one edit of the (lowercased) query"""
+        if len(query) < MIN_FUZZY_LENGTH:
+            return set()
+        matched = set()
+        for variant in deletions(query):
+            for word in self.variants.get(variant, ()):
+                if word not in matched and within_one_edit(query, word):
+                    matched.add(word)
+        label_ids: Set[int] = set()
+        for word in matched:
+            label_ids |= self.word_labels[word]
+        return label_ids
+
+    def stats(self) -> Dict:
+        return {'words': len(self.word_labels), 'variants': len(self.variants)}
+
+
+def build_typo_index(entries: Iterable) -> TypoIndex:
+    """Build a TypoIndex from (label, lowered) entries addressed by position"""
+    index = TypoIndex()
+    for label_id, entry in enumerate(entries):
+        if entry:
+            index.add(entry[1], label_id)
+    return index
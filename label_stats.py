@@ -0,0 +1,244 @@
+"""
+Label Stats Module for JIRA TPM Application
+Label usage counts per project, maintained from the issue pages seen by the label sync
+"""
+
+import sys
+import time
+import uuid
+import heapq
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from state_backend import StateBackend
+
+logger = logging.getLogger(__name__)
+
+JIRA_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+
+def parse_jira_time(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds for a Jira timestamp such as 2024-01-15T10:30:00.000+0000"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, JIRA_TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+class LabelStats:
+    ISSUES_KEY = 'label_stats:issues'
+    CHANGES_KEY = 'label_stats:changes'
+    VERSION_KEY = 'label_stats:version'
+
+    # Changed issues written as deltas before the log is folded into a new snapshot
+    MIN_COMPACT_CHANGES = 5000
+
+    def __init__(self, backend: StateBackend):
+        """Initialize empty stats; call sync() to load what a previous run persisted"""
+        self.backend = backend
+        # issue key -> (project, updated_at, seen_at, labels); counts are derived from it
+        self.issues: Dict[str, Tuple[str, Optional[float], float, Tuple[str, ...]]] = {}
+        self.totals: Counter = Counter()
+        self.projects: Dict[str, Counter] = {}
+        # label -> most recent update time of an issue carrying it; kept after the count drops to zero
+        self.last_used: Dict[str, float] = {}
+        # Issues changed since the last save (None when dropped); only these are written
+        self.changed: Dict[str, Optional[Tuple]] = {}
+        # The persisted snapshot and how many delta entries on top of it are applied
+        self.snapshot = None
+        self.applied = 0
+        self.logged = 0
+        self.version = None
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def _count(self, project: str, labels: Iterable[str], delta: int):
+        counts = self.projects.setdefault(project, Counter())
+        for label in labels:
+            self.totals[label] += delta
+            counts[label] += delta
+            if self.totals[label] <= 0:
+                del self.totals[label]
+            if counts[label] <= 0:
+                del counts[label]
+        if not counts:
+            del self.projects[project]
+
+    def _touch(self, labels: Iterable[str], updated_at: Optional[float]):
+        if updated_at is None:
+            return
+        for label in labels:
+            if updated_at > self.last_used.get(label, 0):
+                self.last_used[label] = updated_at
+
+    def observe(self, issues: Iterable[Dict], seen_at: Optional[float] = None):
+        """Apply one page of search results, replacing whatever was counted for those issues before"""
+        seen_at = seen_at or time.time()
+        with self.lock:
+            for issue in issues:
+                key = issue.get('key')
+                if not key:
+                    continue
+                fields = issue.get('fields', {})
+                project = (fields.get('project') or {}).get('key') or key.rsplit('-', 1)[0]
+                project = sys.intern(project)
+                labels = tuple(sorted({sys.intern(str(label)) for label in fields.get('labels') or [] if label}))
+                updated_at = parse_jira_time(fields.get('updated'))
+
+                self._apply(key, (project, updated_at, seen_at, labels) if labels else None)
+                self.changed[key] = self.issues.get(key)
+            self.dirty = True
+
+    def _apply(self, key: str, record: Optional[Tuple]):
+        """Replace what was counted for an issue with record (None drops the issue)"""
+        previous = self.issues.pop(key, None)
+        if previous:
+            self._count(previous[0], previous[3], -1)
+        if record:
+            self.issues[key] = record
+            self._count(record[0], record[3], 1)
+            self._touch(record[3], record[1])
+
+    def prune(self, scan_started_at: float) -> int:
+        """Drop issues a finished full scan did not see (deleted, or all labels removed). Returns how many"""
+        with self.lock:
+            stale = [key for key, record in self.issues.items() if record[2] < scan_started_at]
+            for key in stale:
+                self._apply(key, None)
+                self.changed[key] = None
+            if stale:
+                self.dirty = True
+                logger.info(f"Label stats dropped {len(stale)} issues no longer labelled")
+            return len(stale)
+
+    def save(self):
+        """
+        Persist the issues changed since the last save as one delta entry, and publish a new version.
+        Once the deltas outgrow the issue count they are folded into a fresh snapshot, so a full
+        scan costs writes proportional to the issues it sees rather than one full dump per page.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            if self.snapshot is None or self.logged + len(self.changed) > max(len(self.issues), self.MIN_COMPACT_CHANGES):
+                self.snapshot = str(uuid.uuid4())
+                self.backend.set(self.ISSUES_KEY, {
+                    'issues': {key: list(record) for key, record in self.issues.items()},
+                    'last_used': self.last_used,
+                    'snapshot': self.snapshot
+                })
+                self.backend.delete(self.CHANGES_KEY)
+                self.applied = self.logged = 0
+            else:
+                # Replaying the records also restores last_used, so only the records are logged
+                self.backend.append(self.CHANGES_KEY, {
+                    'snapshot': self.snapshot,
+                    'issues': {key: list(record) if record else None for key, record in self.changed.items()}
+                })
+                self.applied += 1
+                self.logged += len(self.changed)
+            self.version = str(uuid.uuid4())
+            self.backend.set(self.VERSION_KEY, self.version)
+            self.changed = {}
+            self.dirty = False
+
+    @staticmethod
+    def _record(record: List) -> Tuple:
+        project, updated_at, seen_at, labels = record
+        return (sys.intern(project), updated_at, seen_at, tuple(sys.intern(label) for label in labels))
+
+    def sync(self):
+        """Load the persisted records if another process (or a previous run) saved a newer version"""
+        version = self.backend.get(self.VERSION_KEY)
+        if version is None or version == self.version:
+            return
+        snapshot = self.backend.get(self.ISSUES_KEY)
+        if not snapshot:
+            return
+        # Snapshots written before deltas existed are identified by their version
+        snapshot_id = snapshot.get('snapshot') or snapshot.get('version')
+        with self.lock:
+            if snapshot_id != self.snapshot:
+                self.issues = {}
+                self.totals = Counter()
+                self.projects = {}
+                for key, record in snapshot['issues'].items():
+                    record = self._record(record)
+                    self.issues[key] = record
+                    self._count(record[0], record[3], 1)
+                self.last_used = snapshot.get('last_used', {})
+                self.snapshot = snapshot_id
+                self.applied = self.logged = 0
+            entries = self.backend.range(self.CHANGES_KEY, self.applied)
+            for entry in entries:
+                # Entries of an older snapshot are already folded into this one
+                if entry['snapshot'] != snapshot_id:
+                    continue
+                for key, record in entry['issues'].items():
+                    self._apply(key, self._record(record) if record else None)
+                self.logged += len(entry['issues'])
+            self.applied += len(entries)
+            self.version = version
+            self.changed = {}
+            self.dirty = False
+
+    def count(self, label: str) -> int:
+        return self.totals.get(label, 0)
+
+    def top(self, k: int = 20, project: Optional[str] = None) -> List[Tuple[str, int]]:
+        """The k most used labels, overall or within one project"""
+        with self.lock:
+            counts = self.totals if project is None else self.projects.get(project, Counter())
+            return heapq.nlargest(k, counts.items(), key=lambda item: (item[1], item[0]))
+
+    def usage(self, label: str) -> Dict:
+        """Issue count of one label, split by project"""
+        with self.lock:
+            by_project = {project: counts[label] for project, counts in self.projects.items() if label in counts}
+            last_used = self.last_used.get(label)
+            return {
+                'label': label,
+                'issues': self.totals.get(label, 0),
+                'projects': dict(sorted(by_project.items(), key=lambda item: -item[1])),
+                'last_used': datetime.fromtimestamp(last_used).isoformat() if last_used else None
+            }
+
+    def project_summary(self) -> List[Dict]:
+        """Labelled issue and distinct label counts for each project"""
+        with self.lock:
+            issues_per_project = Counter(record[0] for record in self.issues.values())
+            return sorted(
+                ({'project': project, 'issues': issues_per_project[project], 'labels': len(counts)}
+                 for project, counts in self.projects.items()),
+                key=lambda entry: -entry['issues']
+            )
+
+    def unused_since(self, since: float, labels: Iterable[str] = ()) -> List[Dict]:
+        """
+        Labels whose most recent issue update is older than since, oldest first.
+        Labels passed in that were never seen on an issue are included with no last_used.
+        """
+        with self.lock:
+            unused = [
+                (last_used, label) for label, last_used in self.last_used.items() if last_used < since
+            ]
+            unused.extend((0, label) for label in labels if label not in self.last_used)
+            unused.sort()
+            return [{
+                'label': label,
+                'issues': self.totals.get(label, 0),
+                'last_used': datetime.fromtimestamp(last_used).isoformat() if last_used else None
+            } for last_used, label in unused]
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'issues': len(self.issues),
+                'labels': len(self.totals),
+                'projects': len(self.projects)
+            }
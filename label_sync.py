@@ -0,0 +1,317 @@
+"""
+Label Sync Module for JIRA TPM Application
+Incremental label harvesting: one resumable full scan, then updated-since queries and periodic reconciles
+"""
+
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from label_stats import LabelStats
+from state_backend import StateBackend
+
+logger = logging.getLogger(__name__)
+
+# Scan modes
+FULL = 'full'
+RECONCILE = 'reconcile'
+
+FULL_SCAN_JQL = 'labels is not EMPTY ORDER BY created ASC, key ASC'
+
+
+class LeaseLost(Exception):
+    """Raised when the sync lease expired and another run took it over"""
+
+
+class LabelSync:
+    STATE_KEY = 'label_sync:state'
+    LABELS_KEY = 'label_sync:labels'
+    SCAN_KEY = 'label_sync:scan'
+    LEASE_KEY = 'label_sync:lease'
+
+    def __init__(self, backend: StateBackend, search: Callable[[str, int, int], Optional[Dict]],
+                 on_labels: Callable[[Set[str]], None] = None, page_size: int = 100,
+                 overlap_minutes: int = 5, reconcile_interval: int = 86400, checkpoint_pages: int = 10,
+                 stats: Optional[LabelStats] = None, lease_seconds: float = 300):
+        """
+        search(jql, start_at, max_results) returns a Jira search response (issues with the labels field) or None.
+        on_labels receives the full label set when it changes: labels found mid-run are published at checkpoints
+        and when a run stops unfinished; a complete run leaves publishing its labels to the caller.
+        stats, if given, is fed every page (it needs the project and updated fields too) and saved with the labels.
+        lease_seconds is how long a run may go without fetching a page before another run can take over.
+        """
+        self.backend = backend
+        self.search = search
+        self.on_labels = on_labels
+        self.page_size = page_size
+        self.overlap_minutes = overlap_minutes
+        self.reconcile_interval = reconcile_interval
+        self.checkpoint_pages = checkpoint_pages
+        self.stats = stats
+        self.lease_seconds = lease_seconds
+        self.lease_id = str(uuid.uuid4())
+        self._unpublished = None
+
+    def state(self) -> Dict:
+        """Persisted sync state: scan cursor and the times of the last full scan, sync and reconcile"""
+        return self.backend.get(self.STATE_KEY) or {
+            'scan_mode': None,
+            'scan_started_at': None,
+            'scan_start_at': 0,
+            'scan_total': None,
+            'last_full_scan_at': None,
+            'last_sync_at': None,
+            'last_reconcile_at': None,
+            'labels': 0
+        }
+
+    def labels(self) -> Set[str]:
+        """Labels harvested so far"""
+        return set(self.backend.get(self.LABELS_KEY) or [])
+
+    def _acquire(self, ttl: float) -> bool:
+        """Take the cross-process lease so only one sync runs at a time"""
+        now = time.time()
+
+        def take(lease):
+            if lease and lease['expires_at'] > now and lease['owner'] != self.lease_id:
+                return None
+            return {'owner': self.lease_id, 'expires_at': now + ttl}
+
+        return self.backend.update(self.LEASE_KEY, take) is not None
+
+    def _renew(self):
+        """Extend the lease before each page; raises LeaseLost if another run has taken it over"""
+        now = time.time()
+
+        def extend(lease):
+            if not lease or lease['owner'] != self.lease_id:
+                return None
+            return {'owner': self.lease_id, 'expires_at': now + self.lease_seconds}
+
+        if self.backend.update(self.LEASE_KEY, extend) is None:
+            raise LeaseLost()
+
+    def _release(self):
+        def drop(lease):
+            if lease and lease['owner'] == self.lease_id:
+                return {'owner': None, 'expires_at': 0}
+            return None
+        self.backend.update(self.LEASE_KEY, drop)
+
+    def _save(self, state: Dict, labels: Set[str]):
+        self.backend.set(self.LABELS_KEY, sorted(labels))
+        state['labels'] = len(labels)
+        if self.stats:
+            self.stats.save()
+        self.backend.set(self.STATE_KEY, state)
+
+    def _publish(self, labels: Set[str]):
+        if self.on_labels:
+            self.on_labels(labels)
+
+    def _found(self, labels: Set[str]):
+        """Hold labels found mid-run until the next checkpoint instead of publishing every page"""
+        self._unpublished = set(labels)
+
+    def _flush(self):
+        if self._unpublished is not None:
+            labels, self._unpublished = self._unpublished, None
+            self._publish(labels)
+
+    def _page_labels(self, issues: Iterable[Dict]) -> Set[str]:
+        if self.stats:
+            self.stats.observe(issues)
+        found = set()
+        for issue in issues:
+            for label in issue.get('fields', {}).get('labels') or []:
+                if label:
+                    found.add(str(label))
+        return found
+
+    def run(self, budget_seconds: Optional[float] = None, progress: Callable[[Dict], None] = None) -> Dict:
+        """
+        Advance the sync: continue (or start) a full/reconcile scan if one is due, otherwise fetch
+        issues updated since the last sync. Stops after budget_seconds and resumes on the next call.
+        Returns a summary with 'complete' False when work remains.
+        """
+        if not self._acquire(ttl=self.lease_seconds):
+            return {'complete': False, 'busy': True, 'labels': self.state()['labels']}
+
+        self._unpublished = None
+        try:
+            started = time.time()
+            state = self.state()
+            labels = self.labels()
+
+            if self.stats:
+                self.stats.sync()
+
+            if not state['scan_mode']:
+                if not state['last_full_scan_at']:
+                    self._start_scan(state, FULL)
+                elif time.time() - (state['last_reconcile_at'] or state['last_full_scan_at']) >= self.reconcile_interval:
+                    self._start_scan(state, RECONCILE)
+                elif self.stats and labels and not self.stats.issues:
+                    # Labels harvested before usage stats existed: rescan once to count them
+                    self._start_scan(state, RECONCILE)
+
+            if state['scan_mode'] == RECONCILE:
+                # A reconcile can span many runs; keep picking up new labels meanwhile
+                self._incremental(state, labels, started, budget_seconds, progress)
+            if state['scan_mode']:
+                complete = self._scan(state, labels, started, budget_seconds, progress)
+            else:
+                complete = self._incremental(state, labels, started, budget_seconds, progress)
+            if not complete:
+                self._flush()
+
+            return {
+                'complete': complete,
+                'mode': state['scan_mode'] or 'incremental',
+                'labels': state['labels'],
+                'seconds': round(time.time() - started, 3)
+            }
+        except LeaseLost:
+            # The other run owns the cursor and state now; saving here would overwrite its progress
+            logger.warning("Label sync lease was taken over by another run; stopping without saving")
+            return {'complete': False, 'busy': True, 'labels': self.state()['labels']}
+        finally:
+            self._unpublished = None
+            self._release()
+
+    def _start_scan(self, state: Dict, mode: str):
+        logger.info(f"Starting {mode} label scan")
+        state.update({'scan_mode': mode, 'scan_started_at': time.time(), 'scan_start_at': 0, 'scan_total': None})
+        self.backend.set(self.SCAN_KEY, [])
+        self.backend.set(self.STATE_KEY, state)
+
+    def _scan(self, state: Dict, labels: Set[str], started: float, budget_seconds: Optional[float],
+              progress: Callable[[Dict], None]) -> bool:
+        """Page through every labelled issue from the persisted cursor"""
+        scanned = set(self.backend.get(self.SCAN_KEY) or [])
+        pages = 0
+        while True:
+            if budget_seconds is not None and time.time() - started >= budget_seconds:
+                self._checkpoint(state, labels, scanned)
+                logger.info(f"Label scan paused at {state['scan_start_at']}/{state['scan_total']}")
+                return False
+
+            self._renew()
+            try:
+                data = self.search(FULL_SCAN_JQL, state['scan_start_at'], self.page_size)
+            except BaseException:
+                # Cancelled or crashed mid-scan: keep everything gathered up to the cursor
+                self._checkpoint(state, labels, scanned)
+                raise
+            if data is None:
+                self._checkpoint(state, labels, scanned)
+                logger.error(f"Label scan failed at {state['scan_start_at']}; will resume from there")
+                return False
+
+            issues = data.get('issues', [])
+            found = self._page_labels(issues)
+            scanned |= found
+            if state['scan_mode'] == FULL and not found <= labels:
+                # A first full scan serves labels as soon as they are found
+                labels |= found
+                self._found(labels)
+            state['scan_start_at'] += len(issues)
+            state['scan_total'] = data.get('total', state['scan_total'])
+            pages += 1
+            if progress:
+                progress({'mode': state['scan_mode'], 'scanned': state['scan_start_at'], 'total': state['scan_total']})
+
+            if not issues or state['scan_start_at'] >= (state['scan_total'] or 0):
+                break
+            if pages % self.checkpoint_pages == 0:
+                self._checkpoint(state, labels, scanned)
+
+        # Labels that no issue carries any more disappear here
+        labels.clear()
+        labels |= scanned
+        scan_started_at = state['scan_started_at']
+        if self.stats:
+            # Incremental syncs only see labelled issues, so issues stripped of labels are dropped here
+            self.stats.prune(scan_started_at)
+        if state['scan_mode'] == RECONCILE:
+            state['last_reconcile_at'] = scan_started_at
+        else:
+            state['last_full_scan_at'] = scan_started_at
+            state['last_reconcile_at'] = scan_started_at
+        state.update({'scan_mode': None, 'scan_started_at': None, 'scan_start_at': 0})
+        # Catch up on issues updated while the scan ran
+        state['last_sync_at'] = min(state['last_sync_at'] or scan_started_at, scan_started_at)
+        self.backend.set(self.SCAN_KEY, [])
+        self._save(state, labels)
+        self._found(labels)
+        logger.info(f"Label scan finished with {len(labels)} labels in {time.time() - scan_started_at:.1f}s")
+        return self._incremental(state, labels, started, budget_seconds, progress)
+
+    def _checkpoint(self, state: Dict, labels: Set[str], scanned: Set[str]):
+        self.backend.set(self.SCAN_KEY, sorted(scanned))
+        self._save(state, labels)
+        self._flush()
+
+    def _incremental(self, state: Dict, labels: Set[str], started: float, budget_seconds: Optional[float],
+                     progress: Callable[[Dict], None]) -> bool:
+        """Merge labels from issues updated since the last sync"""
+        sync_started = time.time()
+        # Relative JQL dates avoid any dependence on the Jira user's time zone
+        minutes = int((sync_started - state['last_sync_at']) // 60) + self.overlap_minutes
+        jql = f'labels is not EMPTY AND updated >= -{minutes}m ORDER BY updated ASC'
+        start_at = 0
+        new_labels = set()
+        while True:
+            if budget_seconds is not None and time.time() - started >= budget_seconds and start_at:
+                # Leave last_sync_at alone so the next run repeats this window
+                break
+            self._renew()
+            data = self.search(jql, start_at, self.page_size)
+            if data is None:
+                logger.error("Incremental label sync failed; the window will be retried")
+                break
+            issues = data.get('issues', [])
+            new_labels |= self._page_labels(issues)
+            start_at += len(issues)
+            if progress:
+                progress({'mode': 'incremental', 'scanned': start_at, 'total': data.get('total')})
+            if not issues or start_at >= data.get('total', 0):
+                state['last_sync_at'] = sync_started
+                break
+
+        added = new_labels - labels
+        if added:
+            labels |= added
+            self._found(labels)
+            logger.info(f"Incremental label sync added {len(added)} labels")
+        self._save(state, labels)
+        # A reconcile still in flight must keep these labels in its final result
+        if added and state['scan_mode'] == RECONCILE:
+            scanned = set(self.backend.get(self.SCAN_KEY) or [])
+            self.backend.set(self.SCAN_KEY, sorted(scanned | added))
+        return state['last_sync_at'] == sync_started
+
+    def adjust(self, added: Iterable[str] = (), removed: Iterable[str] = ()):
+        """
+        Apply label changes made through this application without waiting for a sync.
+        A sync running at the same time may overwrite them; the next reconcile settles it.
+        """
+        added, removed = set(added), set(removed)
+
+        def change(stored):
+            return sorted((set(stored or []) | added) - removed)
+
+        labels = set(self.backend.update(self.LABELS_KEY, change))
+        self._publish(labels)
+
+    def status(self) -> Dict:
+        """Sync state with readable timestamps"""
+        state = self.state()
+        readable = dict(state)
+        for key in ('scan_started_at', 'last_full_scan_at', 'last_sync_at', 'last_reconcile_at'):
+            if state.get(key):
+                readable[key] = datetime.fromtimestamp(state[key]).isoformat()
+        return readable
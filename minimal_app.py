@@ -10,10 +10,14 @@ import os
 import hashlib
 from datetime import datetime
 
+from device_tracking import DeviceTracker
+
 app = Flask(__name__)
 
 # Device tracking functionality
 DEVICE_DATA_FILE = 'data/device_access.json'
+# Accesses are appended to data/device_access.log.jsonl and folded into the file in the background
+device_tracker = DeviceTracker(DEVICE_DATA_FILE)
 
 def get_device_fingerprint():
     """Generate a device fingerprint from request headers"""
@@ -35,57 +39,13 @@ def get_device_fingerprint():
         print(f"Error generating device fingerprint: {str(e)}")
         return None
 
-def load_device_data():
-    """Load device access data from file"""
-    try:
-        if os.path.exists(DEVICE_DATA_FILE):
-            with open(DEVICE_DATA_FILE, 'r') as f:
-                return json.load(f)
-        return {'devices': {}, 'total_accesses': 0, 'last_updated': None}
-    except Exception as e:
-        print(f"Error loading device data: {str(e)}")
-        return {'devices': {}, 'total_accesses': 0, 'last_updated': None}
-
-def save_device_data(data):
-    """Save device access data to file"""
-    try:
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(DEVICE_DATA_FILE), exist_ok=True)
-        
-        data['last_updated'] = datetime.now().isoformat()
-        with open(DEVICE_DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Error saving device data: {str(e)}")
-
 def track_device_access():
     """Track device access and return current count"""
     try:
         device_id = get_device_fingerprint()
         if not device_id:
             return 0
-            
-        data = load_device_data()
-        
-        # Initialize device data if not exists
-        if device_id not in data['devices']:
-            data['devices'][device_id] = {
-                'first_access': datetime.now().isoformat(),
-                'last_access': datetime.now().isoformat(),
-                'access_count': 0
-            }
-        
-        # Update device access info
-        data['devices'][device_id]['last_access'] = datetime.now().isoformat()
-        data['devices'][device_id]['access_count'] += 1
-        data['total_accesses'] += 1
-        
-        # Save updated data
-        save_device_data(data)
-        
-        # Return unique device count
-        return len(data['devices'])
-        
+        return device_tracker.record(device_id)
     except Exception as e:
         print(f"Error tracking device access: {str(e)}")
         return 0
@@ -207,8 +167,8 @@ def track_device():
 def get_device_count():
     """Get current device count without tracking"""
     try:
-        data = load_device_data()
-        device_count = len(data['devices'])
+        data = device_tracker.summary()
+        device_count = data['device_count']
         return jsonify({
             'success': True,
             'device_count': device_count,
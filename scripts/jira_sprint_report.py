@@ -1,5 +1,3 @@
-import requests
-from requests.auth import HTTPBasicAuth
 from dateutil import parser
 from datetime import datetime
 import json
@@ -10,6 +8,11 @@ import sys
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from jira_scheduler import jira_get
+from jira_client import jira_clients
+from tenants import current_tenant
+from cancellation import TaskCancelled, check_cancelled, request_timeout
+
 try:
     from settings_manager import settings_manager
 except ImportError:
@@ -36,17 +39,18 @@ def get_jira_credentials():
         'api_token': os.getenv('JIRA_API_TOKEN')
     }
 
+def get_jira_client():
+    """Get the shared JIRA client (auth, headers and connection pool) of the current tenant"""
+    tenant = current_tenant()
+    if not tenant.is_default:
+        return tenant.client()
+    # Raises ValueError if the credentials are incomplete
+    return jira_clients.client(get_jira_credentials())
+
 def get_auth_and_headers():
     """Get authentication and headers for JIRA API calls"""
-    credentials = get_jira_credentials()
-    
-    if not credentials or not all([credentials.get('url'), credentials.get('email'), credentials.get('api_token')]):
-        raise ValueError("JIRA credentials not configured. Please configure them in Settings.")
-    
-    auth = HTTPBasicAuth(credentials['email'], credentials['api_token'])
-    headers = {"Accept": "application/json"}
-    
-    return credentials['url'], auth, headers
+    client = get_jira_client()
+    return client.url, client.auth, client.headers
 
 # Get initial credentials
 try:
@@ -57,10 +61,11 @@ except ValueError as e:
 
 def get_board_id(board_name):
     try:
-        jira_url, auth_obj, headers_obj = get_auth_and_headers()
+        client = get_jira_client()
+        jira_url = client.url
         url = f"{jira_url}/rest/agile/1.0/board"
         params = {"name": board_name}
-        resp = requests.get(url, headers=headers_obj, auth=auth_obj, params=params)
+        resp = jira_get(url, session=client.session, params=params, timeout=request_timeout(30))
         resp.raise_for_status()
         data = resp.json()
         if data.get("values"):
@@ -72,13 +77,14 @@ def get_board_id(board_name):
 
 def get_sprints_for_board(board_id):
     try:
-        jira_url, auth_obj, headers_obj = get_auth_and_headers()
+        client = get_jira_client()
+        jira_url = client.url
         url = f"{jira_url}/rest/agile/1.0/board/{board_id}/sprint"
         params = {
             "maxResults": 15  # Get more sprints to ensure we have enough
         }
         print(f"\nFetching sprints for board {board_id}")
-        resp = requests.get(url, headers=headers_obj, auth=auth_obj, params=params)
+        resp = jira_get(url, session=client.session, params=params, timeout=request_timeout(30))
         resp.raise_for_status()
         data = resp.json()
         all_sprints = data.get("values", [])
@@ -143,13 +149,14 @@ def get_sprints_for_board(board_id):
 
 def get_sprint_report(board_id, sprint_id):
     try:
-        jira_url, auth_obj, headers_obj = get_auth_and_headers()
+        client = get_jira_client()
+        jira_url = client.url
         url = f"{jira_url}/rest/greenhopper/1.0/rapid/charts/sprintreport"
         params = {
             "rapidViewId": board_id,
             "sprintId": sprint_id
         }
-        resp = requests.get(url, headers=headers_obj, auth=auth_obj, params=params)
+        resp = jira_get(url, session=client.session, params=params, timeout=request_timeout(30))
         resp.raise_for_status()
         return resp.json()
     except ValueError as e:
@@ -176,7 +183,41 @@ def generate_insight(completed, not_completed, scope_change, total_planned):
         
     return " | ".join(insights)
 
+def build_sprint_result(sprint, completed_count=0, not_completed_count=0, added_during_sprint=0,
+                        removed_during_sprint=0, initial_planned=0, initial_planned_sp=0, completed_sp=0):
+    """The report row for a sprint from its counts (those gathered so far, for a stopped analysis)"""
+    start_date = sprint.get("startDate", "N/A")
+    end_date = sprint.get("endDate", "N/A")
+    total_planned = completed_count + not_completed_count
+    completion_pct = f"{(completed_count / total_planned * 100):.1f}%" if total_planned > 0 else "N/A"
+    
+    # Generate insights
+    insight = generate_insight(
+        completed_count,
+        not_completed_count,
+        added_during_sprint,
+        total_planned
+    )
+    
+    return {
+        "Sprint Name": sprint.get("name", "Unknown Sprint"),
+        "Start Date": start_date[:10] if start_date != "N/A" else "N/A",
+        "End Date": end_date[:10] if end_date != "N/A" else "N/A",
+        "Status": sprint.get("state", "N/A"),
+        "Initial Planned": initial_planned,
+        "Completed": completed_count,
+        "Not Completed": not_completed_count,
+        "Added During Sprint": added_during_sprint,
+        "Removed During Sprint": removed_during_sprint,
+        "Initial Planned SP": initial_planned_sp,
+        "Completed SP": completed_sp,
+        "Completion %": completion_pct,
+        "Insight": insight
+    }
+
 def analyze_sprint(sprint, board_id=None):
+    # Counts known so far, handed to the caller if the analysis is stopped
+    gathered = {}
     try:
         if not sprint:
             print("Invalid sprint data")
@@ -207,16 +248,17 @@ def analyze_sprint(sprint, board_id=None):
         
         # Get all issues in the sprint using the official Jira Agile REST API
         try:
-            jira_url, auth_obj, headers_obj = get_auth_and_headers()
+            client = get_jira_client()
+            jira_url = client.url
             
             # Step 1: Get sprint info (dates, state, etc.)
             sprint_info_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}"
-            sprint_info_resp = requests.get(sprint_info_url, headers=headers_obj, auth=auth_obj)
+            sprint_info_resp = jira_get(sprint_info_url, session=client.session, timeout=request_timeout(30))
             
             # Step 2: Get all issues in the sprint
             sprint_issues_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}/issue"
             params = {"maxResults": 1000}
-            sprint_issues_resp = requests.get(sprint_issues_url, headers=headers_obj, auth=auth_obj, params=params)
+            sprint_issues_resp = jira_get(sprint_issues_url, session=client.session, params=params, timeout=request_timeout(30))
             
             if sprint_issues_resp.status_code == 200:
                 sprint_issues_data = sprint_issues_resp.json()
@@ -260,7 +302,7 @@ def analyze_sprint(sprint, board_id=None):
                     
                     # Fallback: Use regular sprint issues API
                     issues_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}/issue?maxResults=100"
-                    issues_resp = requests.get(issues_url, headers=headers_obj, auth=auth_obj)
+                    issues_resp = jira_get(issues_url, session=client.session, timeout=request_timeout(30))
                     
                     if issues_resp.status_code == 200:
                         issues_data = issues_resp.json()
@@ -283,6 +325,9 @@ def analyze_sprint(sprint, board_id=None):
                         print(f"  Completed: {len(completed_issues)}")
                         print(f"  Incomplete: {len(incomplete_issues)}")
                         
+                        gathered.update(completed_count=len(completed_issues), not_completed_count=len(incomplete_issues),
+                                        initial_planned=len(all_issues))
+                        
                         # For fallback, we need to determine which issues were added during sprint
                         # We can do this by checking the changelog for each issue
                         print(f"DEBUG - Analyzing changelog to determine added/removed issues...")
@@ -304,13 +349,14 @@ def analyze_sprint(sprint, board_id=None):
                         
                         # Check each issue's changelog to see when it was added to sprint
                         for issue in all_issues:
+                            check_cancelled()
                             issue_key = issue.get('key')
                             if not issue_key:
                                 continue
                                 
                             # Get issue changelog
                             issue_url = f"{jira_url}/rest/api/2/issue/{issue_key}?expand=changelog"
-                            issue_resp = requests.get(issue_url, headers=headers_obj, auth=auth_obj)
+                            issue_resp = jira_get(issue_url, session=client.session, timeout=request_timeout(30))
                             
                             if issue_resp.status_code == 200:
                                 issue_data = issue_resp.json()
@@ -445,12 +491,17 @@ def analyze_sprint(sprint, board_id=None):
                     print(f"  - completed + notCompletedInCurrent: {alternative_calc3}")
                     print(f"🔍 END SPRINT 8699 DEBUG 🔍\n")
                 
+                gathered.update(completed_count=completed_count, not_completed_count=not_completed_count,
+                                added_during_sprint=added_during_sprint, removed_during_sprint=removed_during_sprint,
+                                initial_planned=initial_planned)
+                
                 # Calculate story points by making separate API calls to get full issue details
                 initial_planned_sp = 0
                 completed_sp = 0
                 
                 # Get story points for completed issues
                 for issue in completed_issues:
+                    check_cancelled()
                     try:
                         issue_key = issue.get('key')
                         if not issue_key:
@@ -458,7 +509,7 @@ def analyze_sprint(sprint, board_id=None):
                             
                         # Make API call to get full issue details
                         issue_url = f"{jira_url}/rest/api/2/issue/{issue_key}"
-                        issue_resp = requests.get(issue_url, headers=headers_obj, auth=auth_obj)
+                        issue_resp = jira_get(issue_url, session=client.session, timeout=request_timeout(30))
                         if issue_resp.status_code == 200:
                             issue_data = issue_resp.json()
                             fields = issue_data.get('fields', {})
@@ -516,8 +567,11 @@ def analyze_sprint(sprint, board_id=None):
                         print(f"DEBUG: Error processing story points for completed issue {issue.get('key', 'unknown')}: {str(e)}")
                         continue
                 
+                gathered.update(completed_sp=completed_sp, initial_planned_sp=completed_sp)
+                
                 # Get story points for incomplete issues
                 for issue in incomplete_issues:
+                    check_cancelled()
                     try:
                         issue_key = issue.get('key')
                         if not issue_key:
@@ -525,7 +579,7 @@ def analyze_sprint(sprint, board_id=None):
                             
                         # Make API call to get full issue details
                         issue_url = f"{jira_url}/rest/api/2/issue/{issue_key}"
-                        issue_resp = requests.get(issue_url, headers=headers_obj, auth=auth_obj)
+                        issue_resp = jira_get(issue_url, session=client.session, timeout=request_timeout(30))
                         if issue_resp.status_code == 200:
                             issue_data = issue_resp.json()
                             fields = issue_data.get('fields', {})
@@ -614,10 +668,11 @@ def analyze_sprint(sprint, board_id=None):
             print(f"Sprint report API failed: {str(e)}, using fallback method")
             
             try:
-                jira_url, auth_obj, headers_obj = get_auth_and_headers()
+                client = get_jira_client()
+                jira_url = client.url
                 # Fallback: Get all issues in the sprint
                 issues_url = f"{jira_url}/rest/agile/1.0/sprint/{sprint_id}/issue?maxResults=100"
-                issues_resp = requests.get(issues_url, headers=headers_obj, auth=auth_obj)
+                issues_resp = jira_get(issues_url, session=client.session, timeout=request_timeout(30))
             except ValueError as cred_error:
                 print(f"Credentials error in fallback: {str(cred_error)}")
                 return None
@@ -639,6 +694,10 @@ def analyze_sprint(sprint, board_id=None):
             sprint_end_dt = parser.parse(end_date) if end_date != "N/A" else None
             
             for issue in issues:
+                gathered.update(completed_count=completed_count, not_completed_count=not_completed_count,
+                                initial_planned=completed_count + not_completed_count,
+                                completed_sp=completed_sp, initial_planned_sp=initial_planned_sp + completed_sp)
+                check_cancelled()
                 try:
                     issue_key = issue.get("key")
                     if not issue_key:
@@ -709,32 +768,12 @@ def analyze_sprint(sprint, board_id=None):
             # Calculate initial planned count for fallback case
             initial_planned = completed_count + not_completed_count
         
-        total_planned = completed_count + not_completed_count
-        completion_pct = f"{(completed_count / total_planned * 100):.1f}%" if total_planned > 0 else "N/A"
-        
-        # Generate insights
-        insight = generate_insight(
-            completed_count,
-            not_completed_count,
-            added_during_sprint,
-            total_planned
-        )
-        
-        return {
-            "Sprint Name": sprint_name,
-            "Start Date": start_date[:10] if start_date != "N/A" else "N/A",
-            "End Date": end_date[:10] if end_date != "N/A" else "N/A",
-            "Status": state,
-            "Initial Planned": initial_planned,
-            "Completed": completed_count,
-            "Not Completed": not_completed_count,
-            "Added During Sprint": added_during_sprint,
-            "Removed During Sprint": removed_during_sprint,
-            "Initial Planned SP": initial_planned_sp,
-            "Completed SP": completed_sp,
-            "Completion %": completion_pct,
-            "Insight": insight
-        }
+        return build_sprint_result(sprint, completed_count, not_completed_count, added_during_sprint,
+                                   removed_during_sprint, initial_planned, initial_planned_sp, completed_sp)
+    except TaskCancelled as e:
+        # Hand the analysis so far to the caller
+        e.partial_data = build_sprint_result(sprint, **gathered)
+        raise
     except Exception as e:
         print(f"Error analyzing sprint: {str(e)}")
         return None
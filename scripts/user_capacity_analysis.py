@@ -1,5 +1,3 @@
-import requests
-from requests.auth import HTTPBasicAuth
 from dateutil import parser
 from datetime import datetime, timedelta
 import json
@@ -11,6 +9,11 @@ import sys
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from jira_scheduler import jira_get
+from jira_client import jira_clients
+from tenants import current_tenant
+from cancellation import TaskCancelled, check_cancelled, request_timeout, DEADLINE
+
 try:
     from settings_manager import settings_manager
 except ImportError:
@@ -33,17 +36,18 @@ def get_jira_credentials():
         'api_token': os.getenv('JIRA_API_TOKEN')
     }
 
+def get_jira_client():
+    """Get the shared JIRA client (auth, headers and connection pool) of the current tenant"""
+    tenant = current_tenant()
+    if not tenant.is_default:
+        return tenant.client()
+    # Raises ValueError if the credentials are incomplete
+    return jira_clients.client(get_jira_credentials())
+
 def get_auth_and_headers():
     """Get authentication and headers for JIRA API calls"""
-    credentials = get_jira_credentials()
-    
-    if not credentials or not all([credentials.get('url'), credentials.get('email'), credentials.get('api_token')]):
-        raise ValueError("JIRA credentials not configured. Please configure them in Settings.")
-    
-    auth = HTTPBasicAuth(credentials['email'], credentials['api_token'])
-    headers = {"Accept": "application/json"}
-    
-    return credentials['url'], auth, headers
+    client = get_jira_client()
+    return client.url, client.auth, client.headers
 
 def get_user_issues(user_email, weeks_back=8):
     """
@@ -51,7 +55,8 @@ def get_user_issues(user_email, weeks_back=8):
     """
     try:
         # Get Jira credentials and authentication
-        jira_url, auth, headers = get_auth_and_headers()
+        client = get_jira_client()
+        jira_url = client.url
         
         # Calculate date range
         end_date = datetime.now()
@@ -79,8 +84,14 @@ def get_user_issues(user_email, weeks_back=8):
         total_available = None
         
         while True:
+            try:
+                check_cancelled()
+            except TaskCancelled as e:
+                # Hand the pages fetched so far to the caller
+                e.partial_data = all_issues
+                raise
             params["startAt"] = start_at
-            response = requests.get(url, headers=headers, auth=auth, params=params)
+            response = jira_get(url, session=client.session, params=params, timeout=request_timeout(30))
             response.raise_for_status()
             data = response.json()
             
@@ -306,14 +317,28 @@ def analyze_user_capacity(user_email, weeks_back=8):
     print(f"\n🔍 Starting capacity analysis for {user_email}")
     print("=" * 60)
     
-    # Fetch user issues
-    issues = get_user_issues(user_email, weeks_back)
+    # Fetch user issues; past the deadline, analyze whatever was fetched in time
+    partial_reason = None
+    try:
+        issues = get_user_issues(user_email, weeks_back)
+    except TaskCancelled as e:
+        if e.reason != DEADLINE or not e.partial_data:
+            raise
+        print(f"Deadline reached, analyzing the {len(e.partial_data)} issues fetched so far")
+        issues = e.partial_data
+        partial_reason = e.reason
     if not issues:
         return {
             'error': 'No issues found for the specified user',
             'user_email': user_email
         }
-    
+    return summarize_user_capacity(user_email, weeks_back, issues, partial_reason)
+
+def summarize_user_capacity(user_email, weeks_back, issues, partial_reason=None):
+    """
+    Build the capacity analysis result from fetched issues; partial_reason marks a result
+    built from only the issues fetched before the analysis was stopped
+    """
     # Analyze issue breakdown
     issue_breakdown = analyze_issue_breakdown(issues, user_email)
     
@@ -350,7 +375,7 @@ def analyze_user_capacity(user_email, weeks_back=8):
     jira_url, _, _ = get_auth_and_headers()
     jira_link = f"{jira_url}/issues/?jql={encoded_jql}"
     
-    return {
+    result = {
         'user_email': user_email,
         'analysis_period': f"Last {weeks_back} weeks",
         'metrics': metrics,
@@ -362,6 +387,10 @@ def analyze_user_capacity(user_email, weeks_back=8):
         'jira_link': jira_link,
         'jql_query': jql_query
     }
+    if partial_reason:
+        result['partial'] = True
+        result['partial_reason'] = partial_reason
+    return result
 
 def analyze_issue_breakdown(issues, user_email):
     """
@@ -6,13 +6,28 @@ Handles application settings, configuration, and user preferences
 
 import json
 import os
-from typing import Dict, Any, Optional
+import copy
+import time
+import threading
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime
 import hashlib
 
+from tracking_policy import DEFAULT_EXCLUDE
+
+# Seconds between checks of the settings file's mtime; reads in between are served from memory
+CHECK_INTERVAL = 1.0
+
 class SettingsManager:
-    def __init__(self, settings_file: str = 'jira_settings.json'):
+    def __init__(self, settings_file: str = 'jira_settings.json', check_interval: float = CHECK_INTERVAL):
         self.settings_file = settings_file
+        self.check_interval = check_interval
+        self.lock = threading.RLock()
+        self.listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+        # Bumped whenever the settings really change, so dependants can tell whether to rebuild
+        self._version = 0
+        self._mtime = None
+        self._checked_at = time.monotonic()
         self.settings_key_file = '.settings_key'
         self.default_settings = {
             'theme': 'light',
@@ -34,9 +49,19 @@ class SettingsManager:
                 'default_status': ''
             },
             'analytics': {
-                'enabled': True,
+                'enabled': True,  # Kill switch for request tracking
                 'tracking_period': 90,
-                'show_cost_analysis': True
+                'show_cost_analysis': True,
+                'write_batch_size': 200,  # Tracking rows committed per batch
+                'write_flush_interval': 1.0,  # Seconds before a partial batch is committed
+                'write_queue_limit': 10000,  # Queued tracking rows before new ones are dropped
+                'read_connections': 4,  # Pooled SQLite connections for analytics reads
+                'identity_cache_size': 10000,  # Recently seen users kept in memory by the tracker
+                'last_seen_flush_interval': 60.0,  # Seconds between coalesced last_seen writes
+                'track_include': [],  # Path globs to track; empty tracks every path not excluded
+                'track_exclude': list(DEFAULT_EXCLUDE),  # Path globs never tracked (assets, polls, streams)
+                'track_sample_rates': {},  # Path glob -> fraction of requests tracked, first match wins
+                'ingest_buffer_batches': 1000  # Frontend batches buffered before the oldest are evicted
             },
             'export': {
                 'format': 'csv',
@@ -49,29 +74,94 @@ class SettingsManager:
             'azure_openai_deployment_name': 'gpt-35-turbo',
             'use_azure_openai': False
         }
-        self.settings = self.load_settings()
+        self._snapshot = self.load_settings()
+    
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """
+        The current parsed settings. This dict is shared and must not be modified; changes go
+        through set_setting() and friends, which save a new snapshot.
+        """
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reload_if_changed()
+        return self._snapshot
+    
+    @property
+    def version(self) -> int:
+        """Number of changes seen so far, including edits made to the file by other processes"""
+        self.settings
+        return self._version
+    
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.settings_file).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _reload_if_changed(self):
+        """Re-read the file if it was modified outside this manager"""
+        if self._file_mtime() == self._mtime:
+            return
+        with self.lock:
+            if self._file_mtime() == self._mtime:
+                return
+            self._publish(self.load_settings())
+    
+    def _publish(self, settings: Dict[str, Any]):
+        """Make settings the current snapshot, and notify subscribers if it differs from the last one"""
+        with self.lock:
+            if settings == self._snapshot:
+                return
+            self._snapshot = settings
+            self._version += 1
+            version = self._version
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener(version, settings)
+            except Exception as e:
+                print(f"Error notifying settings listener: {e}")
+    
+    def subscribe(self, listener: Callable[[int, Dict[str, Any]], None]):
+        """Call listener(version, settings) after every real change of the settings"""
+        with self.lock:
+            self.listeners.append(listener)
+    
+    def _editable_copy(self) -> Dict[str, Any]:
+        return copy.deepcopy(self.settings)
     
     def load_settings(self) -> Dict[str, Any]:
         """Load settings from file"""
         try:
-            if os.path.exists(self.settings_file):
+            self._mtime = self._file_mtime()
+            if self._mtime is not None:
                 with open(self.settings_file, 'r', encoding='utf-8') as f:
                     settings = json.load(f)
                     # Merge with default settings to ensure all keys exist
-                    merged_settings = self.default_settings.copy()
+                    merged_settings = copy.deepcopy(self.default_settings)
                     merged_settings.update(settings)
                     return merged_settings
             else:
-                return self.default_settings.copy()
+                return copy.deepcopy(self.default_settings)
         except Exception as e:
             print(f"Error loading settings: {e}")
-            return self.default_settings.copy()
+            return copy.deepcopy(self.default_settings)
     
-    def save_settings(self) -> bool:
-        """Save settings to file"""
+    def save_settings(self, settings: Optional[Dict[str, Any]] = None) -> bool:
+        """Save settings (the current snapshot if not given) to file and make them current"""
         try:
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(self.settings, f, indent=2)
+            with self.lock:
+                if settings is None:
+                    settings = self._snapshot
+                # Written aside and renamed, so a concurrent reload never sees a half-written file
+                temp_file = self.settings_file + '.tmp'
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(settings, f, indent=2)
+                os.replace(temp_file, self.settings_file)
+                self._mtime = self._file_mtime()
+                self._publish(settings)
             return True
         except Exception as e:
             print(f"Error saving settings: {e}")
@@ -88,21 +178,26 @@ class SettingsManager:
             else:
                 return default
         
+        # Sections are handed out as copies so callers cannot change the shared snapshot
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
         return value
     
     def set_setting(self, key: str, value: Any) -> bool:
         """Set a specific setting value"""
         try:
-            keys = key.split('.')
-            current = self.settings
-            
-            for k in keys[:-1]:
-                if k not in current:
-                    current[k] = {}
-                current = current[k]
-            
-            current[keys[-1]] = value
-            return self.save_settings()
+            with self.lock:
+                keys = key.split('.')
+                settings = self._editable_copy()
+                current = settings
+                
+                for k in keys[:-1]:
+                    if k not in current:
+                        current[k] = {}
+                    current = current[k]
+                
+                current[keys[-1]] = value
+                return self.save_settings(settings)
         except Exception as e:
             print(f"Error setting value: {e}")
             return False
@@ -110,25 +205,28 @@ class SettingsManager:
     def update_jira_credentials(self, jira_url: str, jira_email: str, jira_token: str) -> bool:
         """Update Jira credentials"""
         try:
-            self.settings['jira_url'] = jira_url
-            self.settings['jira_email'] = jira_email
-            self.settings['jira_token'] = jira_token
-            return self.save_settings()
+            with self.lock:
+                settings = self._editable_copy()
+                settings['jira_url'] = jira_url
+                settings['jira_email'] = jira_email
+                settings['jira_token'] = jira_token
+                return self.save_settings(settings)
         except Exception as e:
             print(f"Error updating Jira credentials: {e}")
             return False
     
     def get_jira_credentials(self) -> Dict[str, str]:
         """Get Jira credentials - prioritize environment variables over stored settings"""
+        settings = self.settings
         # First check environment variables
         env_url = os.getenv('JIRA_URL', '')
         env_email = os.getenv('JIRA_EMAIL', '')
         env_token = os.getenv('JIRA_API_TOKEN', '')
         
         # Use environment variables if available, otherwise fall back to stored settings
-        jira_url = env_url if env_url else self.settings.get('jira_url', '')
-        jira_email = env_email if env_email else self.settings.get('jira_email', '')
-        jira_token = env_token if env_token else self.settings.get('jira_token', '')
+        jira_url = env_url if env_url else settings.get('jira_url', '')
+        jira_email = env_email if env_email else settings.get('jira_email', '')
+        jira_token = env_token if env_token else settings.get('jira_token', '')
         
         return {
             'url': jira_url,
@@ -184,17 +282,20 @@ class SettingsManager:
     def update_openai_config(self, config: Dict[str, Any]) -> bool:
         """Update OpenAI configuration"""
         try:
-            if 'api_key' in config:
-                self.set_setting('openai_api_key', config['api_key'])
-            if 'azure_endpoint' in config:
-                self.set_setting('azure_openai_endpoint', config['azure_endpoint'])
-            if 'azure_api_version' in config:
-                self.set_setting('azure_openai_api_version', config['azure_api_version'])
-            if 'azure_deployment_name' in config:
-                self.set_setting('azure_openai_deployment_name', config['azure_deployment_name'])
-            if 'use_azure' in config:
-                self.set_setting('use_azure_openai', config['use_azure'])
-            return self.save_settings()
+            keys = {
+                'api_key': 'openai_api_key',
+                'azure_endpoint': 'azure_openai_endpoint',
+                'azure_api_version': 'azure_openai_api_version',
+                'azure_deployment_name': 'azure_openai_deployment_name',
+                'use_azure': 'use_azure_openai'
+            }
+            # One save, so subscribers see a single change
+            with self.lock:
+                settings = self._editable_copy()
+                for name, key in keys.items():
+                    if name in config:
+                        settings[key] = config[name]
+                return self.save_settings(settings)
         except Exception as e:
             print(f"Error updating OpenAI config: {e}")
             return False
@@ -273,8 +374,10 @@ class SettingsManager:
         try:
             imported_settings = json.loads(settings_json)
             # Merge with current settings
-            self.settings.update(imported_settings)
-            return self.save_settings()
+            with self.lock:
+                settings = self._editable_copy()
+                settings.update(imported_settings)
+                return self.save_settings(settings)
         except Exception as e:
             print(f"Error importing settings: {e}")
             return False
@@ -282,8 +385,7 @@ class SettingsManager:
     def reset_settings(self) -> bool:
         """Reset settings to default"""
         try:
-            self.settings = self.default_settings.copy()
-            return self.save_settings()
+            return self.save_settings(copy.deepcopy(self.default_settings))
         except Exception as e:
             print(f"Error resetting settings: {e}")
             return False
@@ -318,7 +420,7 @@ class SettingsManager:
     
     def get_all_settings(self) -> Dict[str, Any]:
         """Get all settings"""
-        return self.settings.copy()
+        return copy.deepcopy(self.settings)
     
     def backup_settings(self, backup_file: str = None) -> bool:
         """Create a backup of current settings"""
@@ -343,8 +445,7 @@ class SettingsManager:
                 with open(backup_file, 'r', encoding='utf-8') as f:
                     backup_settings = json.load(f)
                 
-                self.settings = backup_settings
-                return self.save_settings()
+                return self.save_settings(backup_settings)
             else:
                 print(f"Backup file not found: {backup_file}")
                 return False
@@ -0,0 +1,450 @@
+"""
+State Backend Module for JIRA TPM Application
+Pluggable key-value and list storage for task, cache and share-link state shared between processes
+"""
+
+import sqlite3
+import json
+import time
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+# Optional dependency - only needed for STATE_BACKEND=redis
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend(ABC):
+    """
+    Interface shared by all backends. Values are JSON-serializable; ttl is in seconds.
+    Lists are FIFO sequences addressed by their own keys.
+    """
+
+    # Whether state is visible to other processes
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Value stored under key, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value, optionally expiring after ttl seconds"""
+
+    @abstractmethod
+    def delete(self, *keys: str):
+        """Remove values or lists"""
+
+    @abstractmethod
+    def keys(self, prefix: str) -> List[str]:
+        """Keys of plain values starting with prefix (give lists their own prefixes)"""
+
+    @abstractmethod
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        """Atomically replace a value with fn(current value); fn returning None leaves it unchanged"""
+
+    @abstractmethod
+    def append(self, key: str, item: Any) -> int:
+        """Append an item to a list and return its 1-based position"""
+
+    @abstractmethod
+    def range(self, key: str, start: int = 0) -> List[Any]:
+        """Items of a list from 0-based position start onwards"""
+
+    @abstractmethod
+    def pop(self, key: str) -> Any:
+        """Atomically remove and return the first item of a list, or None if it is empty"""
+
+    @abstractmethod
+    def expire(self, key: str, ttl: float):
+        """Set a time to live on a value or list"""
+
+    def purge_expired(self) -> int:
+        """Drop expired entries; backends with native expiry do nothing"""
+        return 0
+
+
+class MemoryBackend(StateBackend):
+    """In-process state; the default for single-process deployments"""
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.lists: Dict[str, deque] = {}
+        self.expires: Dict[str, float] = {}
+        self.lock = threading.RLock()
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.values.pop(key, None)
+            self.lists.pop(key, None)
+            self.expires.pop(key, None)
+            return False
+        return True
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            if not self._alive(key) or key not in self.values:
+                return None
+            return json.loads(self.values[key])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self.lock:
+            # Stored serialized so callers never share mutable objects with the store
+            self.values[key] = json.dumps(value)
+            if ttl:
+                self.expires[key] = time.time() + ttl
+            else:
+                self.expires.pop(key, None)
+
+    def delete(self, *keys: str):
+        with self.lock:
+            for key in keys:
+                self.values.pop(key, None)
+                self.lists.pop(key, None)
+                self.expires.pop(key, None)
+
+    def keys(self, prefix: str) -> List[str]:
+        with self.lock:
+            return [key for key in list(self.values) if key.startswith(prefix) and self._alive(key)]
+
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        with self.lock:
+            value = fn(self.get(key))
+            if value is not None:
+                self.values[key] = json.dumps(value)
+                if ttl:
+                    self.expires[key] = time.time() + ttl
+            return value
+
+    def append(self, key: str, item: Any) -> int:
+        with self.lock:
+            self._alive(key)
+            items = self.lists.setdefault(key, deque())
+            items.append(json.dumps(item))
+            return len(items)
+
+    def range(self, key: str, start: int = 0) -> List[Any]:
+        with self.lock:
+            if not self._alive(key):
+                return []
+            return [json.loads(item) for item in list(self.lists.get(key, ()))[start:]]
+
+    def pop(self, key: str) -> Any:
+        with self.lock:
+            items = self.lists.get(key) if self._alive(key) else None
+            return json.loads(items.popleft()) if items else None
+
+    def expire(self, key: str, ttl: float):
+        with self.lock:
+            if key in self.values or key in self.lists:
+                self.expires[key] = time.time() + ttl
+
+    def purge_expired(self) -> int:
+        with self.lock:
+            expired = [key for key, expires_at in self.expires.items() if expires_at <= time.time()]
+            for key in expired:
+                self._alive(key)
+            return len(expired)
+
+
+class SQLiteBackend(StateBackend):
+    """State in a SQLite database in WAL mode, shared by all processes on one host"""
+
+    shared = True
+
+    def __init__(self, db_path: str = "state.db"):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def init_database(self):
+        """Initialize the SQLite database with the value and list tables"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        # WAL lets readers in other processes proceed while one process writes
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS list_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_list_items_key ON list_items(key, id)')
+        conn.close()
+        logger.info(f"State database initialized at {self.db_path}")
+
+    def _transaction(self, fn: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """Run fn inside a write transaction that excludes other processes"""
+        with self.lock:
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                result = fn(conn.cursor())
+                conn.execute('COMMIT')
+                return result
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            finally:
+                conn.close()
+
+    def _get(self, cursor: sqlite3.Cursor, key: str) -> Any:
+        row = cursor.execute('SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                             (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, key: str) -> Any:
+        conn = self._connect()
+        try:
+            return self._get(conn.cursor(), key)
+        finally:
+            conn.close()
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, json.dumps(value), time.time() + ttl if ttl else None))
+        conn.close()
+
+    def delete(self, *keys: str):
+        def run(cursor):
+            for key in keys:
+                cursor.execute('DELETE FROM kv WHERE key = ?', (key,))
+                cursor.execute('DELETE FROM list_items WHERE key = ?', (key,))
+        self._transaction(run)
+
+    def keys(self, prefix: str) -> List[str]:
+        conn = self._connect()
+        # Range scan on the primary key instead of LIKE, which would treat _ and % as wildcards
+        rows = conn.execute('''
+            SELECT key FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)
+        ''', (prefix, prefix + '\uffff', time.time())).fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        def run(cursor):
+            value = fn(self._get(cursor, key))
+            if value is not None:
+                if ttl:
+                    cursor.execute('INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                                   (key, json.dumps(value), time.time() + ttl))
+                else:
+                    # Keep any expiry set earlier
+                    cursor.execute('''
+                        INSERT INTO kv (key, value) VALUES (?, ?)
+                        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                    ''', (key, json.dumps(value)))
+            return value
+        return self._transaction(run)
+
+    def append(self, key: str, item: Any) -> int:
+        def run(cursor):
+            cursor.execute('INSERT INTO list_items (key, value) VALUES (?, ?)', (key, json.dumps(item)))
+            return cursor.execute('''
+                SELECT COUNT(*) FROM list_items WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)
+            ''', (key, time.time())).fetchone()[0]
+        return self._transaction(run)
+
+    def range(self, key: str, start: int = 0) -> List[Any]:
+        conn = self._connect()
+        rows = conn.execute('''
+            SELECT value FROM list_items WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)
+            ORDER BY id LIMIT -1 OFFSET ?
+        ''', (key, time.time(), start)).fetchall()
+        conn.close()
+        return [json.loads(row[0]) for row in rows]
+
+    def pop(self, key: str) -> Any:
+        def run(cursor):
+            row = cursor.execute('''
+                SELECT id, value FROM list_items WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)
+                ORDER BY id LIMIT 1
+            ''', (key, time.time())).fetchone()
+            if not row:
+                return None
+            cursor.execute('DELETE FROM list_items WHERE id = ?', (row[0],))
+            return json.loads(row[1])
+        return self._transaction(run)
+
+    def expire(self, key: str, ttl: float):
+        expires_at = time.time() + ttl
+
+        def run(cursor):
+            cursor.execute('UPDATE kv SET expires_at = ? WHERE key = ?', (expires_at, key))
+            cursor.execute('UPDATE list_items SET expires_at = ? WHERE key = ?', (expires_at, key))
+        self._transaction(run)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+
+        def run(cursor):
+            cursor.execute('DELETE FROM kv WHERE expires_at <= ?', (now,))
+            purged = cursor.rowcount
+            cursor.execute('DELETE FROM list_items WHERE expires_at <= ?', (now,))
+            return purged + cursor.rowcount
+        return self._transaction(run)
+
+
+class RedisBackend(StateBackend):
+    """State in any server speaking the Redis protocol, shared by processes on several hosts"""
+
+    shared = True
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "jira_tpm:"):
+        if redis is None:
+            raise RuntimeError("STATE_BACKEND=redis requires the redis package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        logger.info(f"Using Redis state backend at {url}")
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str) -> Any:
+        value = self.client.get(self._key(key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.client.set(self._key(key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*[self._key(key) for key in keys])
+
+    def keys(self, prefix: str) -> List[str]:
+        start = len(self.prefix)
+        return [key.decode()[start:] for key in self.client.scan_iter(match=self._key(prefix) + '*')]
+
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        full_key = self._key(key)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # Optimistic transaction: retried if another client changes the key meanwhile
+                    pipe.watch(full_key)
+                    current = pipe.get(full_key)
+                    value = fn(json.loads(current) if current is not None else None)
+                    if value is None:
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    if ttl:
+                        pipe.set(full_key, json.dumps(value), px=int(ttl * 1000))
+                    else:
+                        pipe.set(full_key, json.dumps(value), keepttl=True)
+                    pipe.execute()
+                    return value
+                except redis.WatchError:
+                    continue
+
+    def append(self, key: str, item: Any) -> int:
+        return self.client.rpush(self._key(key), json.dumps(item))
+
+    def range(self, key: str, start: int = 0) -> List[Any]:
+        return [json.loads(item) for item in self.client.lrange(self._key(key), start, -1)]
+
+    def pop(self, key: str) -> Any:
+        value = self.client.lpop(self._key(key))
+        return json.loads(value) if value is not None else None
+
+    def expire(self, key: str, ttl: float):
+        self.client.pexpire(self._key(key), int(ttl * 1000))
+
+
+class NamespacedBackend(StateBackend):
+    """Another backend's keys under a prefix, so several tenants can keep the same keys apart"""
+
+    def __init__(self, backend: StateBackend, prefix: str):
+        self.backend = backend
+        self.prefix = prefix
+        self.shared = backend.shared
+
+    def get(self, key: str) -> Any:
+        return self.backend.get(self.prefix + key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.backend.set(self.prefix + key, value, ttl)
+
+    def delete(self, *keys: str):
+        self.backend.delete(*[self.prefix + key for key in keys])
+
+    def keys(self, prefix: str) -> List[str]:
+        start = len(self.prefix)
+        return [key[start:] for key in self.backend.keys(self.prefix + prefix)]
+
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        return self.backend.update(self.prefix + key, fn, ttl)
+
+    def append(self, key: str, item: Any) -> int:
+        return self.backend.append(self.prefix + key, item)
+
+    def range(self, key: str, start: int = 0) -> List[Any]:
+        return self.backend.range(self.prefix + key, start)
+
+    def pop(self, key: str) -> Any:
+        return self.backend.pop(self.prefix + key)
+
+    def expire(self, key: str, ttl: float):
+        self.backend.expire(self.prefix + key, ttl)
+
+    def purge_expired(self) -> int:
+        return self.backend.purge_expired()
+
+
+def namespaced(backend: StateBackend, prefix: str) -> StateBackend:
+    """The backend itself for an empty prefix, else a view of it under the prefix"""
+    return NamespacedBackend(backend, prefix) if prefix else backend
+
+
+def create_backend(name: str = None) -> StateBackend:
+    """Create the backend selected by STATE_BACKEND (memory, sqlite or redis)"""
+    name = (name or os.getenv('STATE_BACKEND', 'memory')).lower()
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(os.getenv('STATE_SQLITE_PATH', 'state.db'))
+    if name == 'redis':
+        return RedisBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+                            os.getenv('REDIS_KEY_PREFIX', 'jira_tpm:'))
+    raise ValueError(f"Unknown STATE_BACKEND '{name}' (expected memory, sqlite or redis)")
+
+
+_durable_backends: Dict[str, StateBackend] = {}
+
+
+def durable_backend(db_path: str) -> StateBackend:
+    """
+    Backend for state that must survive restarts: the configured backend if it is shared,
+    otherwise a local SQLite file (one instance per path)
+    """
+    if state_backend.shared:
+        return state_backend
+    if db_path not in _durable_backends:
+        _durable_backends[db_path] = SQLiteBackend(db_path)
+    return _durable_backends[db_path]
+
+
+# Global state backend instance
+state_backend = create_backend()
@@ -0,0 +1,392 @@
+"""
+Background Task Queue Module for JIRA TPM Application
+Runs long-running analysis jobs on a bounded worker pool backed by a persistent, shareable queue
+"""
+
+import uuid
+import time
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cancellation import CancelToken, TaskCancelled, task_context, CANCELLED
+from state_backend import StateBackend, durable_backend
+
+logger = logging.getLogger(__name__)
+
+# Queue lifecycle states (independent of the per-kind 'status' stored in the task state)
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+
+# Backend keys: task records, per-task event lists, the pending queue and worker heartbeats
+TASK_PREFIX = 'task:'
+EVENTS_PREFIX = 'task_events:'
+PENDING_QUEUE = 'task_queue:pending'
+WORKER_PREFIX = 'task_worker:'
+
+HEARTBEAT_INTERVAL = 30
+
+
+class TaskQueue:
+    def __init__(self, backend: StateBackend, num_workers: int = 4, result_ttl: int = 3600):
+        """Initialize the task queue on a state backend with a fixed-size worker pool"""
+        self.backend = backend
+        self.num_workers = num_workers
+        self.result_ttl = result_ttl
+        self.handlers: Dict[str, Callable] = {}
+        self.deadlines: Dict[str, Optional[int]] = {}
+        self.tokens: Dict[str, CancelToken] = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition()
+        self.events_changed = threading.Condition()
+        self.workers = []
+        self.started = False
+        # Identifies this process so tasks orphaned by a dead process can be re-queued
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def register(self, kind: str, handler: Callable, deadline: Optional[int] = None):
+        """Register the function that processes tasks of the given kind, with a default run-time budget in seconds"""
+        self.handlers[kind] = handler
+        self.deadlines[kind] = deadline
+
+    def start(self):
+        """Start the worker pool and the janitor thread, re-queueing tasks interrupted by a restart"""
+        if self.started:
+            return
+        self.started = True
+
+        self._heartbeat()
+        self.requeue_orphans()
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"task-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        janitor = threading.Thread(target=self._janitor_loop, name="task-janitor", daemon=True)
+        janitor.start()
+        logger.info(f"Task queue started with {self.num_workers} workers ({self.worker_id})")
+
+    def submit(self, kind: str, args: Tuple = (), initial_state: Dict = None, deadline: Optional[int] = None) -> str:
+        """Queue a task and return its ID immediately. The deadline (seconds of run time) defaults to the kind's"""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for task kind '{kind}'")
+
+        task_id = str(uuid.uuid4())
+        state = dict(initial_state or {})
+        self.backend.set(TASK_PREFIX + task_id, {
+            'task_id': task_id,
+            'kind': kind,
+            'args': list(args),
+            'state': state,
+            'queue_status': QUEUED,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'deadline_seconds': deadline or self.deadlines.get(kind),
+            'cancel_requested': False,
+            'worker': None
+        })
+        self._publish(task_id, 'queued', state)
+        self.backend.append(PENDING_QUEUE, task_id)
+
+        with self.wakeup:
+            self.wakeup.notify()
+
+        logger.info(f"Queued {kind} task {task_id}")
+        return task_id
+
+    def _load(self, task_id: str) -> Optional[Dict]:
+        return self.backend.get(TASK_PREFIX + task_id)
+
+    def get(self, task_id: str, kind: str = None) -> Optional[Dict]:
+        """Get a copy of a task's state, or None if unknown (or of a different kind)"""
+        record = self._load(task_id)
+        if not record or (kind and record['kind'] != kind):
+            return None
+        return record['state']
+
+    def get_timing(self, task_id: str) -> Optional[Dict]:
+        """Get queue timing information for a task"""
+        record = self._load(task_id)
+        if not record:
+            return None
+        return self._timing(record)
+
+    def _timing(self, record: Dict) -> Dict:
+        created_at = record['created_at']
+        started_at = record['started_at']
+        finished_at = record['finished_at']
+        wait_end = started_at or time.time()
+        run_end = finished_at or time.time()
+        return {
+            'kind': record['kind'],
+            'queue_status': record['queue_status'],
+            'queued_at': datetime.fromtimestamp(created_at).isoformat(),
+            'started_at': datetime.fromtimestamp(started_at).isoformat() if started_at else None,
+            'finished_at': datetime.fromtimestamp(finished_at).isoformat() if finished_at else None,
+            'wait_seconds': round(wait_end - created_at, 3),
+            'run_seconds': round(run_end - started_at, 3) if started_at else None
+        }
+
+    def update(self, task_id: str, **fields):
+        """Update fields of a task's state and persist them"""
+        def apply(record):
+            if not record:
+                return None
+            record['state'].update(fields)
+            return record
+
+        record = self.backend.update(TASK_PREFIX + task_id, apply)
+        if not record:
+            logger.warning(f"Ignoring update for unknown task {task_id}")
+            return
+        event_type = 'partial' if 'result' in fields and record['state'].get('result') else 'progress'
+        self._publish(task_id, event_type, record['state'])
+
+    def _publish(self, task_id: str, event_type: str, state: Dict):
+        """Append an event carrying the task's current state and wake up subscribers"""
+        self.backend.append(EVENTS_PREFIX + task_id, {'event': event_type, 'data': state})
+        with self.events_changed:
+            self.events_changed.notify_all()
+
+    def get_events(self, task_id: str, after_id: int = 0) -> List[Tuple[int, str, Dict]]:
+        """Get (event_id, event_type, data) tuples for a task that are newer than after_id"""
+        # The 1-based position in the task's event list doubles as the SSE event id
+        events = self.backend.range(EVENTS_PREFIX + task_id, after_id)
+        return [(after_id + i + 1, event['event'], event['data']) for i, event in enumerate(events)]
+
+    def wait_for_events(self, task_id: str, after_id: int = 0, timeout: float = 15.0) -> List[Tuple[int, str, Dict]]:
+        """Block until events newer than after_id exist for the task or the timeout expires"""
+        deadline = time.time() + timeout
+        while True:
+            events = self.get_events(task_id, after_id)
+            remaining = deadline - time.time()
+            if events or remaining <= 0:
+                return events
+            # Re-check the log at least once a second so events written by other processes are seen too
+            with self.events_changed:
+                self.events_changed.wait(timeout=min(remaining, 1.0))
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        Request cancellation of a task. Queued tasks are finished immediately;
+        running tasks stop at their next cancellation point and keep any partial result.
+        Returns False if the task is unknown or already finished.
+        """
+        def apply(record):
+            if not record or record['queue_status'] == FINISHED:
+                return None
+            record['cancel_requested'] = True
+            if record['queue_status'] == QUEUED:
+                # Never started, so there is nothing to wait for; workers skip it when popped
+                record['queue_status'] = FINISHED
+                record['finished_at'] = time.time()
+                record['state']['status'] = CANCELLED
+            return record
+
+        record = self.backend.update(TASK_PREFIX + task_id, apply)
+        if not record:
+            return False
+
+        if record['queue_status'] == FINISHED:
+            self._publish(task_id, 'complete', record['state'])
+            self._expire(task_id)
+        else:
+            with self.lock:
+                token = self.tokens.get(task_id)
+            if token:
+                token.cancel()
+
+        logger.info(f"Cancellation requested for task {task_id}")
+        return True
+
+    def _cancel_requested(self, task_id: str) -> bool:
+        record = self._load(task_id)
+        return bool(record and record.get('cancel_requested'))
+
+    def _claim_next(self) -> Optional[Tuple[str, str, list, Optional[float]]]:
+        """Pop the oldest pending task and atomically move it to the running state"""
+        while True:
+            task_id = self.backend.pop(PENDING_QUEUE)
+            if task_id is None:
+                return None
+
+            def apply(record):
+                # Cancelled (or already claimed after a re-queue race) tasks are skipped
+                if not record or record['queue_status'] != QUEUED:
+                    return None
+                record['queue_status'] = RUNNING
+                record['started_at'] = time.time()
+                record['worker'] = self.worker_id
+                return record
+
+            record = self.backend.update(TASK_PREFIX + task_id, apply)
+            if record:
+                deadline = record['deadline_seconds']
+                return task_id, record['kind'], record['args'], record['started_at'] + deadline if deadline else None
+
+    def _finish(self, task_id: str):
+        def apply(record):
+            if not record:
+                return None
+            record['queue_status'] = FINISHED
+            record['finished_at'] = time.time()
+            return record
+
+        record = self.backend.update(TASK_PREFIX + task_id, apply)
+        if record:
+            self._publish(task_id, 'complete', record['state'])
+            self._expire(task_id)
+
+    def _expire(self, task_id: str):
+        """Keep a finished task's result and events for the result TTL"""
+        self.backend.expire(TASK_PREFIX + task_id, self.result_ttl)
+        self.backend.expire(EVENTS_PREFIX + task_id, self.result_ttl)
+
+    def _worker_loop(self):
+        while True:
+            try:
+                claimed = self._claim_next()
+            except Exception as e:
+                logger.error(f"Error claiming task: {str(e)}")
+                claimed = None
+
+            if not claimed:
+                with self.wakeup:
+                    self.wakeup.wait(timeout=1.0)
+                continue
+
+            task_id, kind, args, deadline = claimed
+            handler = self.handlers.get(kind)
+            # The stored flag lets a cancel issued through another process reach this worker
+            token = CancelToken(deadline=deadline, poll=lambda: self._cancel_requested(task_id))
+            with self.lock:
+                self.tokens[task_id] = token
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler registered for task kind '{kind}'")
+                with task_context(token):
+                    handler(task_id, *args)
+            except TaskCancelled as e:
+                # Handlers normally record their own partial result; this covers those that don't
+                logger.info(f"{kind} task {task_id} stopped: {e.reason}")
+                self.update(task_id, status=CANCELLED if e.reason == CANCELLED else 'partial', partial=True)
+            except Exception as e:
+                logger.error(f"Error running {kind} task {task_id}: {str(e)}")
+                logger.error(f"Traceback: {traceback.format_exc()}")
+                self.update(task_id, status='error', error=str(e))
+            finally:
+                with self.lock:
+                    self.tokens.pop(task_id, None)
+                self._finish(task_id)
+                timing = self.get_timing(task_id)
+                if timing:
+                    logger.info(f"Finished {kind} task {task_id} "
+                                f"(waited {timing['wait_seconds']}s, ran {timing['run_seconds']}s)")
+
+    def _heartbeat(self):
+        """Mark this process as alive; a process missing three heartbeats is considered dead"""
+        self.backend.set(WORKER_PREFIX + self.worker_id, {'at': time.time()}, ttl=HEARTBEAT_INTERVAL * 3)
+
+    def requeue_orphans(self) -> int:
+        """
+        Re-queue running tasks whose process has died (or restarted), and queued tasks missing from
+        the pending list because a process died between popping and claiming them
+        """
+        alive = {key[len(WORKER_PREFIX):] for key in self.backend.keys(WORKER_PREFIX)}
+        pending = set(self.backend.range(PENDING_QUEUE))
+        requeued = 0
+        for key in self.backend.keys(TASK_PREFIX):
+            def apply(record):
+                if not record or record['queue_status'] != RUNNING or record.get('worker') in alive:
+                    return None
+                record['queue_status'] = QUEUED
+                record['started_at'] = None
+                record['worker'] = None
+                return record
+
+            record = self.backend.update(key, apply)
+            if record:
+                self.backend.append(PENDING_QUEUE, record['task_id'])
+                requeued += 1
+                continue
+
+            # Tasks submitted just now may not be appended yet, so only older ones count as lost.
+            # A duplicate entry is harmless: claiming skips tasks that are no longer queued.
+            record = self.backend.get(key)
+            if (record and record['queue_status'] == QUEUED and record['task_id'] not in pending
+                    and time.time() - record['created_at'] > HEARTBEAT_INTERVAL):
+                self.backend.append(PENDING_QUEUE, record['task_id'])
+                requeued += 1
+
+        if requeued:
+            logger.info(f"Re-queued {requeued} tasks interrupted by a restart or a lost claim")
+            with self.wakeup:
+                self.wakeup.notify_all()
+        return requeued
+
+    def _janitor_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self._heartbeat()
+                self.requeue_orphans()
+                self.evict_expired()
+            except Exception as e:
+                logger.error(f"Error in task queue janitor: {str(e)}")
+
+    def evict_expired(self):
+        """Drop finished tasks whose results are older than the TTL"""
+        evicted = self.backend.purge_expired()
+        if evicted:
+            logger.info(f"Evicted {evicted} expired task entries")
+
+    def stats(self) -> Dict:
+        """Get queue depth and timing statistics"""
+        counts = {QUEUED: 0, RUNNING: 0, FINISHED: 0}
+        by_kind: Dict[str, Dict] = {}
+        oldest_queued = None
+
+        for key in self.backend.keys(TASK_PREFIX):
+            record = self.backend.get(key)
+            if not record:
+                continue
+            status = record['queue_status']
+            counts[status] = counts.get(status, 0) + 1
+            if status == QUEUED:
+                oldest_queued = min(oldest_queued or record['created_at'], record['created_at'])
+            elif status == FINISHED and record['started_at']:
+                kind = by_kind.setdefault(record['kind'], {'finished': 0, 'wait': 0.0, 'run': 0.0})
+                kind['finished'] += 1
+                kind['wait'] += record['started_at'] - record['created_at']
+                kind['run'] += record['finished_at'] - record['started_at']
+
+        return {
+            'workers': self.num_workers,
+            'worker_id': self.worker_id,
+            'queue_depth': counts[QUEUED],
+            'running': counts[RUNNING],
+            'finished': counts[FINISHED],
+            'oldest_queued_seconds': round(time.time() - oldest_queued, 3) if oldest_queued else 0,
+            'result_ttl_seconds': self.result_ttl,
+            'by_kind': {name: {
+                'finished': kind['finished'],
+                'avg_wait_seconds': round(kind['wait'] / kind['finished'], 3),
+                'avg_run_seconds': round(kind['run'] / kind['finished'], 3)
+            } for name, kind in by_kind.items()}
+        }
+
+
+# Global task queue instance. Tasks must survive restarts, so when the configured state
+# backend is in-process the queue keeps its own SQLite database instead.
+task_queue = TaskQueue(
+    backend=durable_backend(os.getenv('TASK_QUEUE_DB', 'task_queue.db')),
+    num_workers=int(os.getenv('TASK_WORKERS', 4)),
+    result_ttl=int(os.getenv('TASK_RESULT_TTL', 3600))
+)
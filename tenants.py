@@ -0,0 +1,298 @@
+"""
+Tenants Module for JIRA TPM Application
+Several Jira sites served by one process, each with its own credentials, connection pool, rate budget and caches
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from cancellation import check_cancelled
+from jira_client import jira_clients, has_credentials
+from jira_scheduler import jira_scheduler
+from settings_manager import settings_manager
+
+logger = logging.getLogger(__name__)
+
+# The site configured in Settings (or the JIRA_* environment variables); requests without a tenant use it
+DEFAULT_TENANT = 'default'
+TENANT_HEADER = 'X-Jira-Tenant'
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Memory each tenant's cache may hold before its own oldest entries are evicted
+DEFAULT_CACHE_QUOTA_MB = float(os.getenv('TENANT_CACHE_QUOTA_MB', 64))
+
+
+class UnknownTenant(Exception):
+    def __init__(self, tenant_id: str):
+        super().__init__(f"Unknown Jira tenant '{tenant_id}'")
+        self.tenant_id = tenant_id
+
+
+class RateBudget:
+    """Token bucket allowing rate requests per second on average, in bursts of up to burst"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = 0.0
+        self.granted = 0
+
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.granted += 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited += wait
+            # Cancellation point: a cancelled task stops waiting for this tenant's budget
+            check_cancelled()
+            time.sleep(wait)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'requests_per_second': self.rate, 'burst': self.burst, 'granted': self.granted,
+                    'waited_seconds': round(self.waited, 3)}
+
+
+def _size_of(value: Any) -> int:
+    """Approximate memory held by a cached value: the length of its JSON encoding"""
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class TenantCache:
+    """One tenant's cached values, least recently used first, bounded by an approximate memory quota"""
+
+    def __init__(self, quota_bytes: int):
+        self.quota_bytes = quota_bytes
+        self.entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (value, size, expires_at)
+        self.used_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] <= time.time()):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Cache a value, evicting this tenant's oldest entries to stay within the quota"""
+        size = _size_of(value)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if size > self.quota_bytes:
+                return
+            self.entries[key] = (value, size, time.time() + ttl if ttl else None)
+            self.used_bytes += size
+            while self.used_bytes > self.quota_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        self.used_bytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used_bytes = 0
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'entries': len(self.entries), 'used_bytes': self.used_bytes, 'quota_bytes': self.quota_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class Tenant:
+    def __init__(self, tenant_id: str, credentials: Optional[Dict[str, str]] = None,
+                 requests_per_second: Optional[float] = None, burst: Optional[float] = None,
+                 cache_quota_mb: float = DEFAULT_CACHE_QUOTA_MB):
+        """credentials are url/email/api_token; the default tenant uses the configured settings instead"""
+        self.id = tenant_id
+        self.credentials = credentials
+        self.budget = RateBudget(requests_per_second, burst) if requests_per_second else None
+        self.cache = TenantCache(int(cache_quota_mb * 1024 * 1024))
+
+    @property
+    def is_default(self) -> bool:
+        return self.id == DEFAULT_TENANT
+
+    @property
+    def prefix(self) -> str:
+        """Prefix of this tenant's keys in shared stores; empty for the default tenant, which keeps the old keys"""
+        return '' if self.is_default else f"tenant:{self.id}:"
+
+    def scoped(self, name: str) -> str:
+        """A name (scheduler flow, file suffix) that is unique to this tenant"""
+        return name if self.is_default else f"{self.id}:{name}"
+
+    def jira_credentials(self) -> Optional[Dict[str, str]]:
+        credentials = self.credentials if not self.is_default else settings_manager.get_jira_credentials()
+        return credentials if has_credentials(credentials) else None
+
+    def client(self):
+        """The Jira client (auth, headers and connection pool) for this tenant"""
+        if self.is_default:
+            return jira_clients.current()
+        return jira_clients.client(self.credentials)
+
+    def stats(self) -> Dict:
+        credentials = self.jira_credentials()
+        return {
+            'tenant': self.id,
+            'url': credentials['url'] if credentials else None,
+            'configured': credentials is not None,
+            'rate_budget': self.budget.stats() if self.budget else None,
+            'cache': self.cache.stats()
+        }
+
+
+class TenantRegistry:
+    def __init__(self, path: Optional[str] = None, default_settings: Optional[Dict] = None):
+        """
+        path: JSON file mapping tenant ids to {url, email, api_token, requests_per_second, burst,
+        cache_quota_mb}. An entry named 'default' only sets the limits of the default tenant.
+        """
+        self.path = path
+        self.tenants: Dict[str, Tenant] = {}
+        self.load(default_settings or {})
+
+    def load(self, default_settings: Dict):
+        config = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading tenants from {self.path}: {str(e)}")
+        defaults = {**default_settings, **config.pop(DEFAULT_TENANT, {})}
+        tenants = {DEFAULT_TENANT: Tenant(
+            DEFAULT_TENANT,
+            requests_per_second=defaults.get('requests_per_second'),
+            burst=defaults.get('burst'),
+            cache_quota_mb=defaults.get('cache_quota_mb', DEFAULT_CACHE_QUOTA_MB)
+        )}
+        for tenant_id, entry in config.items():
+            if not TENANT_ID_PATTERN.match(tenant_id):
+                logger.error(f"Ignoring tenant with invalid id '{tenant_id}'")
+                continue
+            credentials = {'url': entry.get('url', ''), 'email': entry.get('email', ''),
+                           'api_token': entry.get('api_token', '')}
+            if not has_credentials(credentials):
+                logger.error(f"Ignoring tenant '{tenant_id}' without url, email and api_token")
+                continue
+            tenants[tenant_id] = Tenant(
+                tenant_id,
+                credentials,
+                requests_per_second=entry.get('requests_per_second'),
+                burst=entry.get('burst'),
+                cache_quota_mb=entry.get('cache_quota_mb', DEFAULT_CACHE_QUOTA_MB)
+            )
+        self.tenants = tenants
+        if len(tenants) > 1:
+            logger.info(f"Serving {len(tenants)} Jira tenants: {', '.join(sorted(tenants))}")
+
+    def get(self, tenant_id: Optional[str]) -> Tenant:
+        tenant = self.tenants.get(tenant_id or DEFAULT_TENANT)
+        if tenant is None:
+            raise UnknownTenant(tenant_id)
+        return tenant
+
+    def all(self) -> List[Tenant]:
+        return list(self.tenants.values())
+
+    def stats(self) -> List[Dict]:
+        return [tenant.stats() for tenant in self.all()]
+
+
+class TenantLocal:
+    """One instance of a component per tenant, built on first use; attributes resolve on the current tenant's"""
+
+    def __init__(self, factory: Callable[[Tenant], Any]):
+        self._factory = factory
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def for_tenant(self, tenant: Tenant) -> Any:
+        instance = self._instances.get(tenant.id)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(tenant.id)
+                if instance is None:
+                    instance = self._instances[tenant.id] = self._factory(tenant)
+        return instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.for_tenant(current_tenant()), name)
+
+
+_context = threading.local()
+
+
+def bind_tenant(fn: Callable, tenant: Tenant) -> Callable:
+    """Wrap fn so it always runs for the given tenant, including on pool threads"""
+    def run(*args, **kwargs):
+        with use_tenant(tenant.id):
+            return fn(*args, **kwargs)
+    return run
+
+
+def current_tenant() -> Tenant:
+    """The tenant the current thread is working for (the default tenant outside any request or task)"""
+    return getattr(_context, 'tenant', None) or tenants.get(DEFAULT_TENANT)
+
+
+def set_tenant(tenant_id: Optional[str]) -> Tenant:
+    """Bind the current thread to a tenant; raises UnknownTenant"""
+    tenant = tenants.get(tenant_id)
+    _context.tenant = tenant
+    return tenant
+
+
+def clear_tenant():
+    _context.tenant = None
+
+
+@contextmanager
+def use_tenant(tenant_id: Optional[str]):
+    """Run a block on behalf of a tenant"""
+    previous = getattr(_context, 'tenant', None)
+    try:
+        yield set_tenant(tenant_id)
+    finally:
+        _context.tenant = previous
+
+
+# Global tenant registry
+tenants = TenantRegistry(
+    os.getenv('JIRA_TENANTS_FILE', 'jira_tenants.json'),
+    default_settings={'requests_per_second': float(os.getenv('JIRA_REQUESTS_PER_SECOND', 0)) or None}
+)
+
+# Every Jira slot first waits on the rate budget of the tenant the caller works for
+jira_scheduler.bind_budget(lambda: current_tenant().budget)
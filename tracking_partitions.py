@@ -0,0 +1,219 @@
+"""
+Tracking Partitions Module for JIRA TPM Application
+Monthly tables for sessions, page views and events behind views of the original table names
+"""
+
+import re
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Logical table -> (partitioning timestamp column, column definitions, indexed columns)
+PARTITIONED_TABLES = {
+    'sessions': ('start_time', '''
+        id INTEGER PRIMARY KEY,
+        session_id TEXT UNIQUE NOT NULL,
+        user_id TEXT NOT NULL,
+        ip_address TEXT NOT NULL,
+        user_agent TEXT,
+        start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        end_time TIMESTAMP,
+        duration_seconds INTEGER,
+        page_views INTEGER DEFAULT 0
+    ''', ('user_id',)),
+    'page_views': ('timestamp', '''
+        id INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        page_path TEXT NOT NULL,
+        page_title TEXT,
+        referrer TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        load_time_ms INTEGER,
+        weight REAL DEFAULT 1
+    ''', ('session_id', 'user_id')),
+    'events': ('timestamp', '''
+        id INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        event_data TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        weight REAL DEFAULT 1
+    ''', ('session_id', 'event_type'))
+}
+
+# Calendar months whose partitions still take writes: the current month and the one before, for sessions
+# spanning the turn of the month and batches written just after midnight. Older partitions get read-only
+# triggers, however many months in between have no partition.
+WRITABLE_MONTHS = 2
+
+PARTITION_PATTERN = re.compile(r'^(\w+)_(\d{4})_(\d{2})$')
+
+# Timestamps that can be routed by their month; anything else goes to the current month
+DATED = "GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*'"
+
+
+def month_of(timestamp: Optional[str]) -> str:
+    """'YYYY_MM' of a 'YYYY-MM-DD HH:MM:SS' timestamp; rows without one belong to the current month"""
+    if not timestamp:
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d')
+    return str(timestamp)[:7].replace('-', '_')
+
+
+def first_writable_month(now: Optional[datetime] = None) -> str:
+    """'YYYY_MM' of the oldest calendar month whose partitions still take writes"""
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - (WRITABLE_MONTHS - 1)
+    return f"{index // 12:04d}_{index % 12 + 1:02d}"
+
+
+def _definitions(definitions: str) -> List[str]:
+    return [line.strip().rstrip(',') for line in definitions.strip().splitlines() if line.strip()]
+
+
+def _columns(definitions: str) -> List[str]:
+    return [definition.split()[0] for definition in _definitions(definitions)]
+
+
+class TrackingPartitions:
+    def __init__(self):
+        # Logical table -> known partition months, oldest first; loaded by setup()
+        self.months: Dict[str, List[str]] = {table: [] for table in PARTITIONED_TABLES}
+        self.sealed: Set[str] = set()
+
+    def name(self, table: str, month: str) -> str:
+        return f"{table}_{month}"
+
+    def setup(self, cursor: sqlite3.Cursor):
+        """Load existing partitions, move rows out of pre-partitioning tables and create this month's partitions"""
+        for table in PARTITIONED_TABLES:
+            self.months[table] = []
+        for (name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            match = PARTITION_PATTERN.match(name)
+            if match and match.group(1) in PARTITIONED_TABLES:
+                self.months[match.group(1)].append(f"{match.group(2)}_{match.group(3)}")
+        self.sealed = {row[0][:-len('_read_only_insert')] for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_read_only_insert'")}
+        for table in PARTITIONED_TABLES:
+            self.months[table].sort()
+            for month in self.months[table]:
+                self._add_columns(cursor, table, self.name(table, month))
+            self._migrate(cursor, table)
+            self.ensure(cursor, table, month_of(None), refresh=False)
+            self.seal(cursor, table)
+            self.refresh_view(cursor, table)
+
+    def _add_columns(self, cursor: sqlite3.Cursor, table: str, partition: str):
+        """Add columns introduced after a partition was created, so every partition has the view's columns"""
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({partition})")}
+        for definition in _definitions(PARTITIONED_TABLES[table][1]):
+            if definition.split()[0] not in existing:
+                cursor.execute(f"ALTER TABLE {partition} ADD COLUMN {definition}")
+
+    def _migrate(self, cursor: sqlite3.Cursor, table: str):
+        """Split an unpartitioned table from an older version into monthly partitions, once"""
+        kind = cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+        if not kind or kind[0] != 'table':
+            return
+        column, definitions, _ = PARTITIONED_TABLES[table]
+        legacy = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        columns = ', '.join(name for name in _columns(definitions)[1:] if name in legacy)
+        months = [row[0] for row in cursor.execute(
+            f"SELECT DISTINCT substr({column}, 1, 7) FROM {table} WHERE {column} {DATED}")]
+        for month in months:
+            partition = self.ensure(cursor, table, month_of(month), refresh=False)
+            cursor.execute(f'''
+                INSERT INTO {partition} ({columns})
+                SELECT {columns} FROM {table} WHERE {column} {DATED} AND substr({column}, 1, 7) = ?
+            ''', (month,))
+        partition = self.ensure(cursor, table, month_of(None), refresh=False)
+        cursor.execute(f'''
+            INSERT INTO {partition} ({columns})
+            SELECT {columns} FROM {table} WHERE {column} IS NULL OR NOT {column} {DATED}
+        ''')
+        cursor.execute(f"DROP TABLE {table}")
+        logger.info(f"Moved {table} into {len(months)} monthly partitions")
+
+    def ensure(self, cursor: sqlite3.Cursor, table: str, month: str, refresh: bool = True) -> str:
+        """Name of the partition for a month, creating it (and rebuilding the view) the first time"""
+        partition = self.name(table, month)
+        if month in self.months[table]:
+            return partition
+        _, definitions, indexed = PARTITIONED_TABLES[table]
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {partition} ({definitions})")
+        for column in indexed:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{partition}_{column} ON {partition}({column})")
+        self.months[table] = sorted(self.months[table] + [month])
+        if refresh:
+            self.seal(cursor, table)
+            self.refresh_view(cursor, table)
+        return partition
+
+    def seal(self, cursor: sqlite3.Cursor, table: str):
+        """Make every partition older than the previous calendar month read-only"""
+        oldest_writable = first_writable_month()
+        for month in self.months[table]:
+            if month >= oldest_writable:
+                break
+            partition = self.name(table, month)
+            if partition in self.sealed:
+                continue
+            for operation in ('insert', 'update'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {partition}_read_only_{operation}
+                    BEFORE {operation.upper()} ON {partition}
+                    BEGIN SELECT RAISE(ABORT, 'historical tracking partition is read-only'); END
+                ''')
+            self.sealed.add(partition)
+
+    def refresh_view(self, cursor: sqlite3.Cursor, table: str):
+        """Point the view named after the logical table at every partition"""
+        cursor.execute(f"DROP VIEW IF EXISTS {table}")
+        if self.months[table]:
+            union = ' UNION ALL '.join(f"SELECT * FROM {self.name(table, month)}" for month in self.months[table])
+            cursor.execute(f"CREATE VIEW {table} AS {union}")
+
+    def writable(self, table: str) -> List[str]:
+        """Partitions updates by key (such as a session id) are applied to, newest first"""
+        oldest_writable = first_writable_month()
+        return [self.name(table, month) for month in reversed(self.months[table]) if month >= oldest_writable]
+
+    def insert(self, cursor: sqlite3.Cursor, table: str, statement: str, rows: Sequence[Tuple], position: int = -1):
+        """Run an INSERT whose '{table}' placeholder is filled per partition, routing rows by the timestamp at position"""
+        by_month: Dict[str, List[Tuple]] = {}
+        for row in rows:
+            by_month.setdefault(month_of(row[position]), []).append(row)
+        for month, month_rows in by_month.items():
+            cursor.executemany(statement.format(table=self.ensure(cursor, table, month)), month_rows)
+
+    def update(self, cursor: sqlite3.Cursor, table: str, statement: str, rows: Sequence[Tuple]):
+        """Run an UPDATE whose '{table}' placeholder is filled with each writable partition"""
+        for partition in self.writable(table):
+            cursor.executemany(statement.format(table=partition), rows)
+
+    def drop_before(self, cursor: sqlite3.Cursor, month: str) -> List[str]:
+        """Drop every partition of a month before the given one; returns the dropped table names"""
+        dropped = []
+        for table in PARTITIONED_TABLES:
+            expired = [old for old in self.months[table] if old < month]
+            if not expired:
+                continue
+            for old in expired:
+                partition = self.name(table, old)
+                cursor.execute(f"DROP TABLE IF EXISTS {partition}")
+                self.sealed.discard(partition)
+                dropped.append(partition)
+            self.months[table] = [kept for kept in self.months[table] if kept >= month]
+            # There is always a partition to write to
+            self.ensure(cursor, table, month_of(None), refresh=False)
+            self.refresh_view(cursor, table)
+        return dropped
+
+    def stats(self) -> Dict:
+        return {table: [{'partition': self.name(table, month), 'read_only': self.name(table, month) in self.sealed}
+                        for month in months]
+                for table, months in self.months.items()}
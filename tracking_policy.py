@@ -0,0 +1,96 @@
+"""
+Tracking Policy Module for JIRA TPM Application
+Decides which requests the tracking middleware records, and with what sampling weight
+"""
+
+import re
+import random
+import fnmatch
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Static assets, progress polls and streams: frequent, and not page usage
+DEFAULT_EXCLUDE = [
+    '/static/*', '/temp_screenshots/*',
+    '*.js', '*.css', '*.map', '*.png', '*.jpg', '*.svg', '*.ico', '*.woff', '*.woff2',
+    '/api/*progress*', '/api/tasks/*/events', '/api/jira_sprint_report_stream'
+]
+
+
+def compile_patterns(patterns: Iterable[str]) -> Optional['re.Pattern']:
+    """One regex matching any of the glob patterns ('*' also matches '/'), or None for no patterns"""
+    patterns = [pattern for pattern in patterns if pattern]
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(pattern)})' for pattern in patterns))
+
+
+class TrackingPolicy:
+    def __init__(self, enabled: bool = True, include: Iterable[str] = (), exclude: Iterable[str] = DEFAULT_EXCLUDE,
+                 sample_rates: Optional[Dict[str, float]] = None, cache_size: int = 4096):
+        """
+        include: only paths matching one of these are tracked (all paths if empty).
+        exclude: paths matching one of these are never tracked.
+        sample_rates: glob -> fraction of matching requests to track; the first matching pattern wins.
+        """
+        self.enabled = enabled
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.sample_rates = [(compile_patterns([pattern]), min(1.0, max(0.0, float(rate))))
+                             for pattern, rate in (sample_rates or {}).items()]
+        # Paths repeat, so each path's rate is matched once
+        self.rate = lru_cache(maxsize=cache_size)(self._rate)
+        self.lock = threading.Lock()
+        self.counts = {'tracked': 0, 'filtered': 0, 'sampled_out': 0}
+
+    @classmethod
+    def from_settings(cls, analytics_settings: Dict) -> 'TrackingPolicy':
+        """Build the policy from the analytics section of the settings"""
+        return cls(
+            enabled=bool(analytics_settings.get('enabled', True)),
+            include=analytics_settings.get('track_include') or (),
+            exclude=analytics_settings.get('track_exclude', DEFAULT_EXCLUDE),
+            sample_rates=analytics_settings.get('track_sample_rates') or {}
+        )
+
+    def _rate(self, path: str) -> float:
+        """Fraction of requests to the path that are tracked; 0 for filtered paths"""
+        if self.include is not None and not self.include.match(path):
+            return 0.0
+        if self.exclude is not None and self.exclude.match(path):
+            return 0.0
+        for pattern, rate in self.sample_rates:
+            if pattern.match(path):
+                return rate
+        return 1.0
+
+    def weight(self, path: str) -> Optional[float]:
+        """
+        None if this request should not be tracked, else the number of requests it stands for
+        (1 / sampling rate), to be recorded with what it tracks so totals can be scaled back up.
+        """
+        if not self.enabled:
+            return None
+        rate = self.rate(path)
+        if rate >= 1.0:
+            outcome, weight = 'tracked', 1.0
+        elif rate <= 0.0:
+            outcome, weight = 'filtered', None
+        elif random.random() < rate:
+            outcome, weight = 'tracked', 1.0 / rate
+        else:
+            outcome, weight = 'sampled_out', None
+        with self.lock:
+            self.counts[outcome] += 1
+        return weight
+
+    def stats(self) -> Dict:
+        with self.lock:
+            counts = dict(self.counts)
+        cache = self.rate.cache_info()
+        return {'enabled': self.enabled, 'sampled_patterns': len(self.sample_rates),
+                'cached_paths': cache.currsize, **counts}
@@ -5,28 +5,268 @@ Tracks users by IP address and cookies for analytics purposes
 
 import sqlite3
 import json
+import copy
 import hashlib
 import uuid
 from datetime import datetime, timedelta
 from flask import request, session, g
 import logging
 import os
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
 import threading
+import queue
+import time
+import atexit
+from contextlib import contextmanager
+from settings_manager import settings_manager
+from analytics_rollups import AnalyticsRollups
+from tracking_partitions import TrackingPartitions, month_of
+from tracking_policy import TrackingPolicy
 
 logger = logging.getLogger(__name__)
 
-class UserTracker:
-    def __init__(self, db_path: str = "user_tracking.db"):
-        """Initialize the user tracker with SQLite database"""
+# Write-behind statements, applied in this order within each batch.
+# A user row is only written when the identity cache misses; total_sessions counts session starts.
+# {table} is filled with a monthly partition (see PARTITIONED_WRITES).
+WRITE_STATEMENTS = {
+    'user': '''
+        INSERT INTO users (user_id, ip_address, user_agent, first_seen, last_seen, total_sessions)
+        VALUES (?, ?, ?, ?, ?, 0)
+        ON CONFLICT(user_id) DO UPDATE SET
+            last_seen = MAX(last_seen, excluded.last_seen),
+            is_active = 1
+    ''',
+    'session': '''
+        INSERT INTO {table} (session_id, user_id, ip_address, user_agent, start_time)
+        VALUES (?, ?, ?, ?, ?)
+    ''',
+    'user_session': 'UPDATE users SET total_sessions = total_sessions + 1 WHERE user_id = ?',
+    'page_view': '''
+        INSERT INTO {table} (session_id, user_id, page_path, page_title, referrer, load_time_ms, weight, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'session_page_view': 'UPDATE {table} SET page_views = page_views + ? WHERE session_id = ?',
+    'user_page_view': 'UPDATE users SET total_page_views = total_page_views + ? WHERE user_id = ?',
+    'event': '''
+        INSERT INTO {table} (session_id, user_id, event_type, event_data, weight, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+}
+
+# Write kind -> partitioned table. Inserts are routed by the row's last value (its timestamp);
+# updates by key go to the partitions that still take writes.
+PARTITIONED_INSERTS = {'session': 'sessions', 'page_view': 'page_views', 'event': 'events'}
+PARTITIONED_UPDATES = {'session_page_view': 'sessions'}
+
+class ConnectionManager:
+    """One long-lived writer connection plus a pool of reader connections to a WAL-mode database"""
+
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',  # Readers see the last commit while the writer works
+        'PRAGMA synchronous=NORMAL',  # Safe with WAL; skips an fsync per commit
+        'PRAGMA busy_timeout=5000',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA cache_size=-16000'  # 16 MB page cache per connection
+    )
+
+    def __init__(self, db_path: str, readers: int = 4, cached_statements: int = 256):
         self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.write_lock = threading.Lock()
+        self.writer = self._connect()
+        self.max_readers = max(1, readers)
+        self.readers = queue.LifoQueue()
+        self.reader_count = 0
+        self.reader_lock = threading.Lock()
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        # Connections move between threads, but each is only ever used by one thread at a time
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+
+    @contextmanager
+    def write(self):
+        """The writer connection inside a transaction, committed on success and rolled back on error"""
+        with self.write_lock:
+            with self.writer:
+                yield self.writer
+
+    @contextmanager
+    def read(self):
+        """A reader connection from the pool; readers run concurrently with each other and the writer"""
+        try:
+            conn = self.readers.get_nowait()
+        except queue.Empty:
+            with self.reader_lock:
+                create = self.reader_count < self.max_readers
+                if create:
+                    self.reader_count += 1
+            conn = self._connect(read_only=True) if create else self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put(conn)
+
+    def stats(self) -> Dict:
+        return {'readers_open': self.reader_count, 'readers_idle': self.readers.qsize(), 'max_readers': self.max_readers}
+
+def utc_timestamp() -> str:
+    """Current time in the format SQLite's CURRENT_TIMESTAMP uses"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+# Limits for batched frontend ingestion
+MAX_BATCH_ITEMS = 500
+MAX_EVENT_DATA_BYTES = 8192
+# Client timestamps are kept only this close to the server clock (buffered events, small skew)
+CLIENT_TIMESTAMP_WINDOW = timedelta(hours=1)
+
+def parse_utc(value: str) -> datetime:
+    """An ISO 8601 time as a naive UTC datetime; times with an offset (or Z) are converted. Raises ValueError"""
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = datetime.utcfromtimestamp(moment.timestamp())
+    return moment
+
+def client_timestamp(value: Any) -> str:
+    """A client-supplied time (epoch milliseconds or ISO 8601) as a UTC timestamp, or now if absent or implausible"""
+    now = datetime.utcnow()
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            moment = datetime.utcfromtimestamp(value / 1000.0)
+        elif isinstance(value, str) and value:
+            moment = parse_utc(value)
+        else:
+            return now.strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, OverflowError, OSError):
+        return now.strftime('%Y-%m-%d %H:%M:%S')
+    if not now - CLIENT_TIMESTAMP_WINDOW <= moment <= now + timedelta(minutes=1):
+        moment = now
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def parse_batch_item(item: Any) -> Tuple[str, Dict]:
+    """Validate one item of a frontend batch; returns ('pageview' or 'event', cleaned fields) or raises ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError('item must be an object')
+    kind = item.get('type')
+    timestamp = client_timestamp(item.get('timestamp'))
+    if kind == 'pageview':
+        page_path = item.get('page_path')
+        if not isinstance(page_path, str) or not page_path or len(page_path) > 2048:
+            raise ValueError('page_path is required')
+        load_time_ms = item.get('load_time_ms', 0)
+        if not isinstance(load_time_ms, (int, float)) or isinstance(load_time_ms, bool) or load_time_ms < 0:
+            raise ValueError('load_time_ms must be a non-negative number')
+        return kind, {
+            'page_path': page_path,
+            'page_title': str(item.get('page_title') or '')[:512],
+            'referrer': str(item.get('referrer') or '')[:2048],
+            'load_time_ms': int(load_time_ms),
+            'timestamp': timestamp
+        }
+    if kind == 'event':
+        event_type = item.get('event_type')
+        if not isinstance(event_type, str) or not event_type or len(event_type) > 100:
+            raise ValueError('event_type is required')
+        event_data = item.get('event_data') or {}
+        if not isinstance(event_data, dict):
+            raise ValueError('event_data must be an object')
+        event_data_json = json.dumps(event_data) if event_data else None
+        if event_data_json and len(event_data_json) > MAX_EVENT_DATA_BYTES:
+            raise ValueError(f'event_data exceeds {MAX_EVENT_DATA_BYTES} bytes')
+        return kind, {'event_type': event_type, 'event_data': event_data_json, 'timestamp': timestamp}
+    raise ValueError("type must be 'pageview' or 'event'")
+
+class IdentityCache:
+    """LRU of recently seen user_ids with their in-memory last_seen, so repeat requests skip the database"""
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = max(1, capacity)
+        self.users: OrderedDict = OrderedDict()
+        # user_id -> newest last_seen not yet written to the users table
+        self.dirty: Dict[str, str] = {}
         self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def touch(self, user_id: str, now: str) -> bool:
+        """Record a visit; returns True if the user was already cached"""
+        with self.lock:
+            if user_id in self.users:
+                self.users.move_to_end(user_id)
+                self.users[user_id] = now
+                self.dirty[user_id] = now
+                self.hits += 1
+                return True
+            self.users[user_id] = now
+            if len(self.users) > self.capacity:
+                # An evicted user's pending last_seen stays in dirty until the next flush
+                self.users.popitem(last=False)
+            self.misses += 1
+            return False
+
+    def take_dirty(self) -> Dict[str, str]:
+        """Pending last_seen values, cleared for the next interval"""
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+            return dirty
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'size': len(self.users), 'capacity': self.capacity, 'hits': self.hits,
+                    'misses': self.misses, 'pending_last_seen': len(self.dirty)}
+
+class UserTracker:
+    def __init__(self, db_path: str = "user_tracking.db", batch_size: int = 200,
+                 flush_interval: float = 1.0, queue_limit: int = 10000, read_connections: int = 4,
+                 identity_cache_size: int = 10000, last_seen_flush_interval: float = 60.0,
+                 policy: Optional[TrackingPolicy] = None, ingest_buffer_batches: int = 1000):
+        """Initialize the user tracker with SQLite database and its background writer"""
+        self.db_path = db_path
+        self.db = ConnectionManager(db_path, readers=read_connections)
+        self.rollups = AnalyticsRollups()
+        self.partitions = TrackingPartitions()
+        # Which requests the middleware tracks; replaceable at runtime
+        self.policy = policy or TrackingPolicy()
+        self.last_rollup_prune = 0.0
         self.init_database()
+
+        # Tracking writes are queued by request threads and committed in batches by one writer thread
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_queue = queue.Queue(maxsize=queue_limit)
+        # Frontend batches wait in a ring buffer; a burst beyond its size evicts the oldest batches.
+        # Each batch is written whole in one transaction.
+        self.ingest_buffer = deque(maxlen=max(1, ingest_buffer_batches))
+        self.identities = IdentityCache(identity_cache_size)
+        self.last_seen_flush_interval = last_seen_flush_interval
+        self.last_seen_flushed = time.time()
+        self.stats_lock = threading.Lock()
+        self.write_stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'last_batch_size': 0,
+            'last_flush_seconds': 0.0,
+            'last_flush_at': None,
+            'ingested_batches': 0,
+            'evicted_batches': 0
+        }
+        self.flush_requests = []
+        self.writer = threading.Thread(target=self._writer_loop, name="tracking-writer", daemon=True)
+        self.writer.start()
+        atexit.register(self.flush)
     
     def init_database(self):
         """Initialize the SQLite database with required tables"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
+        with self.db.write() as conn:
             cursor = conn.cursor()
             
             # Create users table
@@ -44,62 +284,20 @@ class UserTracker:
                 )
             ''')
             
-            # Create sessions table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT UNIQUE NOT NULL,
-                    user_id TEXT NOT NULL,
-                    ip_address TEXT NOT NULL,
-                    user_agent TEXT,
-                    start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    end_time TIMESTAMP,
-                    duration_seconds INTEGER,
-                    page_views INTEGER DEFAULT 0,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            ''')
-            
-            # Create page_views table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS page_views (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    user_id TEXT NOT NULL,
-                    page_path TEXT NOT NULL,
-                    page_title TEXT,
-                    referrer TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    load_time_ms INTEGER,
-                    FOREIGN KEY (session_id) REFERENCES sessions (session_id),
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            ''')
-            
-            # Create events table for custom tracking
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    user_id TEXT NOT NULL,
-                    event_type TEXT NOT NULL,
-                    event_data TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (session_id) REFERENCES sessions (session_id),
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            ''')
+            # Sessions, page views and events live in monthly partitions behind views of the same names
+            self.partitions.setup(cursor)
             
             # Create indexes for better performance
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_ip ON users(ip_address)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_page_views_session_id ON page_views(session_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_session_id ON events(session_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_type ON events(event_type)')
             
-            conn.commit()
-            conn.close()
+            # Aggregates read by get_user_stats; backfilled once from data tracked before they existed
+            self.rollups.create_tables(cursor)
+            if self.rollups.is_empty(cursor) and cursor.execute('SELECT 1 FROM users LIMIT 1').fetchone():
+                self.rollups.rebuild(cursor)
+            elif not self.rollups.has_sketches(cursor):
+                self.rollups.build_sketches(cursor)
+            
             logger.info("User tracking database initialized successfully")
     
     def get_client_ip(self) -> str:
@@ -117,64 +315,146 @@ class UserTracker:
         combined = f"{ip_address}:{user_agent}"
         return hashlib.md5(combined.encode()).hexdigest()
     
+    def enqueue(self, kind: str, params: Tuple):
+        """Queue a tracking write for the background writer; drops it if the queue is full"""
+        try:
+            self.write_queue.put_nowait((kind, params))
+            counter = 'enqueued'
+        except queue.Full:
+            counter = 'dropped'
+        with self.stats_lock:
+            self.write_stats[counter] += 1
+            dropped = self.write_stats['dropped']
+        if counter == 'dropped' and dropped % 1000 == 1:
+            logger.warning(f"Tracking queue full; {dropped} writes dropped so far")
+
+    def _writer_loop(self):
+        """Drain the queue, committing a batch when it reaches batch_size or flush_interval has passed"""
+        while True:
+            batch = []
+            try:
+                batch.append(self.write_queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            deadline = time.time() + self.flush_interval
+            while batch and len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.write_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            while self.ingest_buffer:
+                batch.extend(self.ingest_buffer.popleft())
+            if batch:
+                self._write_batch(batch)
+            if self.flush_requests or time.time() - self.last_seen_flushed >= self.last_seen_flush_interval:
+                self._write_last_seen()
+            # Wake flush() callers once everything queued before their call is written
+            while self.flush_requests and self.write_queue.empty() and not self.ingest_buffer:
+                self.flush_requests.pop().set()
+
+    def _write_last_seen(self):
+        """Write the coalesced last_seen of cached users, one row per user per interval"""
+        self.last_seen_flushed = time.time()
+        dirty = self.identities.take_dirty()
+        if not dirty:
+            return
+        try:
+            with self.db.write() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    UPDATE users SET last_seen = ?, is_active = 1
+                    WHERE user_id = ? AND last_seen < ?
+                ''', [(last_seen, user_id, last_seen) for user_id, last_seen in dirty.items()])
+                self.rollups.record_activity(cursor, dirty.items())
+        except Exception as e:
+            logger.error(f"Error writing last_seen for {len(dirty)} users: {str(e)}")
+
+    def _write_batch(self, batch: List[Tuple[str, Tuple]]):
+        grouped = {kind: [] for kind in WRITE_STATEMENTS}
+        for kind, params in batch:
+            grouped[kind].append(params)
+        started = time.time()
+        try:
+            with self.db.write() as conn:
+                cursor = conn.cursor()
+                user_ids = {row[0] for row in grouped['user']}
+                new_user_ids = user_ids - self.rollups.existing_users(cursor, user_ids)
+                for kind, rows in grouped.items():
+                    if not rows:
+                        continue
+                    if kind in PARTITIONED_INSERTS:
+                        self.partitions.insert(cursor, PARTITIONED_INSERTS[kind], WRITE_STATEMENTS[kind], rows)
+                    elif kind in PARTITIONED_UPDATES:
+                        self.partitions.update(cursor, PARTITIONED_UPDATES[kind], WRITE_STATEMENTS[kind], rows)
+                    else:
+                        cursor.executemany(WRITE_STATEMENTS[kind], rows)
+                self.rollups.apply(cursor, grouped['user'], grouped['session'], grouped['page_view'], new_user_ids)
+                if time.time() - self.last_rollup_prune > 3600:
+                    self.rollups.prune(cursor)
+                    self.last_rollup_prune = time.time()
+            outcome = {'written': len(batch), 'batches': 1}
+        except Exception as e:
+            outcome = {'failed_batches': 1}
+            logger.error(f"Error writing {len(batch)} tracking records: {str(e)}")
+        with self.stats_lock:
+            for counter, amount in outcome.items():
+                self.write_stats[counter] += amount
+            self.write_stats['last_batch_size'] = len(batch)
+            self.write_stats['last_flush_seconds'] = round(time.time() - started, 4)
+            self.write_stats['last_flush_at'] = datetime.now().isoformat()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far is written; returns False on timeout"""
+        if not self.writer.is_alive():
+            return self.write_queue.empty() and not self.ingest_buffer
+        done = threading.Event()
+        self.flush_requests.append(done)
+        return done.wait(timeout)
+
+    def get_queue_stats(self) -> Dict:
+        """Write-behind queue depth and batch statistics"""
+        with self.stats_lock:
+            return {
+                'depth': self.write_queue.qsize(),
+                'capacity': self.write_queue.maxsize,
+                'ingest_buffer_depth': len(self.ingest_buffer),
+                'ingest_buffer_capacity': self.ingest_buffer.maxlen,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'connections': self.db.stats(),
+                'identity_cache': self.identities.stats(),
+                'partitions': self.partitions.stats(),
+                'policy': self.policy.stats(),
+                **self.write_stats
+            }
+
     def get_or_create_user(self, ip_address: str, user_agent: str = "") -> Tuple[str, bool]:
-        """Get existing user or create new one. Returns (user_id, is_new_user)"""
+        """
+        Record a visit from a user, creating them if needed. Returns (user_id, is_new_user), where
+        is_new_user means the user is not in the identity cache. Only cache misses queue a write;
+        hits just move last_seen in memory, which the writer flushes every last_seen_flush_interval.
+        """
         user_id = self.generate_user_id(ip_address, user_agent)
-        
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Check if user exists
-            cursor.execute('SELECT user_id FROM users WHERE user_id = ?', (user_id,))
-            existing_user = cursor.fetchone()
-            
-            if existing_user:
-                # Update last seen and increment sessions
-                cursor.execute('''
-                    UPDATE users 
-                    SET last_seen = CURRENT_TIMESTAMP, 
-                        total_sessions = total_sessions + 1,
-                        is_active = 1
-                    WHERE user_id = ?
-                ''', (user_id,))
-                is_new_user = False
-            else:
-                # Create new user
-                cursor.execute('''
-                    INSERT INTO users (user_id, ip_address, user_agent, first_seen, last_seen)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                ''', (user_id, ip_address, user_agent))
-                is_new_user = True
-            
-            conn.commit()
-            conn.close()
-            
-            return user_id, is_new_user
-    
+        now = utc_timestamp()
+        if self.identities.touch(user_id, now):
+            return user_id, False
+        self.enqueue('user', (user_id, ip_address, user_agent, now, now))
+        return user_id, True
+
     def start_session(self, user_id: str, ip_address: str, user_agent: str = "") -> str:
         """Start a new session and return session ID"""
         session_id = str(uuid.uuid4())
-        
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO sessions (session_id, user_id, ip_address, user_agent, start_time)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (session_id, user_id, ip_address, user_agent))
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Started new session {session_id} for user {user_id}")
-            return session_id
-    
+        self.enqueue('session', (session_id, user_id, ip_address, user_agent, utc_timestamp()))
+        self.enqueue('user_session', (user_id,))
+        logger.info(f"Started new session {session_id} for user {user_id}")
+        return session_id
+
     def end_session(self, session_id: str):
         """End a session and calculate duration"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
+        with self.db.write() as conn:
             cursor = conn.cursor()
             
             # Get session start time
@@ -188,155 +468,73 @@ class UserTracker:
                     start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S.%f')
                 else:
                     start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
-                end_time = datetime.now()
+                end_time = datetime.utcnow()
                 duration = int((end_time - start_time).total_seconds())
                 
-                cursor.execute('''
-                    UPDATE sessions 
+                self.partitions.update(cursor, 'sessions', '''
+                    UPDATE {table} 
                     SET end_time = CURRENT_TIMESTAMP, duration_seconds = ?
                     WHERE session_id = ?
-                ''', (duration, session_id))
+                ''', [(duration, session_id)])
+                self.rollups.apply(cursor, [], [], [], set(), ended_sessions=[(utc_timestamp(), duration)])
                 
-                conn.commit()
                 logger.info(f"Ended session {session_id} with duration {duration} seconds")
-            
-            conn.close()
     
     def track_page_view(self, session_id: str, user_id: str, page_path: str, 
-                       page_title: str = "", referrer: str = "", load_time_ms: int = 0):
-        """Track a page view"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Insert page view
-            cursor.execute('''
-                INSERT INTO page_views (session_id, user_id, page_path, page_title, referrer, load_time_ms)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (session_id, user_id, page_path, page_title, referrer, load_time_ms))
-            
-            # Update session page view count
-            cursor.execute('''
-                UPDATE sessions SET page_views = page_views + 1 WHERE session_id = ?
-            ''', (session_id,))
-            
-            # Update user total page views
-            cursor.execute('''
-                UPDATE users SET total_page_views = total_page_views + 1 WHERE user_id = ?
-            ''', (user_id,))
-            
-            conn.commit()
-            conn.close()
+                       page_title: str = "", referrer: str = "", load_time_ms: int = 0, weight: float = 1.0):
+        """Track a page view; weight is how many page views it stands for when requests are sampled"""
+        self.enqueue('page_view', (session_id, user_id, page_path, page_title, referrer, load_time_ms, weight,
+                                   utc_timestamp()))
+        self.enqueue('session_page_view', (weight, session_id))
+        self.enqueue('user_page_view', (weight, user_id))
     
-    def track_event(self, session_id: str, user_id: str, event_type: str, event_data: Dict = None):
+    def track_event(self, session_id: str, user_id: str, event_type: str, event_data: Dict = None, weight: float = 1.0):
         """Track a custom event"""
         event_data_json = json.dumps(event_data) if event_data else None
-        
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO events (session_id, user_id, event_type, event_data)
-                VALUES (?, ?, ?, ?)
-            ''', (session_id, user_id, event_type, event_data_json))
-            
-            conn.commit()
-            conn.close()
+        self.enqueue('event', (session_id, user_id, event_type, event_data_json, weight, utc_timestamp()))
     
-    def get_user_stats(self, days: int = 30) -> Dict:
-        """Get user statistics for the last N days"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Total users
-            cursor.execute('SELECT COUNT(*) FROM users')
-            total_users = cursor.fetchone()[0]
-            
-            # Active users (last 24 hours)
-            cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE last_seen > datetime('now', '-1 day')
-            ''')
-            active_users_24h = cursor.fetchone()[0]
-            
-            # Active users (last 7 days)
-            cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE last_seen > datetime('now', '-7 days')
-            ''')
-            active_users_7d = cursor.fetchone()[0]
-            
-            # Active users (last 30 days)
-            cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE last_seen > datetime('now', '-30 days')
-            ''')
-            active_users_30d = cursor.fetchone()[0]
-            
-            # New users today
-            cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE date(first_seen) = date('now')
-            ''')
-            new_users_today = cursor.fetchone()[0]
-            
-            # Total sessions
-            cursor.execute('SELECT COUNT(*) FROM sessions')
-            total_sessions = cursor.fetchone()[0]
-            
-            # Total page views
-            cursor.execute('SELECT COUNT(*) FROM page_views')
-            total_page_views = cursor.fetchone()[0]
-            
-            # Average session duration
-            cursor.execute('''
-                SELECT AVG(duration_seconds) FROM sessions 
-                WHERE duration_seconds IS NOT NULL
-            ''')
-            avg_session_duration = cursor.fetchone()[0] or 0
-            
-            # Top pages
-            cursor.execute('''
-                SELECT page_path, COUNT(*) as views 
-                FROM page_views 
-                WHERE timestamp > datetime('now', '-30 days')
-                GROUP BY page_path 
-                ORDER BY views DESC 
-                LIMIT 10
-            ''')
-            top_pages = [{'page': row[0], 'views': row[1]} for row in cursor.fetchall()]
-            
-            # Daily active users for the last 30 days
-            cursor.execute('''
-                SELECT date(last_seen) as date, COUNT(DISTINCT user_id) as users
-                FROM users 
-                WHERE last_seen > datetime('now', '-30 days')
-                GROUP BY date(last_seen)
-                ORDER BY date(last_seen)
-            ''')
-            daily_active_users = [{'date': row[0], 'users': row[1]} for row in cursor.fetchall()]
-            
-            conn.close()
-            
-            return {
-                'total_users': total_users,
-                'active_users_24h': active_users_24h,
-                'active_users_7d': active_users_7d,
-                'active_users_30d': active_users_30d,
-                'new_users_today': new_users_today,
-                'total_sessions': total_sessions,
-                'total_page_views': total_page_views,
-                'avg_session_duration': round(avg_session_duration, 2),
-                'top_pages': top_pages,
-                'daily_active_users': daily_active_users
-            }
+    def track_batch(self, session_id: str, user_id: str, items: List[Tuple[str, Dict]], weight: float = 1.0) -> int:
+        """
+        Buffer validated frontend items (see parse_batch_item) to be written together; returns the item count.
+        A page view's own sampling weight, if set in its fields, is multiplied with the batch weight.
+        """
+        rows = []
+        for kind, fields in items:
+            if kind == 'pageview':
+                page_weight = weight * fields.get('weight', 1.0)
+                rows.append(('page_view', (session_id, user_id, fields['page_path'], fields['page_title'],
+                                           fields['referrer'], fields['load_time_ms'], page_weight, fields['timestamp'])))
+                rows.append(('session_page_view', (page_weight, session_id)))
+                rows.append(('user_page_view', (page_weight, user_id)))
+            else:
+                rows.append(('event', (session_id, user_id, fields['event_type'], fields['event_data'], weight,
+                                       fields['timestamp'])))
+        if not rows:
+            return 0
+        with self.stats_lock:
+            evicted = len(self.ingest_buffer) == self.ingest_buffer.maxlen
+            self.ingest_buffer.append(rows)
+            self.write_stats['ingested_batches'] += 1
+            if evicted:
+                self.write_stats['evicted_batches'] += 1
+                evicted_total = self.write_stats['evicted_batches']
+        if evicted and evicted_total % 100 == 1:
+            logger.warning(f"Tracking ingest buffer full; {evicted_total} oldest batches evicted so far")
+        return len(items)
+    
+    def get_user_stats(self, days: int = 30, approx: bool = False) -> Dict:
+        """Get user statistics for the last N days, read from the rollup tables (distinct users from sketches with approx)"""
+        with self.db.read() as conn:
+            return self.rollups.read_stats(conn.cursor(), days, approx=approx)
+    
+    def approx_active_users(self, start: datetime, end: datetime) -> Dict:
+        """Approximate distinct users active in a UTC time range"""
+        with self.db.read() as conn:
+            return self.rollups.approx_distinct_users(conn.cursor(), start, end)
     
     def get_user_details(self, user_id: str) -> Dict:
         """Get detailed information about a specific user"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
+        with self.db.read() as conn:
             cursor = conn.cursor()
             
             # User basic info
@@ -348,7 +546,6 @@ class UserTracker:
             user_info = cursor.fetchone()
             
             if not user_info:
-                conn.close()
                 return None
             
             # User sessions
@@ -377,8 +574,6 @@ class UserTracker:
                 'load_time_ms': row[3]
             } for row in cursor.fetchall()]
             
-            conn.close()
-            
             return {
                 'user_id': user_info[0],
                 'ip_address': user_info[1],
@@ -392,50 +587,62 @@ class UserTracker:
                 'recent_page_views': recent_views
             }
     
-    def cleanup_old_data(self, days_to_keep: int = 90):
-        """Clean up old tracking data to keep database size manageable"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
+    def cleanup_old_data(self, days_to_keep: int = 90) -> List[str]:
+        """
+        Drop tracking partitions of months that ended more than days_to_keep days ago and mark users
+        not seen since then inactive. Returns the dropped partition tables.
+        """
+        with self.db.write() as conn:
             cursor = conn.cursor()
             
-            cutoff_date = datetime.now() - timedelta(days=days_to_keep)
+            cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
             
-            # Delete old page views
-            cursor.execute('''
-                DELETE FROM page_views 
-                WHERE timestamp < ?
-            ''', (cutoff_date,))
-            
-            # Delete old events
-            cursor.execute('''
-                DELETE FROM events 
-                WHERE timestamp < ?
-            ''', (cutoff_date,))
-            
-            # Delete old sessions
-            cursor.execute('''
-                DELETE FROM sessions 
-                WHERE start_time < ?
-            ''', (cutoff_date,))
+            # Whole months go at once; the month containing the cutoff is kept
+            dropped = self.partitions.drop_before(cursor, month_of(cutoff_date.strftime('%Y-%m')))
+            if dropped:
+                self.rollups.forget_before(cursor, cutoff_date.strftime('%Y-%m-01'))
             
             # Mark old users as inactive
             cursor.execute('''
                 UPDATE users 
                 SET is_active = 0 
                 WHERE last_seen < ?
-            ''', (cutoff_date,))
+            ''', (cutoff_date.strftime('%Y-%m-%d %H:%M:%S'),))
             
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Cleaned up tracking data older than {days_to_keep} days")
+            logger.info(f"Cleaned up tracking data older than {days_to_keep} days: dropped {len(dropped)} partitions")
+            return dropped
+
+# Global tracker instance; write-behind batching is tuned in the analytics settings
+_analytics_settings = settings_manager.get_analytics_settings()
+tracker = UserTracker(
+    batch_size=int(_analytics_settings.get('write_batch_size', 200)),
+    flush_interval=float(_analytics_settings.get('write_flush_interval', 1.0)),
+    queue_limit=int(_analytics_settings.get('write_queue_limit', 10000)),
+    read_connections=int(_analytics_settings.get('read_connections', 4)),
+    identity_cache_size=int(_analytics_settings.get('identity_cache_size', 10000)),
+    last_seen_flush_interval=float(_analytics_settings.get('last_seen_flush_interval', 60.0)),
+    policy=TrackingPolicy.from_settings(_analytics_settings),
+    ingest_buffer_batches=int(_analytics_settings.get('ingest_buffer_batches', 1000))
+)
 
-# Global tracker instance
-tracker = UserTracker()
+def apply_analytics_settings(version: int, settings: Dict):
+    """Rebuild the tracking policy when the analytics settings change, so filters and the kill switch apply at once"""
+    global _analytics_settings
+    analytics_settings = settings.get('analytics', settings_manager.default_settings['analytics'])
+    if analytics_settings == _analytics_settings:
+        return
+    _analytics_settings = copy.deepcopy(analytics_settings)
+    tracker.policy = TrackingPolicy.from_settings(analytics_settings)
+    logger.info(f"Tracking policy rebuilt from settings version {version}")
+
+settings_manager.subscribe(apply_analytics_settings)
 
 def track_user_request():
-    """Middleware function to track user requests"""
+    """Middleware function to track user requests, as far as the tracking policy selects them"""
     try:
+        weight = tracker.policy.weight(request.path)
+        if weight is None:
+            return
         ip_address = tracker.get_client_ip()
         user_agent = request.headers.get('User-Agent', '')
         
@@ -453,6 +660,7 @@ def track_user_request():
         g.tracking_user_id = user_id
         g.tracking_session_id = session_id
         g.tracking_is_new_user = is_new_user
+        g.tracking_weight = weight
         
         logger.debug(f"Tracking request: user_id={user_id}, session_id={session_id}, is_new={is_new_user}")
         
@@ -460,16 +668,20 @@ def track_user_request():
         logger.error(f"Error in user tracking: {str(e)}")
 
 def track_page_view(page_path: str, page_title: str = "", referrer: str = "", load_time_ms: int = 0):
-    """Track a page view for the current user"""
+    """Track a page view for the current user, as far as the tracking policy selects its page path"""
     try:
         if hasattr(g, 'tracking_session_id') and hasattr(g, 'tracking_user_id'):
+            page_weight = tracker.policy.weight(page_path)
+            if page_weight is None:
+                return
             tracker.track_page_view(
                 g.tracking_session_id,
                 g.tracking_user_id,
                 page_path,
                 page_title,
                 referrer,
-                load_time_ms
+                load_time_ms,
+                getattr(g, 'tracking_weight', 1.0) * page_weight
             )
     except Exception as e:
         logger.error(f"Error tracking page view: {str(e)}")
@@ -478,6 +690,31 @@ def track_event(event_type: str, event_data: Dict = None):
     """Track a custom event for the current user"""
     try:
         if hasattr(g, 'tracking_session_id') and hasattr(g, 'tracking_user_id'):
-            tracker.track_event(g.tracking_session_id, g.tracking_user_id, event_type, event_data)
+            tracker.track_event(g.tracking_session_id, g.tracking_user_id, event_type, event_data,
+                                getattr(g, 'tracking_weight', 1.0))
     except Exception as e:
         logger.error(f"Error tracking event: {str(e)}")
+
+def track_batch(items: List[Any]) -> Tuple[int, List[Dict]]:
+    """Validate and buffer a frontend batch for the current user; returns (accepted count, per-item errors)"""
+    parsed, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            parsed.append(parse_batch_item(item))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    accepted = 0
+    if parsed and hasattr(g, 'tracking_session_id') and hasattr(g, 'tracking_user_id'):
+        # Each page view is filtered and sampled by its own page path; skipped ones still count as accepted
+        selected = []
+        for kind, fields in parsed:
+            if kind == 'pageview':
+                fields['weight'] = tracker.policy.weight(fields['page_path'])
+                if fields['weight'] is None:
+                    continue
+            selected.append((kind, fields))
+        accepted = len(parsed) - len(selected)
+        if selected:
+            accepted += tracker.track_batch(g.tracking_session_id, g.tracking_user_id, selected,
+                                            getattr(g, 'tracking_weight', 1.0))
+    return accepted, errors